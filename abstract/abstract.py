@@ -1,18 +1,49 @@
 """Generate a static site with abstract.abstract"""
 import argparse
+import contextlib
 import datetime
 import pathlib
 import functools
+import json
 import shutil
+import sys
+import threading
+import time
+import typing
 
 import cerberus
 import jinja2
-import markdown
 import publish
 import yaml
 
+from . import cache
+from . import cpu_profile
+from . import dependencies
+from . import deploy
 from . import elements
 from . import exceptions
+from . import fragment_cache
+from . import generations
+from . import headers
+from . import images
+from . import layout
+from . import lazy_published
+from . import linkcheck
+from . import manifest
+from . import memory_profile
+from . import markdown_backends
+from . import metrics
+from . import output
+from . import pipeline
+from . import search
+from . import sharding
+
+
+# bumped whenever the format of cached pages changes
+_RENDER_KEY_VERSION = "2"
+
+# bumped whenever the format of cached configurations changes
+_CONFIG_CACHE_VERSION = "2"
 
 
 def load_published(published_path, output_path):
@@ -40,37 +71,89 @@ def load_published(published_path, output_path):
         The universe of published artifacts, with each artifact's path updated
         to be relative to ``output_path``.
 
+    See Also
+    --------
+    abstract.lazy_published.load : Loads collections only when they are used.
+
     """
 
     # read the universe
     with (published_path / "published.json").open() as fileobj:
         published = publish.deserialize(fileobj.read())
 
-    # we need to update their paths to be relative to output directory; this function
-    # will do it for one artifact
-    def _update_path(artifact):
-        if artifact.path is None:
-            return artifact
-
-        relative_path = published_path.relative_to(output_path) / artifact.path
-        return artifact._replace(path=relative_path)
-
-    # apply the function to all artifacts, modifying `published`
+    # we need to update their paths to be relative to output directory
+    prefix = published_path.relative_to(output_path)
     for collection in published.collections.values():
-        for publication in collection.publications.values():
-            for artifact_key, artifact in publication.artifacts.items():
-                publication.artifacts[artifact_key] = _update_path(artifact)
+        lazy_published.update_paths(collection, prefix)
 
     return published
 
 
-def load_config(path, context=None):
+def rebase_published(universe, published_path, output_path, compact=False):
+    """Update the paths of an in-memory universe's artifacts.
+
+    This performs the same update as :func:`load_published`, but on a
+    universe that is already loaded, such as the one returned by
+    ``publish.publish`` when ``publish`` is run in the same process. The
+    universe is not modified; a copy is returned.
+
+    Parameters
+    ----------
+    universe : publish.Universe
+        The universe, with each artifact's path relative to ``published_path``.
+    published_path : pathlib.Path
+        The directory into which the artifacts were published.
+    output_path : pathlib.Path
+        Path to the output directory.
+    compact : bool
+        Whether the copied publications are compact and read-only, as the
+        publications used for rendering are; see
+        :func:`lazy_published.update_paths`.
+
+    Returns
+    -------
+    publish.Universe
+        A copy of the universe, with each artifact's path updated to be
+        relative to ``output_path``.
+
+    """
+    prefix = pathlib.Path(published_path).relative_to(output_path)
+
+    collections = {}
+    for collection_key, collection in universe.collections.items():
+        if compact:
+            # compact copies replace the publications, leaving the originals alone
+            publications = dict(collection.publications)
+        else:
+            publications = {
+                publication_key: publication._replace(
+                    artifacts=dict(publication.artifacts)
+                )
+                for publication_key, publication in collection.publications.items()
+            }
+        collection = collection._replace(publications=publications)
+        lazy_published.update_paths(collection, prefix, compact)
+        collections[collection_key] = collection
+
+    return universe._replace(collections=collections)
+
+
+def load_config(path, context=None, cache_path=None):
     """Read the configuration from a yaml file, performing interpolation.
 
     Parameters
     ----------
     path : pathlib.Path
         The path to the configuration file.
+    context : dict, optional
+        Variables made available to the configuration as ``context``.
+    cache_path : pathlib.Path, optional
+        A directory in which to cache the rendered and parsed configuration. An
+        entry is reused as long as the configuration file, the context, and
+        every file it includes are unchanged. If ``None``, nothing is cached.
+        The parsed configuration is stored as YAML and read back with PyYAML's
+        safe loader, so a tampered cache cannot run code; configurations that
+        hold other than plain data and dates are parsed again on every load.
 
     Returns
     -------
@@ -96,61 +179,304 @@ def load_config(path, context=None):
     if context is None:
         context = {}
 
-    variables = {"context": context}
+    if cache_path is None:
+        config, _ = _parse_config(path, _render_config(path, context))
+        return config
+
+    # the rendered yaml depends only on the source and the context; the parsed
+    # config also depends on the included files, which are checked separately.
+    # includes are resolved relative to the config file, so sites with the same
+    # config.yaml must not share an entry
+    config_cache = cache.RenderCache(cache_path)
+    key = cache.hash_bytes(
+        _CONFIG_CACHE_VERSION.encode(),
+        str(path.resolve()).encode(),
+        path.read_bytes(),
+        cache.hash_object(context).encode(),
+    )
+
+    cached = config_cache.get(key)
+    if cached is not None:
+        entry = json.loads(cached)
+        if all(
+            _hash_file(pathlib.Path(included)) == digest
+            for included, digest in entry["includes"].items()
+        ):
+            config = _load_cached_config(entry["config"])
+            if config is not None:
+                return config
+        rendered_yaml = entry["rendered_yaml"]
+    else:
+        rendered_yaml = _render_config(path, context)
+
+    config, includes = _parse_config(path, rendered_yaml)
+
+    config_cache.put(
+        key,
+        json.dumps(
+            {
+                "rendered_yaml": rendered_yaml,
+                "includes": includes,
+                "config": _dump_cached_config(config),
+            }
+        ),
+    )
+    config_cache.prune()
+
+    return config
+
+
+def _dump_cached_config(config):
+    """Serialize a parsed configuration as YAML, or None if it isn't plain data."""
+    try:
+        return yaml.safe_dump(config, sort_keys=False)
+    except yaml.YAMLError:
+        return None
+
+
+def _load_cached_config(dumped):
+    """Read back a configuration written by :func:`_dump_cached_config`, or None."""
+    if dumped is None:
+        return None
+    try:
+        return yaml.safe_load(dumped)
+    except yaml.YAMLError:
+        return None
+
+
+def _hash_file(path):
+    """Compute a hex digest of a file's contents, or None if it does not exist."""
+    try:
+        return cache.hash_bytes(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
 
-    # perform template interpolation
+def _render_config(path, context):
+    """Render the configuration file as a template, returning the yaml."""
     with path.open() as fileobj:
         template = jinja2.Template(fileobj.read(), undefined=jinja2.StrictUndefined)
 
-    rendered_yaml = template.render(**variables)
+    return template.render(context=context)
+
+
+def _parse_config(path, rendered_yaml):
+    """Parse the rendered configuration, resolving ``!include`` tags.
+
+    Returns
+    -------
+    (dict, dict)
+        The configuration, and a dict mapping the path of every included file
+        to the digest of its contents.
+
+    """
+    includes = {}
 
     # we'll subclass yaml.Loader and add a constructor
     class IncludingLoader(yaml.Loader):
         def include(self, node):
             included_path = path.parent / self.construct_scalar(node)
-            with included_path.open() as fileobj:
-                return yaml.load(fileobj, IncludingLoader)
+            contents = included_path.read_bytes()
+            includes[str(included_path)] = cache.hash_bytes(contents)
+            return yaml.load(contents, IncludingLoader)
 
     IncludingLoader.add_constructor("!include", IncludingLoader.include)
 
-    return yaml.load(rendered_yaml, Loader=IncludingLoader)
+    return yaml.load(rendered_yaml, Loader=IncludingLoader), includes
+
+
+class _BuildState:
+    """State shared by the elements over the course of a build.
+
+    Used by _PageRenderer. An instance is passed to every element as its
+    ``build`` argument.
+
+    Attributes
+    ----------
+    recorder : dependencies.ReadRecorder
+        Records the parts of the published universe read by the current page.
+    page : str
+        The output path of the page currently being rendered, relative to the
+        output directory.
+    used_now : bool
+        Whether the current page has asked for the time.
+    pages : dict
+        Maps the output paths of additional pages emitted while rendering the
+        current page to their body HTML. These are placed in the base template
+        before being written.
+    files : dict
+        Maps the output paths of additional files emitted while rendering the
+        current page to their contents. These are written verbatim.
+
+    """
+
+    def __init__(self, recorder=None):
+        if recorder is None:
+            recorder = dependencies.ReadRecorder()
+        self.recorder = recorder
+        self._memo = {}
+        self.start_page(None)
+
+    def start_page(self, page):
+        """Prepare to render a new page, discarding the previous page's outputs."""
+        self.page = page
+        self.used_now = False
+        self.pages = {}
+        self.files = {}
+        self.recorder.start()
+
+    def memoize(self, key, compute):
+        """Compute a value once per build.
+
+        The reads of the published universe made while computing the value are
+        remembered, and attributed to every page that uses the value.
+
+        Parameters
+        ----------
+        key : tuple
+            Identifies the value. Elements should use a tuple beginning with
+            the element's name.
+        compute : Callable[[], object]
+            Computes the value.
+
+        """
+        if key not in self._memo:
+            outer_reads = self.recorder.reads
+            self.recorder.reads = set()
+            try:
+                self._memo[key] = (compute(), self.recorder.reads)
+            finally:
+                self.recorder.reads = outer_reads
+
+        value, reads = self._memo[key]
+        self.recorder.reads.update(reads)
+        return value
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Capture the effects of rendering a part of the current page.
+
+        Yields a dict which, on exit, holds the reads of the published universe
+        made within the block as ``"reads"``, whether the time was asked for as
+        ``"used_now"``, and the additional outputs emitted as ``"pages"`` and
+        ``"files"``. The effects still apply to the current page; they can be
+        applied again to a later page with :meth:`replay`.
+
+        """
+        outer_reads, outer_used_now = self.recorder.reads, self.used_now
+        outer_pages, outer_files = set(self.pages), set(self.files)
+        self.recorder.reads = set()
+        self.used_now = False
+
+        effects = {}
+        try:
+            yield effects
+        finally:
+            reads = self.recorder.reads
+            effects["reads"] = sorted(reads, key=str)
+            effects["used_now"] = self.used_now
+            effects["pages"] = {
+                k: v for k, v in self.pages.items() if k not in outer_pages
+            }
+            effects["files"] = {
+                k: v for k, v in self.files.items() if k not in outer_files
+            }
+            outer_reads.update(reads)
+            self.recorder.reads = outer_reads
+            self.used_now = outer_used_now or self.used_now
+
+    def replay(self, effects):
+        """Apply effects captured by :meth:`capture` to the current page."""
+        self.recorder.reads.update(tuple(read) for read in effects["reads"])
+        self.used_now = self.used_now or effects["used_now"]
+        self.pages.update(effects["pages"])
+        self.files.update(effects["files"])
+
+    def now(self, now):
+        """Call ``now``, noting that the current page depends on the time."""
+        self.used_now = True
+        return now()
+
+    def add_page(self, relative_path, body_html):
+        """Emit an additional page, to be placed in the base template."""
+        self.pages[relative_path] = body_html
+
+    def add_file(self, relative_path, contents):
+        """Emit an additional file, to be written verbatim."""
+        self.files[relative_path] = contents
 
 
 class _Elements:
     """A class to create closures for page elements.
 
-    Used in abstract(). We instantiate _Elements with a universe and a
+    Used by _PageRenderer. We instantiate _Elements with a universe and a
     template loader. When an attribute of the instance is accessed, the element
     with that name will be pulled in from the elements module and its
     "templates" and "published" arguments will be closed over. The result is a
     function of one argument: the configuration.
 
+    If a memory profiler is given, every invocation of an element is profiled.
+
     """
 
-    def __init__(self, environment, now):
+    def __init__(self, environment, now, build, profiler=None):
         self.environment = environment
         self.now = now
+        self.build = build
+        self.profiler = profiler
 
     def __getattr__(self, attr):
         try:
             func = getattr(elements, attr)
         except AttributeError:
             raise RuntimeError(f'There is no element named "{attr}".')
-        return jinja2.contextfunction(
-            functools.partial(func, self.environment, now=self.now)
-        )
+        # record which pages depend on the time, so that the others can be
+        # reused when only the time has changed
+        now = functools.partial(self.build.now, self.now)
+        element = functools.partial(func, self.environment, now=now, build=self.build)
+
+        if self.profiler is not None:
+            profiler = self.profiler
 
+            def element(*args, _element=element, **kwargs):
+                with profiler.element(attr):
+                    return _element(*args, **kwargs)
 
-def _render_page(path, variables):
-    """Given page path and dict of variables, perform Jinja2 interpolation.
+        return jinja2.contextfunction(element)
+
+
+def _read_page(path):
+    """Read the source of a page.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The page's path.
+
+    Returns
+    -------
+    str
+        The page's contents.
+
+    """
+    with path.open() as fileobj:
+        return fileobj.read()
+
+
+def _render_page(path, contents, variables, environment):
+    """Given page path, its contents, and dict of variables, perform Jinja2 interpolation.
 
     Parameters
     ----------
     path : str
-        The page'spath.
+        The page's path. Used in error messages.
+    contents : str
+        The page's contents.
     variables : dict
         A dictionary mapping variable names to values available during
         interpolation.
+    environment : jinja2.Environment
+        The page environment; see :func:`_create_page_environment`.
 
     Returns
     -------
@@ -162,10 +488,7 @@ def _render_page(path, variables):
     Variables are delimited by ${ }, and blocks are delimited by ${%  %}.
 
     """
-    with path.open() as fileobj:
-        contents = fileobj.read()
-
-    template = jinja2.Template(contents, undefined=jinja2.StrictUndefined)
+    template = environment.from_string(contents)
 
     try:
         return template.render(**variables)
@@ -173,13 +496,15 @@ def _render_page(path, variables):
         raise exceptions.PageError(f'Problem rendering "{path}": {exc}')
 
 
-def _convert_markdown_to_html(contents):
+def _convert_markdown_to_html(contents, backend):
     """Convert markdown to HTML.
 
     Parameters
     ----------
     contents : str
         The markdown string.
+    backend : Callable[[str], str]
+        The Markdown backend; see :mod:`abstract.markdown_backends`.
 
     Returns
     -------
@@ -187,7 +512,7 @@ def _convert_markdown_to_html(contents):
         The HTML.
 
     """
-    return markdown.markdown(contents, extensions=['toc'])
+    return backend(contents)
 
 
 def _all_pages(input_path, output_path):
@@ -214,10 +539,22 @@ def _all_pages(input_path, output_path):
         yield page_path, new_path
 
 
-def _render_base(base_environment, body_html, config):
-    return base_environment.get_template("page.html").render(
-        body=body_html, config=config
-    )
+def _shard_pages(input_path, output_path, shard):
+    """Generate the pages belonging to a shard, as :func:`_all_pages` does.
+
+    If ``shard`` is ``None``, all pages are generated.
+
+    """
+    for old_path, new_path in _all_pages(input_path, output_path):
+        if sharding.in_shard(str(new_path.relative_to(output_path)), shard):
+            yield old_path, new_path
+
+
+def _shard_filter(output_path, shard):
+    """A predicate selecting the output files belonging to a shard, or None."""
+    if shard is None:
+        return None
+    return lambda path: sharding.in_shard(str(path.relative_to(output_path)), shard)
 
 
 def _validate_theme_schema(input_path, config):
@@ -231,11 +568,20 @@ def _validate_theme_schema(input_path, config):
         raise RuntimeError(f"Invalid theme config: {validator.errors}")
 
 
-def _create_element_environment(input_path):
+def _create_page_environment():
+    """Create the environment in which pages are interpolated."""
+    return jinja2.Environment(
+        undefined=jinja2.StrictUndefined,
+        extensions=[fragment_cache.FragmentCacheExtension],
+    )
+
+
+def _create_element_environment(input_path, convert_markdown):
     """Create the element environment and its custom filters."""
     element_environment = jinja2.Environment(
         loader=jinja2.FileSystemLoader(input_path / "theme" / "elements"),
         undefined=jinja2.StrictUndefined,
+        extensions=[fragment_cache.FragmentCacheExtension],
     )
 
     def evaluate(s, **kwargs):
@@ -256,7 +602,9 @@ def _create_element_environment(input_path):
             )
 
     element_environment.filters["evaluate"] = evaluate
-    element_environment.filters["markdown_to_html"] = _convert_markdown_to_html
+    element_environment.filters["markdown_to_html"] = functools.partial(
+        _convert_markdown_to_html, backend=convert_markdown
+    )
 
     return element_environment
 
@@ -266,16 +614,406 @@ def _create_base_template_environment(input_path):
     return jinja2.Environment(
         loader=jinja2.FileSystemLoader(input_path / "theme" / "base_templates"),
         undefined=jinja2.StrictUndefined,
+        extensions=[fragment_cache.FragmentCacheExtension],
     )
 
 
-def abstract(
+def _source_key_salt(input_path, config, context, markdown_backend, images_digest=""):
+    """Compute the part of a page's render key that does not change with time.
+
+    This hashes the configuration, the context, the theme's templates, the
+    Markdown backend, and the images seen by templates, as summarized by
+    :meth:`images.Images.digest`: everything that a page depends on except for
+    its own source, the published artifacts, and the time. Pages whose source key is
+    unchanged need only be rebuilt if they read a changed part of the
+    published universe or use the time; see :mod:`abstract.dependencies`.
+
+    Returns
+    -------
+    str
+        The hex digest.
+
+    """
+    theme_path = input_path / "theme"
+    return cache.hash_bytes(
+        _RENDER_KEY_VERSION.encode(),
+        cache.hash_object(config).encode(),
+        cache.hash_object(context).encode(),
+        cache.hash_tree(theme_path / "elements").encode(),
+        cache.hash_tree(theme_path / "base_templates").encode(),
+        markdown_backend.encode(),
+        images_digest.encode(),
+    )
+
+
+def _time_bucket(now, time_bucket):
+    """The number of the bucket of length ``time_bucket`` containing ``now()``."""
+    return int(now().timestamp() // time_bucket.total_seconds())
+
+
+def _render_key_salt(source_salt, published_hash, now, time_bucket):
+    """Compute the part of a page's render key that is shared by all pages.
+
+    A rendered page depends on its own source and on the configuration, the
+    context, the theme's templates, the published artifacts, the Markdown
+    backend, and the time. This extends the digest computed by
+    :func:`_source_key_salt` with the published artifacts, summarized by
+    ``published_hash``, and the time. The time is discretized into buckets of
+    length ``time_bucket`` so that builds within the same bucket can share
+    cached pages.
+
+    Returns
+    -------
+    str
+        The hex digest.
+
+    """
+    return cache.hash_bytes(
+        source_salt.encode(),
+        published_hash.encode(),
+        str(_time_bucket(now, time_bucket)).encode(),
+    )
+
+
+def _published_hash(published_path, output_path):
+    """Compute a hex digest of ``published.json``, or "" if there is none.
+
+    The digest includes the path of ``published_path`` relative to
+    ``output_path``, which prefixes every artifact's path in a rendered page.
+
+    """
+    if published_path is None:
+        return ""
+    return cache.hash_bytes(
+        str(published_path.relative_to(output_path)).encode(),
+        (published_path / "published.json").read_bytes(),
+    )
+
+
+def _markdown_backend_name(markdown_backend, config):
+    """Determine the name of the Markdown backend to use.
+
+    The backend given explicitly takes precedence over the ``markdown_backend``
+    key of the configuration.
+
+    """
+    if markdown_backend is not None:
+        return markdown_backend
+    return config.get("markdown_backend", markdown_backends.DEFAULT_BACKEND)
+
+
+def _render_key(salt, relative_path, contents):
+    """Compute the key identifying a page's rendered output.
+
+    Parameters
+    ----------
+    salt : str
+        The digest computed by :func:`_render_key_salt` or
+        :func:`_source_key_salt`.
+    relative_path : str
+        The page's output path, relative to the output directory.
+    contents : str
+        The page's source.
+
+    Returns
+    -------
+    str
+        The hex digest.
+
+    """
+    return cache.hash_bytes(salt.encode(), relative_path.encode(), contents.encode())
+
+
+def _hash_outputs(outputs):
+    """Hash each of a page's outputs.
+
+    Parameters
+    ----------
+    outputs : dict
+        Maps output paths to their contents.
+
+    Returns
+    -------
+    dict
+        Maps output paths to the hex digests of their contents.
+
+    """
+    return {
+        path: cache.hash_bytes(contents.encode()) for path, contents in outputs.items()
+    }
+
+
+def _all_outputs(the_manifest):
+    """The set of output paths of all of the pages in a manifest."""
+    return {path for page in the_manifest["pages"].values() for path in page["outputs"]}
+
+
+def _is_reusable(previous_page, source_key, changes, output_path):
+    """Determine whether a page's outputs from the previous build are still valid.
+
+    This is the case if the page's source key is unchanged, the page did not
+    use the time, it read none of the parts of the published universe that
+    changed, and its outputs still exist.
+
+    Parameters
+    ----------
+    previous_page : dict
+        The page's entry in the previous build's manifest.
+    source_key : str
+        The page's key computed with the salt from :func:`_source_key_salt`.
+    changes : Set[Tuple[str, Optional[str]]]
+        The changes to the published universe since the previous build, as
+        computed by :func:`dependencies.diff_digests`.
+    output_path : pathlib.Path
+        The output directory.
+
+    Returns
+    -------
+    bool
+
+    """
+    if previous_page.get("source_key") != source_key or previous_page.get(
+        "used_now", True
+    ):
+        return False
+
+    reads = [tuple(read) for read in previous_page.get("reads", [])]
+    if dependencies.is_affected(reads, changes):
+        return False
+
+    return all((output_path / p).exists() for p in previous_page["outputs"])
+
+
+def _load_images(input_path, image_cache_path, config, save=True):
+    """Scan the images of the static directory, if the image stage is enabled.
+
+    ``image_cache_path`` is the directory holding the derivatives and the
+    index of the images, or ``None`` if there is none.
+
+    Returns
+    -------
+    images.Images or None
+        The images, or ``None`` if the configuration has no ``images`` key.
+
+    """
+    settings = images.settings_from_config(config)
+    if settings is None:
+        return None
+
+    if image_cache_path is None:
+        raise RuntimeError(
+            "Derivatives of images are kept on disk, so a build that keeps no "
+            "state in its output directory needs an image cache path."
+        )
+    site_images = images.Images(input_path / "static", settings, image_cache_path)
+    site_images.scan(save=save)
+    return site_images
+
+
+def _static_trees(input_path, output_path, site_images=None):
+    """The static trees copied into the output.
+
+    Returns
+    -------
+    List[Tuple[pathlib.Path, pathlib.Path, Optional[dict]]]
+        The source and destination of each tree, and the extra files copied
+        into it, which map paths relative to the destination to the files in
+        the image cache; see :meth:`images.Images.derivatives`.
+
+    """
+    derivatives = None if site_images is None else site_images.derivatives()
+    return [
+        (input_path / "theme" / "style", output_path / "style", None),
+        (input_path / "static", output_path / "static", derivatives),
+    ]
+
+
+def _tree_files(source, extra_files=None):
+    """Generate the files of a source tree, as (file, relative path) pairs."""
+    for src in sorted(source.rglob("*")):
+        if not src.is_dir():
+            yield src, src.relative_to(source)
+    for relative_path, src in sorted((extra_files or {}).items()):
+        yield src, pathlib.PurePosixPath(relative_path)
+
+
+def _outdated_files(source, destination, include=None, extra_files=None):
+    """Find files in the source tree that are missing or outdated in the destination.
+
+    A file is considered outdated if its size or modification time differs
+    from that of the source file. Since files are copied along with their
+    modification times, this detects any change to the source. If ``include``
+    is given, only destinations for which it returns true are considered.
+    ``extra_files`` maps further paths, relative to the destination, to their
+    source files, which may not exist yet.
+
+    Yields
+    ------
+    (pathlib.Path, pathlib.Path)
+        The source file and its destination.
+
+    """
+    for src, relative_path in _tree_files(source, extra_files):
+        dst = destination / relative_path
+        if include is not None and not include(dst):
+            continue
+
+        try:
+            dst_stat = dst.stat()
+            src_stat = src.stat()
+        except FileNotFoundError:
+            yield src, dst
+            continue
+
+        if (src_stat.st_size, src_stat.st_mtime_ns) != (
+            dst_stat.st_size,
+            dst_stat.st_mtime_ns,
+        ):
+            yield src, dst
+
+
+def _stale_files(source, destination, include=None, extra_files=None):
+    """Find files in the destination tree that no longer exist in the source.
+
+    If ``include`` is given, destinations for which it returns false are also
+    considered stale. The paths in ``extra_files`` are not stale.
+
+    Yields
+    ------
+    pathlib.Path
+        The stale file in the destination.
+
+    """
+    if not destination.exists():
+        return
+
+    for dst in sorted(destination.rglob("*")):
+        if dst.is_dir():
+            continue
+        relative_path = dst.relative_to(destination)
+        in_source = (source / relative_path).exists() or (
+            extra_files is not None and relative_path.as_posix() in extra_files
+        )
+        if not in_source or (include is not None and not include(dst)):
+            yield dst
+
+
+def _sync_tree(source, destination, include=None, extra_files=None):
+    """Copy new and changed files to the destination, and remove stale ones.
+
+    If ``include`` is given, only destinations for which it returns true are
+    kept in sync; see :func:`_outdated_files`. ``extra_files`` are copied as
+    if they were in the source tree.
+
+    Returns
+    -------
+    (int, int)
+        The number of files and the number of bytes copied.
+
+    """
+    n_files = n_bytes = 0
+    for src, dst in _outdated_files(source, destination, include, extra_files):
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        # replace rather than overwrite, as the file may be shared with an older
+        # generation; see :mod:`abstract.generations`
+        dst.unlink(missing_ok=True)
+        shutil.copy2(src, dst)
+        n_files += 1
+        n_bytes += src.stat().st_size
+
+    for dst in _stale_files(source, destination, include, extra_files):
+        dst.unlink()
+
+    return n_files, n_bytes
+
+
+def _add_tree(output_backend, source, relative_path, extra_files=None):
+    """Add every file in the source tree, and the extra files, to a new output.
+
+    Returns
+    -------
+    (int, int)
+        The number of files and the number of bytes added.
+
+    """
+    n_files = n_bytes = 0
+    for src, path in _tree_files(source, extra_files):
+        output_backend.add_file(str(relative_path / path), src)
+        n_files += 1
+        n_bytes += src.stat().st_size
+    return n_files, n_bytes
+
+
+class PlannedPage(typing.NamedTuple):
+    """A page in a build plan.
+
+    Attributes
+    ----------
+    path : str
+        The page's output path, relative to the output directory.
+    action : str
+        One of ``"render"`` (the page will be rendered and written if its
+        output changed), ``"write"`` (the page is in the render cache, but its
+        output has changed), or ``"unchanged"``.
+    estimated_seconds : float
+        The estimated time needed to render the page.
+
+    """
+
+    path: str
+    action: str
+    estimated_seconds: float
+
+
+class Plan(typing.NamedTuple):
+    """What a build would do. Returned by :func:`plan`.
+
+    Attributes
+    ----------
+    pages : List[PlannedPage]
+        Every page that would be produced by the build.
+    deleted : List[str]
+        Outputs of the previous build that would be removed, relative to the
+        output directory.
+    static : List[str]
+        Static files that would be copied, relative to the output directory.
+    estimated_seconds : float
+        The estimated time needed to perform the build, based on timings
+        recorded during previous builds.
+    has_timings : bool
+        Whether timings from a previous build were available.
+
+    """
+
+    pages: typing.List[PlannedPage]
+    deleted: typing.List[str]
+    static: typing.List[str]
+    estimated_seconds: float
+    has_timings: bool
+
+
+def plan(
     input_path,
     output_path,
     published_path=None,
     context=None,
     now=datetime.datetime.now,
+    cache_path=None,
+    cache_mirror_path=None,
+    cache_time_bucket=datetime.timedelta(hours=1),
+    markdown_backend=None,
+    shard=None,
 ):
+    """Determine what a build would do, without rendering or writing anything.
+
+    The arguments have the same meaning as those of :func:`abstract`.
+
+    Returns
+    -------
+    Plan
+        The plan.
+
+    """
     if context is None:
         context = {}
 
@@ -284,54 +1022,1250 @@ def abstract(
     if published_path is not None:
         published_path = pathlib.Path(published_path)
 
-    # create the output path, if it doesn't already exist
-    output_path.mkdir(exist_ok=True)
+    previous = manifest.load_manifest(output_path)
+    config = load_config(input_path / "config.yaml", context=context)
+    site_images = _load_images(
+        input_path, manifest.state_path(output_path) / "images", config, save=False
+    )
+    source_salt = _source_key_salt(
+        input_path,
+        config,
+        context,
+        _markdown_backend_name(markdown_backend, config),
+        "" if site_images is None else site_images.digest(),
+    )
+    salt = _render_key_salt(
+        source_salt,
+        _published_hash(published_path, output_path),
+        now,
+        cache_time_bucket,
+    )
 
-    # load the publications and update their paths
     if published_path is not None:
-        published = load_published(published_path, output_path)
+        published = lazy_published.load(published_path, output_path)
     else:
         published = None
+    changes = dependencies.diff_digests(
+        previous["published"], dependencies.published_digests(published)
+    )
 
-    # load the configuration file
-    config = load_config(input_path / "config.yaml", context=context)
+    # only consult the render cache if it exists; opening it would create it
+    if cache_path is not None and pathlib.Path(cache_path).exists():
+        render_cache = cache.RenderCache(cache_path, mirror_path=cache_mirror_path)
+    else:
+        render_cache = None
+
+    # pages without a recorded timing are estimated to take the average time
+    durations = [
+        p["duration"] for p in previous["pages"].values() if p["duration"] is not None
+    ]
+    has_timings = bool(durations)
+    mean_duration = sum(durations) / len(durations) if durations else 0.0
+
+    pages = []
+    produced = set()
+    for old_path, new_path in _shard_pages(input_path, output_path, shard):
+        relative_path = str(new_path.relative_to(output_path))
+        contents = _read_page(old_path)
+        previous_page = previous["pages"].get(relative_path, {})
+        previous_outputs = previous_page.get("outputs", {})
+
+        source_key = _render_key(source_salt, relative_path, contents)
+        if _is_reusable(previous_page, source_key, changes, output_path):
+            produced.update(previous_outputs)
+            pages.append(PlannedPage(relative_path, "unchanged", 0.0))
+            continue
+
+        key = _render_key(salt, relative_path, contents)
+        cached = None if render_cache is None else render_cache.peek(key)
+        if cached is None:
+            # assume that the page will produce the same outputs as last time
+            produced.update(previous_outputs)
+            produced.add(relative_path)
+
+            duration = previous_page.get("duration")
+            if duration is None:
+                duration = mean_duration
+            pages.append(PlannedPage(relative_path, "render", duration))
+            continue
+
+        output_hashes = _hash_outputs(json.loads(cached)["outputs"])
+        produced.update(output_hashes)
+        if output_hashes == previous_outputs and all(
+            (output_path / p).exists() for p in output_hashes
+        ):
+            pages.append(PlannedPage(relative_path, "unchanged", 0.0))
+        else:
+            pages.append(PlannedPage(relative_path, "write", 0.0))
+
+    deleted = sorted(
+        p
+        for p in _all_outputs(previous)
+        if p not in produced and (output_path / p).exists()
+    )
 
-    # validate the config against the theme's schema
-    _validate_theme_schema(input_path, config)
+    static = []
+    n_static_bytes = 0
+    include = _shard_filter(output_path, shard)
+    for source, destination, extra in _static_trees(
+        input_path, output_path, site_images
+    ):
+        for src, dst in _outdated_files(source, destination, include, extra):
+            static.append(str(dst.relative_to(output_path)))
+            # derivatives of images not yet encoded have no size
+            if src.exists():
+                n_static_bytes += src.stat().st_size
+        for dst in _stale_files(source, destination, include, extra):
+            deleted.append(str(dst.relative_to(output_path)))
+
+    estimated_seconds = sum(p.estimated_seconds for p in pages)
+    bytes_per_second = previous["timings"].get("static_bytes_per_second")
+    if bytes_per_second:
+        estimated_seconds += n_static_bytes / bytes_per_second
+
+    return Plan(pages, deleted, static, estimated_seconds, has_timings)
+
+
+class _SiteState(typing.NamedTuple):
+    """The parts of a :class:`Site` that are replaced by :meth:`Site.reload_config`."""
+
+    config: dict
+    markdown_backend: str
+    convert_markdown: typing.Callable[[str], str]
+    images: typing.Optional[images.Images]
+    images_digest: str
+    page_environment: jinja2.Environment
+    element_environment: jinja2.Environment
+    base_environment: jinja2.Environment
+    base_layout: layout.BaseLayout
+    fragment_cache: typing.Optional[fragment_cache.FragmentCache]
+
+
+class _PageRenderer:
+    """Renders pages with a snapshot of a site's state.
+
+    Used by :class:`Site`. One is created for each build, and for each call to
+    :meth:`Site.render_page`; it is not shared between threads.
+
+    Attributes
+    ----------
+    state : _SiteState
+        The configuration and environments used to render.
+    published : publish.Universe or None
+        The publications.
+    published_hash : str
+        A digest of the publications, or "" if there are none.
+    recorder : dependencies.ReadRecorder
+        Records the publications read by the page being rendered.
+    build : _BuildState
+        The state shared by the elements.
 
-    # create environments for evaluation of base templates and element templates
-    element_environment = _create_element_environment(input_path)
-    base_environment = _create_base_template_environment(input_path)
+    """
 
-    # construct the variables used during page rendering
-    variables = {
-        "context": context,
-        "elements": _Elements(environment=element_environment, now=now),
-        "config": config,
-        "published": published,
-    }
+    def __init__(
+        self, state, published, context, now, profiler=None, published_hash=""
+    ):
+        self.state = state
+        self.published = published
+        self.published_hash = published_hash
+        self.profiler = profiler
+        self._published_digests = None
+
+        # pages see a view of the publications that records what they read
+        tracked_published, self.recorder = dependencies.track_reads(published)
+        self.build = _BuildState(self.recorder)
+        self.variables = {
+            "context": context,
+            "elements": _Elements(
+                environment=state.element_environment,
+                now=now,
+                build=self.build,
+                profiler=profiler,
+            ),
+            "config": state.config,
+            "published": tracked_published,
+        }
+
+    def render(self, source_path, relative_path, contents):
+        """Render a page.
+
+        Parameters
+        ----------
+        source_path : pathlib.Path
+            The page's source. Used in error messages.
+        relative_path : str
+            The page's output path, relative to the output directory.
+        contents : str
+            The page's source.
+
+        Returns
+        -------
+        dict
+            Maps the output path of the page, and of every additional output
+            emitted by its elements, to its contents.
+
+        """
+        with contextlib.ExitStack() as stack:
+            if self.profiler is not None:
+                stack.enter_context(self.profiler.page(relative_path))
+            if self.state.fragment_cache is not None:
+                stack.enter_context(
+                    self.state.fragment_cache.rendering(
+                        self.build, self.published_digests
+                    )
+                )
+            return self._render(source_path, relative_path, contents)
+
+    def published_digests(self):
+        """Summarize the publications, as :func:`dependencies.published_digests` does.
+
+        The summary is computed once, when first needed.
+
+        """
+        if self._published_digests is None:
+            self._published_digests = dependencies.published_digests(self.published)
+        return self._published_digests
+
+    def _render(self, source_path, relative_path, contents):
+        self.build.start_page(relative_path)
+        interpolated = _render_page(
+            source_path, contents, self.variables, self.state.page_environment
+        )
+        body_html = _convert_markdown_to_html(interpolated, self.state.convert_markdown)
 
-    # convert user pages
-    for old_path, new_path in _all_pages(input_path, output_path):
-        interpolated = _render_page(old_path, variables)
-        body_html = _convert_markdown_to_html(interpolated)
-        html = _render_base(base_environment, body_html, config)
+        base_layout = self.state.base_layout
+        outputs = {relative_path: base_layout.render(body_html, relative_path)}
+        for extra_path, extra_body_html in self.build.pages.items():
+            outputs[extra_path] = base_layout.render(extra_body_html, extra_path)
+        outputs.update(self.build.files)
+        return outputs
+
+
+class Site:
+    """A site whose configuration, templates, and publications stay loaded.
+
+    Creating a site loads and validates its configuration, creates its
+    template environments, and (lazily) loads its publications. These are
+    reused by every later render or build, until they are reloaded with
+    :meth:`reload_config` or :meth:`reload_published`. This makes a site cheap
+    to render repeatedly, as in a long-running service.
+
+    A site may be used from several threads at once. Each render or build
+    works with the configuration and publications as they were when it began,
+    even if they are reloaded in the meantime. Builds are performed one at a
+    time.
+
+    Parameters
+    ----------
+    input_path : pathlib.Path
+        The directory containing ``config.yaml``, ``pages``, ``static``, and
+        ``theme``.
+    output_path : pathlib.Path
+        The directory where the site will be written.
+    published_path : pathlib.Path, optional
+        The directory containing ``published.json``.
+    context : dict, optional
+        Variables made available to the configuration and the pages.
+    now : callable
+        Returns the current time as a :class:`datetime.datetime`.
+    markdown_backend : str, optional
+        The name of the Markdown backend. If ``None``, the ``markdown_backend``
+        key of the configuration is used, if present. See
+        :mod:`abstract.markdown_backends`.
+    universe : publish.Universe, optional
+        The publications, already in memory, as returned by ``publish.publish``
+        when ``publish`` runs in the same process. Their artifacts' paths are
+        relative to ``published_path``, which is then required, but
+        ``published.json`` is not read.
+    config_cache_path : pathlib.Path, optional
+        A directory in which to cache the loaded configuration. See
+        :func:`load_config`.
+    fragment_cache_path : pathlib.Path, optional
+        A directory in which to cache the fragments of templates marked with
+        the ``cache`` tag. If ``None``, such fragments are always rendered. See
+        :mod:`abstract.fragment_cache`.
+    fragment_cache_max_size : int
+        The upper bound on the size of the fragment cache, in bytes.
+    keep_state : bool
+        Whether state is kept between builds in ``output_path / ".abstract"``,
+        such as the index of the published collections. Sites built into an
+        output backend other than a directory should not keep state, so that
+        nothing is written into ``output_path``.
+    image_cache_path : pathlib.Path, optional
+        A directory in which to keep the derivatives of images; see
+        :mod:`abstract.images`. If ``None``, they are kept with the rest of the
+        state, which requires ``keep_state``.
+
+    """
+
+    def __init__(
+        self,
+        input_path,
+        output_path,
+        published_path=None,
+        context=None,
+        now=datetime.datetime.now,
+        markdown_backend=None,
+        universe=None,
+        config_cache_path=None,
+        fragment_cache_path=None,
+        fragment_cache_max_size=cache.DEFAULT_MAX_SIZE,
+        keep_state=True,
+        image_cache_path=None,
+    ):
+        if context is None:
+            context = {}
+
+        self.input_path = pathlib.Path(input_path)
+        self.output_path = pathlib.Path(output_path)
+        self.state_path = manifest.state_path(self.output_path) if keep_state else None
+        if image_cache_path is None and self.state_path is not None:
+            image_cache_path = self.state_path / "images"
+        self.image_cache_path = image_cache_path
+        self.published_path = (
+            None if published_path is None else pathlib.Path(published_path)
+        )
+        self.context = context
+        self.now = now
+        self.config_cache_path = config_cache_path
+        self._markdown_backend = markdown_backend
+
+        if universe is not None and self.published_path is None:
+            raise RuntimeError(
+                "The directory into which the universe was published is needed "
+                "to locate its artifacts."
+            )
+        self._universe = universe
+
+        if fragment_cache_path is None:
+            self._fragment_store = None
+        else:
+            self._fragment_store = cache.RenderCache(
+                fragment_cache_path, max_size=fragment_cache_max_size
+            )
+
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+        self.reload_config()
+        self.reload_published()
+
+    @property
+    def config(self):
+        """The loaded configuration."""
+        return self._state.config
+
+    @property
+    def published(self):
+        """The loaded publications, or ``None``."""
+        return self._published
 
-        with new_path.open("w") as fileobj:
-            fileobj.write(html)
+    def reload_config(self):
+        """Reload the configuration and recreate the template environments.
 
-    # copy static files
-    shutil.copytree(input_path / "theme" / "style", output_path / "style")
-    shutil.copytree(input_path / "static", output_path / "static")
+        If the image stage is enabled, the images of the static directory are
+        scanned again as well; see :mod:`abstract.images`.
 
+        Raises
+        ------
+        RuntimeError
+            If the configuration does not match the theme's schema, if the
+            Markdown backend is not available, or if the image stage is enabled
+            but Pillow is not installed. The site is left unchanged.
+
+        """
+        config = load_config(
+            self.input_path / "config.yaml",
+            context=self.context,
+            cache_path=self.config_cache_path,
+        )
+
+        # validate the config against the theme's schema
+        _validate_theme_schema(self.input_path, config)
+
+        # each thread gets its own instance of the markdown backend
+        markdown_backend = _markdown_backend_name(self._markdown_backend, config)
+        convert_markdown = markdown_backends.ThreadLocalBackend(markdown_backend)
+
+        site_images = _load_images(self.input_path, self.image_cache_path, config)
+        if site_images is None:
+            image_data, images_digest = {}, ""
+        else:
+            image_data = site_images.template_data()
+            images_digest = site_images.digest()
+
+        if self._fragment_store is None:
+            fragments = None
+        else:
+            fragments = fragment_cache.FragmentCache(
+                self._fragment_store,
+                _source_key_salt(
+                    self.input_path,
+                    config,
+                    self.context,
+                    markdown_backend,
+                    images_digest,
+                ),
+                self.now,
+            )
+
+        page_environment = _create_page_environment()
+        element_environment = _create_element_environment(
+            self.input_path, convert_markdown
+        )
+        base_environment = _create_base_template_environment(self.input_path)
+        for environment in (page_environment, element_environment, base_environment):
+            environment.fragment_cache = fragments
+            environment.globals["images"] = image_data
+
+        state = _SiteState(
+            config=config,
+            markdown_backend=markdown_backend,
+            convert_markdown=convert_markdown,
+            images=site_images,
+            images_digest=images_digest,
+            page_environment=page_environment,
+            element_environment=element_environment,
+            base_environment=base_environment,
+            # the base template is split once, around the body of each page
+            base_layout=layout.BaseLayout(base_environment, config),
+            fragment_cache=fragments,
+        )
+
+        with self._lock:
+            self._state = state
+
+    def reload_published(self, universe=None):
+        """Reload the publications.
+
+        Publications read from ``published.json`` are loaded lazily; each
+        collection is read, and its paths are updated, only when a page first
+        uses it. See :mod:`abstract.lazy_published`.
+
+        Parameters
+        ----------
+        universe : publish.Universe, optional
+            If given, it replaces the site's in-memory universe, as described
+            in :class:`Site`.
+
+        """
+        if universe is not None:
+            self._universe = universe
+
+        if self._universe is not None:
+            # publications used for rendering are kept compactly
+            published = rebase_published(
+                self._universe, self.published_path, self.output_path, compact=True
+            )
+            published_hash = cache.hash_object(
+                dependencies.published_digests(published)
+            )
+        elif self.published_path is None:
+            published, published_hash = None, ""
+        else:
+            published = lazy_published.load(
+                self.published_path,
+                self.output_path,
+                self.state_path,
+                compact=True,
+            )
+            published_hash = _published_hash(self.published_path, self.output_path)
+
+        with self._lock:
+            self._published = published
+            self._published_hash = published_hash
+
+    def _renderer(self, profiler=None):
+        with self._lock:
+            state, published = self._state, self._published
+            published_hash = self._published_hash
+        return _PageRenderer(
+            state, published, self.context, self.now, profiler, published_hash
+        )
+
+    def render_page(self, page):
+        """Render a single page without writing it.
+
+        Parameters
+        ----------
+        page : str or pathlib.Path
+            The page's path, relative to the ``pages`` directory.
+
+        Returns
+        -------
+        dict
+            Maps the output path of the page, and of every additional output
+            emitted by its elements, to its contents. Paths are relative to the
+            output directory.
+
+        """
+        source_path = self.input_path / "pages" / page
+        relative_path = str(pathlib.Path(page).with_suffix(".html"))
+        return self._renderer().render(
+            source_path, relative_path, _read_page(source_path)
+        )
+
+    def render_all(self):
+        """Render every page without writing them.
+
+        Returns
+        -------
+        dict
+            Maps the output path of every page and every additional output to
+            its contents. Paths are relative to the output directory.
+
+        """
+        renderer = self._renderer()
+        outputs = {}
+        for old_path, new_path in _all_pages(self.input_path, self.output_path):
+            relative_path = str(new_path.relative_to(self.output_path))
+            outputs.update(
+                renderer.render(old_path, relative_path, _read_page(old_path))
+            )
+        return outputs
+
+    def build(
+        self,
+        cache_path=None,
+        cache_mirror_path=None,
+        cache_max_size=cache.DEFAULT_MAX_SIZE,
+        cache_time_bucket=datetime.timedelta(hours=1),
+        search_index=False,
+        writer_threads=pipeline.DEFAULT_WRITER_THREADS,
+        fsync=False,
+        shard=None,
+        output_backend=None,
+        check_links=False,
+        cache_headers=False,
+        stats=None,
+        profiler=None,
+    ):
+        """Build the site into the output directory.
+
+        The parameters not listed here are described in :func:`abstract`.
+
+        Parameters
+        ----------
+        stats : metrics.BuildMetrics, optional
+            Collects metrics about the build. If given, its first phase should
+            already have started.
+        profiler : memory_profile.MemoryProfiler or cpu_profile.CPUProfiler, optional
+            Profiles the pages and the elements.
+
+        Raises
+        ------
+        exceptions.BrokenLinksError
+            If ``check_links`` is true and the site contains broken links. The
+            site is fully built nonetheless.
+
+        """
+        if shard is not None and search_index:
+            raise RuntimeError(
+                "The search index covers the whole site, so it cannot be built by "
+                "a sharded build."
+            )
+        if shard is not None and check_links:
+            raise RuntimeError(
+                "Links may point into other shards, so they cannot be checked by a "
+                "sharded build. Check the merged site with `abstract check-links`."
+            )
+        if shard is not None and cache_headers:
+            raise RuntimeError(
+                "The cache headers cover the whole site, so they cannot be written "
+                "by a sharded build."
+            )
+
+        if output_backend is None:
+            output_backend = output.FilesystemOutput(
+                self.output_path, writer_threads=writer_threads, fsync=fsync
+            )
+        elif not output_backend.incremental and (
+            search_index or check_links or cache_headers or shard is not None
+        ):
+            raise RuntimeError(
+                "The search index, link checking, cache headers, and sharded builds "
+                "require the output to be written to a directory."
+            )
+
+        if stats is None:
+            stats = metrics.BuildMetrics()
+            stats.now = self.now()
+            stats.start_phase("load")
+
+        with self._build_lock, output_backend:
+            self._build(
+                renderer=self._renderer(profiler),
+                cache_path=cache_path,
+                cache_mirror_path=cache_mirror_path,
+                cache_max_size=cache_max_size,
+                cache_time_bucket=cache_time_bucket,
+                search_index=search_index,
+                shard=shard,
+                output_backend=output_backend,
+                check_links=check_links,
+                cache_headers=cache_headers,
+                stats=stats,
+            )
+
+    def _build(
+        self,
+        *,
+        renderer,
+        cache_path,
+        cache_mirror_path,
+        cache_max_size,
+        cache_time_bucket,
+        search_index,
+        shard,
+        output_backend,
+        check_links,
+        cache_headers,
+        stats,
+    ):
+        input_path, output_path = self.input_path, self.output_path
+        config, published = renderer.state.config, renderer.published
+
+        # load the manifest of the previous build; outputs that don't persist
+        # between builds are always built from scratch
+        if output_backend.incremental:
+            previous = manifest.load_manifest(output_path)
+        else:
+            previous = manifest.new_manifest()
+        current = manifest.new_manifest()
+
+        # determine which publications changed since the previous build
+        current["published"] = renderer.published_digests()
+        changes = dependencies.diff_digests(
+            previous["published"], current["published"]
+        )
+
+        # open the render cache, if one is used
+        if cache_path is not None:
+            render_cache = cache.RenderCache(
+                cache_path, mirror_path=cache_mirror_path, max_size=cache_max_size
+            )
+        else:
+            render_cache = None
+
+        source_salt = _source_key_salt(
+            input_path,
+            config,
+            self.context,
+            renderer.state.markdown_backend,
+            renderer.state.images_digest,
+        )
+        salt = _render_key_salt(
+            source_salt, renderer.published_hash, self.now, cache_time_bucket
+        )
+
+        # convert user pages; sources are read ahead and outputs are written in
+        # the background, so that rendering does not wait on the filesystem
+        pages = pipeline.prefetch(
+            _shard_pages(input_path, output_path, shard),
+            lambda paths: _read_page(paths[0]),
+        )
+
+        stats.start_phase("render")
+        written = set()
+        with contextlib.closing(pages):
+            for (old_path, new_path), contents in pages:
+                relative_path = str(new_path.relative_to(output_path))
+                previous_page = previous["pages"].get(relative_path, {})
+
+                # skip pages unaffected by what changed since the previous build
+                source_key = _render_key(source_salt, relative_path, contents)
+                if _is_reusable(previous_page, source_key, changes, output_path):
+                    current["pages"][relative_path] = previous_page
+                    stats.count("pages_skipped")
+                    continue
+
+                key = _render_key(salt, relative_path, contents)
+                cached = None if render_cache is None else render_cache.get(key)
+
+                if cached is None:
+                    start = time.perf_counter()
+                    outputs = renderer.render(old_path, relative_path, contents)
+                    reads = sorted(renderer.recorder.reads, key=str)
+                    used_now = renderer.build.used_now
+                    duration = time.perf_counter() - start
+                    stats.count("pages_rendered")
+
+                    if render_cache is not None:
+                        render_cache.put(
+                            key,
+                            json.dumps(
+                                {
+                                    "outputs": outputs,
+                                    "reads": reads,
+                                    "used_now": used_now,
+                                }
+                            ),
+                        )
+                else:
+                    entry = json.loads(cached)
+                    outputs = entry["outputs"]
+                    reads = entry["reads"]
+                    used_now = entry["used_now"]
+                    # keep the last known render time, for estimating future builds
+                    duration = previous_page.get("duration")
+                    stats.count("pages_cached")
+
+                output_hashes = _hash_outputs(outputs)
+                previous_outputs = previous_page.get("outputs", {})
+                for path, page_output in outputs.items():
+                    if (
+                        previous_outputs.get(path) != output_hashes[path]
+                        or not output_backend.exists(path)
+                    ):
+                        output_backend.write(path, page_output)
+                        written.add(path)
+
+                current["pages"][relative_path] = {
+                    "source": str(old_path.relative_to(input_path)),
+                    "key": key,
+                    "source_key": source_key,
+                    "outputs": output_hashes,
+                    "reads": [list(read) for read in reads],
+                    "used_now": used_now,
+                    "duration": duration,
+                }
+
+        output_backend.flush()
+        stats.count("outputs_written", output_backend.n_files)
+        stats.count("bytes_written", output_backend.n_bytes)
+
+        stats.start_phase("cleanup")
+        if render_cache is not None:
+            stats.record_cache("render", *render_cache.take_counts())
+            render_cache.prune()
+
+        fragment_store = self._fragment_store
+        if fragment_store is not None:
+            # the store is shared with renders running in other threads
+            stats.record_cache("fragment", *fragment_store.take_counts())
+            fragment_store.prune()
+
+        # remove the outputs of pages that no longer exist
+        for path in _all_outputs(previous) - _all_outputs(current):
+            output_backend.delete(path)
+            stats.count("outputs_deleted")
+
+        # index the pages for search
+        if search_index:
+            stats.start_phase("search")
+            search.update_search_index(
+                output_path,
+                manifest.state_path(output_path),
+                pages=[p for p in _all_outputs(current) if p.endswith(".html")],
+                changed=written,
+                published=published,
+            )
+
+        # encode the derivatives of images missing from the image cache
+        include = _shard_filter(output_path, shard)
+        site_images = renderer.state.images
+        if site_images is not None:
+            stats.start_phase("images")
+            static_path = output_path / "static"
+            n_encoded = site_images.generate(
+                include=None if include is None else lambda p: include(static_path / p)
+            )
+            stats.count("images_encoded", n_encoded)
+
+        # copy static files
+        stats.start_phase("static")
+        start = time.perf_counter()
+        n_static_bytes = 0
+        for source, destination, extra in _static_trees(
+            input_path, output_path, site_images
+        ):
+            if output_backend.incremental:
+                n_files, n_bytes = _sync_tree(source, destination, include, extra)
+            else:
+                n_files, n_bytes = _add_tree(
+                    output_backend, source, destination.relative_to(output_path), extra
+                )
+            stats.count("static_files_synced", n_files)
+            n_static_bytes += n_bytes
+        static_duration = time.perf_counter() - start
+        stats.count("static_bytes_synced", n_static_bytes)
+
+        if n_static_bytes:
+            current["timings"]["static_bytes_per_second"] = (
+                n_static_bytes / static_duration
+            )
+        elif "static_bytes_per_second" in previous["timings"]:
+            current["timings"]["static_bytes_per_second"] = previous["timings"][
+                "static_bytes_per_second"
+            ]
+
+        stats.start_phase("save")
+        if output_backend.incremental:
+            manifest.save_manifest(output_path, current)
+            # record the contents of every output, for deploying deltas
+            files = deploy.update_file_manifest(output_path)
+
+            if cache_headers:
+                policies = headers.cache_policies(
+                    files, current["pages"], published, config, self.now()
+                )
+                headers.write_headers(output_path, files, policies)
+                deploy.update_file_manifest(output_path)
+
+        if shard is not None:
+            sharding.save_shard_manifest(
+                output_path,
+                shard,
+                {
+                    "config": cache.hash_object(config),
+                    "context": cache.hash_object(self.context),
+                    "theme": cache.hash_tree(input_path / "theme"),
+                    "published": renderer.published_hash,
+                    # pages are rendered as of a time; shards must agree on it
+                    "time": [
+                        _time_bucket(self.now, cache_time_bucket),
+                        cache_time_bucket.total_seconds(),
+                    ],
+                },
+            )
+        elif output_backend.incremental:
+            sharding.remove_shard_manifest(output_path)
+
+        broken_links = []
+        if check_links:
+            stats.start_phase("links")
+            broken_links = linkcheck.check_links(output_path)
+            stats.count("broken_links", len(broken_links))
+
+        if published is not None and hasattr(published.collections, "loaded"):
+            stats.count(
+                "published_collections_loaded", len(published.collections.loaded)
+            )
+        stats.finish()
+
+        if broken_links:
+            raise exceptions.BrokenLinksError(broken_links)
+
+
+def abstract(
+    input_path,
+    output_path,
+    published_path=None,
+    context=None,
+    now=datetime.datetime.now,
+    cache_path=None,
+    cache_mirror_path=None,
+    cache_max_size=cache.DEFAULT_MAX_SIZE,
+    cache_time_bucket=datetime.timedelta(hours=1),
+    search_index=False,
+    writer_threads=pipeline.DEFAULT_WRITER_THREADS,
+    fsync=False,
+    markdown_backend=None,
+    shard=None,
+    output_backend=None,
+    check_links=False,
+    cache_headers=False,
+    metrics_path=None,
+    memory_profile_path=None,
+    cpu_profile_path=None,
+    cpu_profile_page=None,
+    cpu_profile_element=None,
+    universe=None,
+    keep_generations=None,
+):
+    """Build the site.
+
+    This is a shorthand for creating a :class:`Site` and calling its
+    :meth:`Site.build` method. Pages whose output is identical to that of the
+    previous build are not rewritten, and the outputs of pages that no longer
+    exist are removed. Static files are copied only if they are new or have
+    changed.
+
+    Parameters
+    ----------
+    input_path : pathlib.Path
+        The directory containing ``config.yaml``, ``pages``, ``static``, and
+        ``theme``.
+    output_path : pathlib.Path
+        The directory where the site will be written.
+    published_path : pathlib.Path, optional
+        The directory containing ``published.json``.
+    context : dict, optional
+        Variables made available to the configuration and the pages.
+    now : callable
+        Returns the current time as a :class:`datetime.datetime`.
+    cache_path : pathlib.Path, optional
+        A directory to use as a persistent render cache. The configuration and
+        the fragments marked with the ``cache`` tag are cached in
+        subdirectories. If ``None``, no cache is used.
+    cache_mirror_path : pathlib.Path, optional
+        A read-only render cache consulted on a miss in ``cache_path``.
+    cache_max_size : int
+        The upper bound on the size of the render cache, in bytes.
+    cache_time_bucket : datetime.timedelta
+        Cached pages rendered within the same bucket of time are reused.
+    search_index : bool
+        Whether to write a client-side search index to ``search/``. See
+        :mod:`abstract.search`.
+    writer_threads : int
+        The number of threads writing outputs. Page sources are read, and
+        outputs written, in the background while other pages render.
+    fsync : bool
+        Whether to flush each output to disk before it replaces the old one.
+    markdown_backend : str, optional
+        The name of the Markdown backend. If ``None``, the ``markdown_backend``
+        key of the configuration is used, if present. See
+        :mod:`abstract.markdown_backends`.
+    shard : sharding.Shard, optional
+        If given, only the pages and static files belonging to this shard are
+        built, and a shard manifest is written so that the output can be
+        combined with that of the other shards by :func:`sharding.merge`.
+    output_backend : optional
+        Where the outputs are written; see :mod:`abstract.output`. If ``None``,
+        they are written into ``output_path``. Otherwise ``output_path`` is
+        only used to locate ``published_path`` relative to the site's root,
+        and each build starts from scratch.
+    check_links : bool
+        Whether to check the relative links of the built site, raising
+        :class:`exceptions.BrokenLinksError` if any are broken. See
+        :mod:`abstract.linkcheck`.
+    cache_headers : bool
+        Whether to write a ``_headers`` file giving each output an ETag and a
+        cache policy. See :mod:`abstract.headers`.
+    metrics_path : pathlib.Path, optional
+        If given, metrics about the build are written to this file for
+        Prometheus' textfile collector. See :mod:`abstract.metrics`.
+    memory_profile_path : pathlib.Path, optional
+        If given, the memory used by the build is traced, and a report is
+        written to this file. See :mod:`abstract.memory_profile`.
+    cpu_profile_path : pathlib.Path, optional
+        If given, the build is profiled with :mod:`cProfile`, and a pstats file
+        and folded stacks for flamegraphs are written into this directory. See
+        :mod:`abstract.cpu_profile`. Cannot be combined with
+        ``memory_profile_path``, since tracing memory distorts timings.
+    cpu_profile_page : str, optional
+        Profile only the rendering of the page with this output path.
+    cpu_profile_element : str, optional
+        Profile only the invocations of the element with this name.
+    universe : publish.Universe, optional
+        The publications, already in memory, with artifact paths relative to
+        ``published_path``. If given, ``published.json`` is not read. This
+        lets ``publish`` and ``abstract`` run in a single process without
+        serializing the universe in between; see :class:`Site`.
+    keep_generations : int, optional
+        If given, the site is built into a new generation directory in
+        ``output_path``, starting from hardlinks to the files of the current
+        one, and ``output_path / "current"`` is switched to it atomically once
+        the build succeeds. This many generations are kept for rollback. See
+        :mod:`abstract.generations`.
+
+    """
+    if keep_generations is not None and (
+        output_backend is not None or shard is not None
+    ):
+        raise RuntimeError(
+            "Generations are directories switched to once complete, so they "
+            "cannot be combined with other outputs or with sharded builds."
+        )
+
+    stats = metrics.BuildMetrics()
+    stats.now = now()
+
+    if memory_profile_path is not None and cpu_profile_path is not None:
+        raise RuntimeError(
+            "Tracing memory distorts timings, so memory and time must be profiled "
+            "in separate builds."
+        )
+
+    if memory_profile_path is not None:
+        profiler = memory_profile.MemoryProfiler()
+    elif cpu_profile_path is not None:
+        profiler = cpu_profile.CPUProfiler(
+            page=cpu_profile_page, element=cpu_profile_element
+        )
+    else:
+        profiler = None
+
+    if profiler is not None:
+        stats.add_listener(profiler.phase_boundary)
+
+    if keep_generations is None:
+        directory = contextlib.nullcontext(output_path)
+    else:
+        output_path = pathlib.Path(output_path)
+        directory = generations.new_generation(
+            output_path, keep_generations, published_path
+        )
+
+    broken_links = None
+    with profiler if profiler is not None else contextlib.nullcontext():
+        stats.start_phase("load")
+        try:
+            # a generation with broken links is discarded rather than switched to
+            with directory as build_path:
+                if published_path is not None and keep_generations is not None:
+                    published_path = generations.within(
+                        output_path, build_path, published_path
+                    )
+                site = Site(
+                    input_path,
+                    build_path,
+                    published_path,
+                    context=context,
+                    now=now,
+                    markdown_backend=markdown_backend,
+                    universe=universe,
+                    # cache the configuration alongside the rendered pages
+                    config_cache_path=(
+                        None
+                        if cache_path is None
+                        else pathlib.Path(cache_path) / "config"
+                    ),
+                    fragment_cache_path=(
+                        None
+                        if cache_path is None
+                        else pathlib.Path(cache_path) / "fragments"
+                    ),
+                    fragment_cache_max_size=cache_max_size,
+                    # outputs other than directories leave output_path untouched
+                    keep_state=output_backend is None or output_backend.incremental,
+                    image_cache_path=(
+                        None
+                        if cache_path is None
+                        else pathlib.Path(cache_path) / "images"
+                    ),
+                )
+                site.build(
+                    cache_path=cache_path,
+                    cache_mirror_path=cache_mirror_path,
+                    cache_max_size=cache_max_size,
+                    cache_time_bucket=cache_time_bucket,
+                    search_index=search_index,
+                    writer_threads=writer_threads,
+                    fsync=fsync,
+                    shard=shard,
+                    output_backend=output_backend,
+                    check_links=check_links,
+                    cache_headers=cache_headers,
+                    stats=stats,
+                    profiler=profiler,
+                )
+        except exceptions.BrokenLinksError as exc:
+            # the site was built, so its metrics are still reported
+            broken_links = exc
+
+    if metrics_path is not None:
+        metrics.write_textfile(pathlib.Path(metrics_path), stats)
+    if memory_profile_path is not None:
+        profiler.write_report(pathlib.Path(memory_profile_path))
+    if cpu_profile_path is not None:
+        profiler.write(pathlib.Path(cpu_profile_path))
+    if broken_links is not None:
+        raise broken_links
+
+
+def _print_plan(the_plan):
+    """Print a build plan in a human-readable format."""
+    for page in the_plan.pages:
+        if page.action == "render":
+            print(f"{page.action:<10} {page.path}  (~{page.estimated_seconds:.3f}s)")
+        else:
+            print(f"{page.action:<10} {page.path}")
+
+    for path in the_plan.static:
+        print(f"{'copy':<10} {path}")
+
+    for path in the_plan.deleted:
+        print(f"{'delete':<10} {path}")
+
+    if the_plan.has_timings:
+        print(f"Estimated time: {the_plan.estimated_seconds:.2f}s")
+    else:
+        print("Estimated time: unknown (no timings from a previous build)")
+
+
+def _merge_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog="abstract merge",
+        description="Combine the outputs of a sharded build into a single site.",
+    )
+    parser.add_argument("shard_paths", nargs="+", type=pathlib.Path)
+    parser.add_argument("output_path", type=pathlib.Path)
+    args = parser.parse_args(argv)
+
+    sharding.merge(args.shard_paths, args.output_path)
+
+
+def _delta_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog="abstract delta",
+        description="Write an archive of the changes since a deployed build.",
+    )
+    parser.add_argument(
+        "base_manifest",
+        type=pathlib.Path,
+        help="The .abstract/files.json of the deployed build.",
+    )
+    parser.add_argument("output_path", type=pathlib.Path)
+    parser.add_argument("archive_path", type=pathlib.Path)
+    args = parser.parse_args(argv)
+
+    delta = deploy.write_delta(args.base_manifest, args.output_path, args.archive_path)
+    print(f"{len(delta.changed)} changed, {len(delta.deleted)} deleted")
+
+
+def _apply_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog="abstract apply",
+        description="Apply an archive written by `abstract delta` to a deployed site.",
+    )
+    parser.add_argument("archive_path", type=pathlib.Path)
+    parser.add_argument("site_path", type=pathlib.Path)
+    args = parser.parse_args(argv)
+
+    delta = deploy.apply_delta(args.archive_path, args.site_path)
+    print(f"{len(delta.changed)} changed, {len(delta.deleted)} deleted")
+
+
+def _rollback_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog="abstract rollback",
+        description="Switch a site built with --generations back to its previous "
+        "generation.",
+    )
+    parser.add_argument("output_path", type=pathlib.Path)
+    args = parser.parse_args(argv)
+
+    generation = generations.rollback(args.output_path)
+    print(f"{args.output_path / generations.CURRENT} -> {generation.name}")
+
+
+def _check_links_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog="abstract check-links",
+        description="Check the relative links of a built site.",
+    )
+    parser.add_argument("output_path", type=pathlib.Path)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="The maximum number of processes parsing pages.",
+    )
+    args = parser.parse_args(argv)
+
+    broken = linkcheck.check_links(args.output_path, max_workers=args.workers)
+    for link in broken:
+        print(link)
+    if broken:
+        sys.exit(f"{len(broken)} broken link(s)")
+
+
+def cli(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv[:1] == ["merge"]:
+        return _merge_cli(argv[1:])
+    if argv[:1] == ["delta"]:
+        return _delta_cli(argv[1:])
+    if argv[:1] == ["apply"]:
+        return _apply_cli(argv[1:])
+    if argv[:1] == ["check-links"]:
+        return _check_links_cli(argv[1:])
+    if argv[:1] == ["rollback"]:
+        return _rollback_cli(argv[1:])
 
-def cli():
     parser = argparse.ArgumentParser()
     parser.add_argument("output_path")
     parser.add_argument("--published")
     parser.add_argument("--now")
     parser.add_argument("--context", type=pathlib.Path)
-    args = parser.parse_args()
+    parser.add_argument("--cache", type=pathlib.Path)
+    parser.add_argument("--cache-mirror", type=pathlib.Path)
+    parser.add_argument(
+        "--cache-max-size", type=int, help="In megabytes.", default=None
+    )
+    parser.add_argument(
+        "--cache-time-bucket", type=int, help="In minutes.", default=60
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="Write a client-side search index to search/.",
+    )
+    parser.add_argument(
+        "--writer-threads", type=int, default=pipeline.DEFAULT_WRITER_THREADS
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Flush each output to disk before replacing the old one.",
+    )
+    parser.add_argument(
+        "--markdown-backend",
+        choices=list(markdown_backends.BACKENDS),
+        help="Overrides the markdown_backend key of the configuration.",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Show what the build would do without performing it.",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=pathlib.Path,
+        help="Write build metrics to this file for Prometheus' textfile collector.",
+    )
+    parser.add_argument(
+        "--memory-profile",
+        type=pathlib.Path,
+        help="Trace memory use, and write a JSON report to this file.",
+    )
+    parser.add_argument(
+        "--cprofile",
+        type=pathlib.Path,
+        metavar="DIRECTORY",
+        help="Profile the build, and write profile.pstats and profile.folded "
+        "(for flamegraphs) into this directory.",
+    )
+    parser.add_argument(
+        "--cprofile-page",
+        help="With --cprofile, profile only the page with this output path.",
+    )
+    parser.add_argument(
+        "--cprofile-element",
+        help="With --cprofile, profile only the element with this name.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=sharding.parse_shard,
+        help="Build only shard i of N, given as i/N. Combine with `abstract merge`.",
+    )
+    parser.add_argument(
+        "--archive",
+        type=pathlib.Path,
+        help="Write the site into this .zip, .tar, or .tar.gz archive instead of "
+        "OUTPUT_PATH, which is still used to locate the published directory.",
+    )
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        help="Fail if the built site contains broken relative links.",
+    )
+    parser.add_argument(
+        "--cache-headers",
+        action="store_true",
+        help="Write a _headers file with ETags and cache policies for each output.",
+    )
+    parser.add_argument(
+        "--generations",
+        type=int,
+        metavar="N",
+        help="Build into a new generation directory in OUTPUT_PATH, switch "
+        "OUTPUT_PATH/current to it once complete, and keep the last N generations. "
+        "Undo with `abstract rollback`.",
+    )
+    args = parser.parse_args(argv)
 
     context = {}
     if args.context is not None:
@@ -352,6 +2286,64 @@ def cli():
 
         print(f"Running as if it is currently {_now}")
 
+    if args.cache_max_size is None:
+        cache_max_size = cache.DEFAULT_MAX_SIZE
+    else:
+        cache_max_size = args.cache_max_size * 2 ** 20
+
+    if args.archive is None:
+        output_backend = None
+    else:
+        output_backend = output.ArchiveOutput(args.archive)
+
+    if args.plan:
+        # a new generation starts from the current one
+        plan_output_path = pathlib.Path(args.output_path)
+        plan_published_path = args.published
+        if args.generations is not None:
+            plan_output_path = plan_output_path / generations.CURRENT
+            if plan_published_path is not None:
+                plan_published_path = generations.within(
+                    pathlib.Path(args.output_path), plan_output_path, args.published
+                )
+
+        the_plan = plan(
+            pathlib.Path.cwd(),
+            plan_output_path,
+            plan_published_path,
+            context=context,
+            now=now,
+            cache_path=args.cache,
+            cache_mirror_path=args.cache_mirror,
+            cache_time_bucket=datetime.timedelta(minutes=args.cache_time_bucket),
+            markdown_backend=args.markdown_backend,
+            shard=args.shard,
+        )
+        _print_plan(the_plan)
+        return
+
     abstract(
-        pathlib.Path.cwd(), args.output_path, args.published, context=context, now=now
+        pathlib.Path.cwd(),
+        args.output_path,
+        args.published,
+        context=context,
+        now=now,
+        cache_path=args.cache,
+        cache_mirror_path=args.cache_mirror,
+        cache_max_size=cache_max_size,
+        cache_time_bucket=datetime.timedelta(minutes=args.cache_time_bucket),
+        search_index=args.search_index,
+        writer_threads=args.writer_threads,
+        fsync=args.fsync,
+        markdown_backend=args.markdown_backend,
+        shard=args.shard,
+        output_backend=output_backend,
+        check_links=args.check_links,
+        cache_headers=args.cache_headers,
+        metrics_path=args.metrics,
+        memory_profile_path=args.memory_profile,
+        cpu_profile_path=args.cprofile,
+        cpu_profile_page=args.cprofile_page,
+        cpu_profile_element=args.cprofile_element,
+        keep_generations=args.generations,
     )
@@ -0,0 +1,264 @@
+"""A content-addressed, on-disk cache of rendered pages."""
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import threading
+
+
+# the default upper bound on the size of the cache directory, in bytes
+DEFAULT_MAX_SIZE = 256 * 2 ** 20
+
+
+def hash_bytes(*parts):
+    """Compute a hex digest of one or more byte strings.
+
+    Each part is length-prefixed before hashing, so that ``(b"ab", b"c")`` and
+    ``(b"a", b"bc")`` produce different digests.
+
+    Parameters
+    ----------
+    parts : bytes
+        The byte strings to hash.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest.
+
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(len(part)).encode() + b":")
+        h.update(part)
+    return h.hexdigest()
+
+
+def hash_object(obj):
+    """Compute a canonical hex digest of a JSON-like object.
+
+    Keys are sorted, and values that are not natively JSON serializable (such
+    as dates) are hashed through their string representation.
+
+    Parameters
+    ----------
+    obj
+        A structure of dicts, lists, and scalars.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest.
+
+    """
+    serialized = json.dumps(obj, sort_keys=True, default=str)
+    return hash_bytes(serialized.encode())
+
+
+def hash_tree(path):
+    """Compute a hex digest of the names and contents of every file in a tree.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The root of the tree. If it does not exist, the digest of an empty
+        tree is returned.
+
+    Returns
+    -------
+    str
+        The SHA-256 hex digest.
+
+    """
+    parts = []
+    if path.exists():
+        for child in sorted(path.rglob("*")):
+            if child.is_file():
+                parts.append(str(child.relative_to(path)).encode())
+                parts.append(child.read_bytes())
+    return hash_bytes(*parts)
+
+
+class RenderCache:
+    """A content-addressed cache of rendered pages stored in a directory.
+
+    Entries are addressed by a key computed from everything that can affect a
+    rendered page; see :func:`abstract.abstract`. Each entry is stored in its
+    own file along with a digest of its contents, which is verified whenever
+    the entry is read. Corrupted entries are discarded and treated as misses.
+
+    The cache directory is self-contained, so it can be saved and restored
+    between machines (for instance, as a CI artifact). Optionally, a read-only
+    mirror directory with the same layout can be consulted on a miss; entries
+    found there are copied into the local cache.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The cache directory. It is created if it does not exist.
+    mirror_path : pathlib.Path, optional
+        A read-only cache directory consulted when an entry is not found
+        locally.
+    max_size : int, optional
+        The upper bound on the total size of the entries, in bytes. When it is
+        exceeded, the least-recently used entries are evicted by
+        :meth:`prune`. Defaults to :data:`DEFAULT_MAX_SIZE`.
+
+    Attributes
+    ----------
+    hits : int
+        The number of successful lookups.
+    misses : int
+        The number of unsuccessful lookups.
+
+    The counters are updated under a lock, so a cache may be shared by threads;
+    use :meth:`take_counts` to read and reset them together.
+
+    """
+
+    def __init__(self, path, mirror_path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = pathlib.Path(path)
+        self.mirror_path = None if mirror_path is None else pathlib.Path(mirror_path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._counts_lock = threading.Lock()
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _entry_path(root, key):
+        return root / key[:2] / key[2:]
+
+    @staticmethod
+    def _read_entry(entry_path):
+        """Read and verify an entry. Returns None if missing or corrupt."""
+        try:
+            raw = entry_path.read_bytes()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        digest, _, payload = raw.partition(b"\n")
+        if digest.decode("ascii", "replace") != hashlib.sha256(payload).hexdigest():
+            return None
+
+        return payload
+
+    def get(self, key):
+        """Retrieve a cached page.
+
+        Parameters
+        ----------
+        key : str
+            The entry's key.
+
+        Returns
+        -------
+        str or None
+            The cached value, or ``None`` if there is no valid entry.
+
+        """
+        entry_path = self._entry_path(self.path, key)
+        payload = self._read_entry(entry_path)
+
+        if payload is None and entry_path.exists():
+            # the entry failed its integrity check
+            entry_path.unlink()
+
+        if payload is None and self.mirror_path is not None:
+            mirror_entry_path = self._entry_path(self.mirror_path, key)
+            payload = self._read_entry(mirror_entry_path)
+            if payload is not None:
+                entry_path.parent.mkdir(exist_ok=True)
+                shutil.copyfile(mirror_entry_path, entry_path)
+
+        if payload is None:
+            with self._counts_lock:
+                self.misses += 1
+            return None
+
+        # bump the modification time; it is used to determine recency of use
+        os.utime(entry_path)
+        with self._counts_lock:
+            self.hits += 1
+        return payload.decode("utf-8")
+
+    def take_counts(self):
+        """Read the numbers of hits and misses, and reset them to zero.
+
+        Returns
+        -------
+        (int, int)
+            The hits and the misses since the counters were last reset.
+
+        """
+        with self._counts_lock:
+            counts = (self.hits, self.misses)
+            self.hits = self.misses = 0
+        return counts
+
+    def peek(self, key):
+        """Retrieve a cached page without recording the lookup.
+
+        Unlike :meth:`get`, this never modifies the cache: recency is not
+        updated, corrupted entries are not removed, and entries found in the
+        mirror are not copied.
+
+        Parameters
+        ----------
+        key : str
+            The entry's key.
+
+        Returns
+        -------
+        str or None
+            The cached value, or ``None`` if there is no valid entry.
+
+        """
+        payload = self._read_entry(self._entry_path(self.path, key))
+
+        if payload is None and self.mirror_path is not None:
+            payload = self._read_entry(self._entry_path(self.mirror_path, key))
+
+        return None if payload is None else payload.decode("utf-8")
+
+    def put(self, key, value):
+        """Store a rendered page.
+
+        Parameters
+        ----------
+        key : str
+            The entry's key.
+        value : str
+            The rendered page. This may be a serialized collection of outputs.
+
+        """
+        payload = value.encode("utf-8")
+        digest = hashlib.sha256(payload).hexdigest().encode("ascii")
+
+        entry_path = self._entry_path(self.path, key)
+        entry_path.parent.mkdir(exist_ok=True)
+
+        # write atomically so that a concurrent reader never sees a partial entry
+        tmp_path = entry_path.with_name(entry_path.name + f".tmp{os.getpid()}")
+        tmp_path.write_bytes(digest + b"\n" + payload)
+        os.replace(tmp_path, entry_path)
+
+    def prune(self):
+        """Evict least-recently used entries until the size bound is met."""
+        if self.max_size is None:
+            return
+
+        entries = []
+        total_size = 0
+        for entry_path in self.path.glob("??/*"):
+            stat = entry_path.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total_size += stat.st_size
+
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            entry_path.unlink()
+            total_size -= size
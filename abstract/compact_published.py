@@ -0,0 +1,191 @@
+"""Compact, read-only representations of published data for rendering.
+
+A universe with thousands of publications holds many small dicts and paths,
+each with a large per-object overhead. Once their paths are updated, the
+publications used for rendering are stored compactly:
+
+- Metadata and artifact mappings are :class:`CompactMapping` objects: a tuple
+  of values, plus a key layout shared by every mapping with the same keys.
+  The keys are interned, so the layouts of collections loaded separately are
+  shared as well.
+- Artifacts are :class:`Artifact` tuples holding their path as a string. The
+  path is turned into a :class:`pathlib.Path` only when it is accessed.
+
+Both are attribute-compatible with what they replace: templates still access
+``publication.metadata``, ``publication.artifacts``, and ``artifact.path``,
+and artifacts are still instances of ``publish.PublishedArtifact``. Neither
+can be modified.
+
+Filtering a collection with :func:`filter_publications` gives a view over the
+original publications rather than a copy of them.
+
+"""
+import collections.abc
+import pathlib
+import sys
+
+import publish
+
+
+_PATH_INDEX = publish.PublishedArtifact._fields.index("path")
+
+# maps each tuple of interned keys to the layout shared by mappings with them
+_LAYOUTS = {}
+
+
+def _layout(keys):
+    keys = tuple(sys.intern(key) if type(key) is str else key for key in keys)
+    layout = _LAYOUTS.get(keys)
+    if layout is None:
+        layout = _LAYOUTS.setdefault(keys, {key: i for i, key in enumerate(keys)})
+    return layout
+
+
+class CompactMapping(collections.abc.Mapping):
+    """A read-only mapping storing its values in a tuple.
+
+    Parameters
+    ----------
+    mapping : Mapping
+        The keys and values, in order.
+
+    """
+
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, mapping):
+        self._layout = _layout(mapping.keys())
+        self._values = tuple(mapping.values())
+
+    def __getitem__(self, key):
+        return self._values[self._layout[key]]
+
+    def __contains__(self, key):
+        return key in self._layout
+
+    def __iter__(self):
+        return iter(self._layout)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f"CompactMapping({dict(self)!r})"
+
+    def __reduce__(self):
+        return (CompactMapping, (dict(self),))
+
+
+class Artifact(publish.PublishedArtifact):
+    """A published artifact whose path is stored as a string.
+
+    Create one with :func:`compact_artifact`.
+
+    """
+
+    __slots__ = ()
+
+    @property
+    def path(self):
+        path = tuple.__getitem__(self, _PATH_INDEX)
+        return None if path is None else pathlib.Path(path)
+
+
+def compact_artifact(artifact, prefix):
+    """Make a compact copy of an artifact, prefixing its path.
+
+    Parameters
+    ----------
+    artifact : publish.PublishedArtifact
+        The artifact. If its path is ``None``, it is not yet released, and the
+        path is left alone.
+    prefix : pathlib.Path
+        Prepended to the artifact's path.
+
+    Returns
+    -------
+    Artifact
+
+    """
+    if artifact.path is not None:
+        artifact = artifact._replace(path=str(prefix / artifact.path))
+    return Artifact._make(artifact)
+
+
+def compact_publication(publication, prefix):
+    """Make a compact, read-only copy of a publication, prefixing its paths.
+
+    Parameters
+    ----------
+    publication : publish.Publication
+        The publication.
+    prefix : pathlib.Path
+        Prepended to the path of each of the publication's artifacts.
+
+    Returns
+    -------
+    publish.Publication
+
+    """
+    return publication._replace(
+        metadata=CompactMapping(publication.metadata),
+        artifacts=CompactMapping(
+            {
+                key: compact_artifact(artifact, prefix)
+                for key, artifact in publication.artifacts.items()
+            }
+        ),
+    )
+
+
+class _FilteredMapping(collections.abc.Mapping):
+    """A read-only view of some of the keys of a mapping."""
+
+    __slots__ = ("_mapping", "_keys")
+
+    def __init__(self, mapping, keys):
+        self._mapping = mapping
+        self._keys = keys
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._mapping[key]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def filter_publications(collection, predicate):
+    """Restrict a collection to the publications satisfying a predicate.
+
+    Unlike ``publish.filter_nodes``, this copies neither the publications nor
+    their artifacts.
+
+    Parameters
+    ----------
+    collection : publish.Collection
+        The collection.
+    predicate : Callable[[str, publish.Publication], bool]
+        Called with the key of each publication and the publication.
+
+    Returns
+    -------
+    publish.Collection
+        A collection whose publications are a read-only view of those of
+        ``collection``.
+
+    """
+    publications = collection.publications
+    keys = {
+        key: None
+        for key, publication in publications.items()
+        if predicate(key, publication)
+    }
+    return collection._replace(publications=_FilteredMapping(publications, keys))
@@ -0,0 +1,281 @@
+"""Profile the time spent in the functions and templates of a build.
+
+A :class:`CPUProfiler` runs :mod:`cProfile` over the build, or over only the
+rendering of one page or the invocations of one element, and writes:
+
+``profile.pstats``
+    The function-level profile, for :mod:`pstats` or viewers such as
+    ``snakeviz``.
+``profile.folded``
+    Stacks sampled at regular intervals, in the folded format read by
+    flamegraph tools such as ``flamegraph.pl`` and ``speedscope``. Each stack
+    begins with the phase of the build it was sampled in.
+
+Frames of compiled Jinja templates are named after the template and the
+macro, block, or ``root`` function they belong to, such as
+``schedule.html:display_resource``, and their line numbers are those of the
+template. In the pstats file, this applies to the templates seen by the
+sampler; the rest keep the names of the generated code.
+
+Only the thread that renders pages is profiled; outputs are written by other
+threads.
+
+"""
+import cProfile
+import collections
+import contextlib
+import pathlib
+import pstats
+import sys
+import threading
+
+from jinja2 import nodes
+
+
+# the default number of seconds between samples of the stack
+DEFAULT_INTERVAL = 0.001
+
+
+def _macro_names(template):
+    """Map the line of each macro definition in a template to the macro's name."""
+    environment = template.environment
+    if template.name is None or environment.loader is None:
+        return {}
+    try:
+        source, _, _ = environment.loader.get_source(environment, template.name)
+    except Exception:
+        return {}
+    ast = environment.parse(source, template.name)
+    return {macro.lineno: macro.name for macro in ast.find_all(nodes.Macro)}
+
+
+class _TemplateFunctions:
+    """Names the functions generated from Jinja templates."""
+
+    def __init__(self):
+        self._by_filename = {}
+        self._macros = {}
+        self._labels = {}
+
+    def add(self, template):
+        self._by_filename.setdefault(template.filename, template)
+
+    def label(self, filename, firstlineno, name):
+        """Name a function of a compiled template.
+
+        Returns
+        -------
+        Optional[Tuple[str, int, str]]
+            The template's name, the line of the function's definition in the
+            template, and the name of the macro or block, or ``None`` if the
+            function is not from a known template.
+
+        """
+        key = (filename, firstlineno, name)
+        if key in self._labels:
+            return self._labels[key]
+
+        template = self._by_filename.get(filename)
+        if template is None:
+            return None
+
+        if template not in self._macros:
+            self._macros[template] = _macro_names(template)
+
+        line = template.get_corresponding_lineno(firstlineno)
+        if name == "macro":
+            name = self._macros[template].get(line, name)
+        label = (template.name or "<template>", line, name)
+        self._labels[key] = label
+        return label
+
+
+class CPUProfiler:
+    """Profile the functions and templates run by a build.
+
+    Use as a context manager. If neither ``page`` nor ``element`` is given,
+    the whole build is profiled. Only the pages and elements that are rendered
+    can be profiled; an incremental build skips pages unaffected by changes.
+
+    Parameters
+    ----------
+    page : str, optional
+        Profile only the rendering of the page with this output path, relative
+        to the output directory.
+    element : str, optional
+        Profile only the invocations of the element with this name.
+    interval : float
+        The number of seconds between samples of the stack.
+
+    """
+
+    def __init__(self, page=None, element=None, interval=DEFAULT_INTERVAL):
+        if page is not None and element is not None:
+            raise RuntimeError("Profile either a page or an element, not both.")
+
+        self.page_path = page
+        self.element_name = element
+        self.interval = interval
+        self._profile = cProfile.Profile()
+        self._templates = _TemplateFunctions()
+        self._names = {}
+        self._folded = collections.Counter()
+        self._depth = 0
+        self._profiled = False
+        self._phase = None
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        if self.page_path is None and self.element_name is None:
+            self._activate()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.page_path is None and self.element_name is None:
+            self._deactivate()
+        self._stop.set()
+        self._sampler.join()
+
+    def _activate(self):
+        self._depth += 1
+        if self._depth == 1:
+            self._profiled = True
+            self._profile.enable()
+
+    def _deactivate(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._profile.disable()
+
+    @contextlib.contextmanager
+    def _scope(self, active):
+        if not active:
+            yield
+            return
+
+        self._activate()
+        try:
+            yield
+        finally:
+            self._deactivate()
+
+    def page(self, relative_path):
+        """Profile the rendering of a page, if it is the page being profiled."""
+        return self._scope(relative_path == self.page_path)
+
+    def element(self, name):
+        """Profile an invocation of an element, if it is the element being profiled."""
+        return self._scope(name == self.element_name)
+
+    def phase_boundary(self, previous, next_phase):
+        """Attribute later samples to the phase ``next_phase``.
+
+        The signature matches the listeners of
+        :class:`abstract.metrics.BuildMetrics`.
+
+        """
+        self._phase = next_phase
+
+    def _frame_name(self, frame):
+        code = frame.f_code
+        template = frame.f_globals.get("__jinja_template__")
+        if template is not None and template.name is None:
+            # compiled from a string, as pages are
+            return f"<page>:{code.co_name}"
+        if template is not None:
+            self._templates.add(template)
+            label = self._templates.label(
+                code.co_filename, code.co_firstlineno, code.co_name
+            )
+            if label is not None:
+                return f"{label[0]}:{label[2]}"
+
+        name = self._names.get(code)
+        if name is None:
+            name = f"{pathlib.PurePath(code.co_filename).name}:{code.co_name}"
+            self._names[code] = name
+        return name
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            if not self._depth:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            if self._phase is not None:
+                stack.append(f"phase:{self._phase}")
+            self._folded[";".join(reversed(stack))] += 1
+
+    def folded_stacks(self):
+        """The sampled stacks, in the folded format.
+
+        Returns
+        -------
+        str
+            One line per distinct stack: its frames from the outermost, joined
+            by ``;``, followed by the number of samples.
+
+        """
+        return "".join(
+            f"{stack} {count}\n" for stack, count in sorted(self._folded.items())
+        )
+
+    def stats(self):
+        """The function-level profile, with template functions renamed.
+
+        Returns
+        -------
+        pstats.Stats
+
+        Raises
+        ------
+        RuntimeError
+            If nothing was profiled, because the page or element was not
+            rendered. Pages unaffected by changes since the previous build are
+            not rendered again.
+
+        """
+        if not self._profiled:
+            target = self.page_path or self.element_name
+            raise RuntimeError(f'Nothing was profiled: "{target}" was not rendered.')
+
+        stats = pstats.Stats(self._profile)
+
+        def rename(key):
+            label = self._templates.label(*key)
+            return key if label is None else label
+
+        renamed = {}
+        for key, (cc, nc, tt, ct, callers) in stats.stats.items():
+            callers = {rename(caller): value for caller, value in callers.items()}
+            key = rename(key)
+            if key in renamed:
+                # distinct generated functions mapped to the same template line
+                old_cc, old_nc, old_tt, old_ct, old_callers = renamed[key]
+                callers = {**old_callers, **callers}
+                cc, nc, tt, ct = cc + old_cc, nc + old_nc, tt + old_tt, ct + old_ct
+            renamed[key] = (cc, nc, tt, ct, callers)
+        stats.stats = renamed
+        return stats
+
+    def write(self, path):
+        """Write ``profile.pstats`` and ``profile.folded`` into a directory.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The directory. It is created if it doesn't exist.
+
+        """
+        path.mkdir(parents=True, exist_ok=True)
+        self.stats().dump_stats(path / "profile.pstats")
+        (path / "profile.folded").write_text(self.folded_stacks())
@@ -0,0 +1,309 @@
+"""Track which parts of the published universe each page depends on.
+
+When ``publish`` re-runs, usually only a few publications change. To avoid
+rebuilding every page, each page is rendered with a view of the universe that
+records which collections and publications it reads. The universe is then
+summarized by a digest of each collection and publication; comparing the
+digests of two builds tells exactly which nodes changed, and only the pages
+that read one of them need to be rebuilt.
+
+Reads and changes are both represented as ``(collection, publication)`` pairs:
+
+- ``(collection, publication)`` refers to a single publication.
+- ``(collection, ALL)`` refers to every publication in a collection, as when a
+  page iterates over them.
+- ``(collection, None)`` refers to the collection itself: its existence and its
+  schema.
+- ``(ALL, None)`` refers to the set of collections, as when a page iterates
+  over them.
+
+"""
+import collections.abc
+
+from . import cache
+
+
+ALL = "*"
+
+
+def _publication_digest(publication):
+    return cache.hash_object(
+        {
+            "metadata": dict(publication.metadata),
+            "artifacts": {
+                key: None if artifact.path is None else str(artifact.path)
+                for key, artifact in publication.artifacts.items()
+            },
+        }
+    )
+
+
+def published_digests(universe):
+    """Summarize a universe by a digest of each collection and publication.
+
+    Parameters
+    ----------
+    universe : publish.Universe or None
+        The universe. Artifact paths should already be updated to be relative
+        to the output directory.
+
+    Returns
+    -------
+    dict
+        Maps each collection's key to a dict with keys ``"schema"``, the
+        digest of the collection's schema, and ``"publications"``, a dict
+        mapping each publication's key to its digest. This is JSON
+        serializable.
+
+    """
+    if universe is None:
+        return {}
+
+    # lazily-loaded universes can summarize themselves without being loaded
+    digests = getattr(universe.collections, "digests", None)
+    if digests is not None:
+        return digests()
+
+    return {
+        collection_key: {
+            "schema": cache.hash_object(collection.schema),
+            "publications": {
+                publication_key: _publication_digest(publication)
+                for publication_key, publication in collection.publications.items()
+            },
+        }
+        for collection_key, collection in universe.collections.items()
+    }
+
+
+def diff_digests(old, new):
+    """Determine which nodes differ between two summaries of a universe.
+
+    Parameters
+    ----------
+    old : dict
+        A summary computed by :func:`published_digests`.
+    new : dict
+        Another summary.
+
+    Returns
+    -------
+    Set[Tuple[str, Optional[str]]]
+        The changed nodes. A publication that was added, removed, or modified
+        contributes ``(collection, publication)``. A collection that was added,
+        removed, or whose schema changed contributes ``(collection, None)``. If
+        the set of collections changed, ``(ALL, None)`` is included.
+
+    """
+    changes = set()
+
+    if old.keys() != new.keys():
+        changes.add((ALL, None))
+
+    for collection_key in old.keys() | new.keys():
+        old_collection = old.get(collection_key)
+        new_collection = new.get(collection_key)
+
+        if (
+            old_collection is None
+            or new_collection is None
+            or old_collection["schema"] != new_collection["schema"]
+        ):
+            changes.add((collection_key, None))
+
+        old_publications = {} if old_collection is None else old_collection["publications"]
+        new_publications = {} if new_collection is None else new_collection["publications"]
+        for publication_key in old_publications.keys() | new_publications.keys():
+            if old_publications.get(publication_key) != new_publications.get(
+                publication_key
+            ):
+                changes.add((collection_key, publication_key))
+
+    return changes
+
+
+def diff_published(old, new):
+    """Determine which nodes differ between two universes.
+
+    Parameters
+    ----------
+    old : publish.Universe or None
+        The previous universe.
+    new : publish.Universe or None
+        The current universe.
+
+    Returns
+    -------
+    Set[Tuple[str, Optional[str]]]
+        The changed nodes, as described in :func:`diff_digests`.
+
+    """
+    return diff_digests(published_digests(old), published_digests(new))
+
+
+def digest_reads(digests, reads):
+    """Compute a digest of the parts of a universe that were read.
+
+    Two summaries of a universe give the same digest for a set of reads
+    exactly when none of the nodes read differ between them.
+
+    Parameters
+    ----------
+    digests : dict
+        A summary computed by :func:`published_digests`.
+    reads : Iterable[Tuple[str, Optional[str]]]
+        The nodes read.
+
+    Returns
+    -------
+    str
+        The hex digest.
+
+    """
+    parts = []
+    for collection_key, publication_key in sorted(set(reads), key=str):
+        if collection_key == ALL:
+            part = sorted(digests)
+        elif collection_key not in digests:
+            part = None
+        elif publication_key is None:
+            part = digests[collection_key]["schema"]
+        elif publication_key == ALL:
+            part = digests[collection_key]
+        else:
+            part = digests[collection_key]["publications"].get(publication_key)
+        parts.append([collection_key, publication_key, part])
+    return cache.hash_object(parts)
+
+
+def is_affected(reads, changes):
+    """Determine whether a page that made the given reads is affected by changes.
+
+    Parameters
+    ----------
+    reads : Iterable[Tuple[str, Optional[str]]]
+        The nodes read by the page.
+    changes : Set[Tuple[str, Optional[str]]]
+        The changed nodes, as computed by :func:`diff_digests`.
+
+    Returns
+    -------
+    bool
+
+    """
+    changed_collections = {c for (c, p) in changes if p is not None}
+
+    for collection_key, publication_key in reads:
+        if (collection_key, None) in changes:
+            return True
+        if publication_key == ALL and collection_key in changed_collections:
+            return True
+        if publication_key is not None and (collection_key, publication_key) in changes:
+            return True
+
+    return False
+
+
+class ReadRecorder:
+    """Collects the nodes read through a view created by :func:`track_reads`.
+
+    Attributes
+    ----------
+    reads : Set[Tuple[str, Optional[str]]]
+        The nodes read since the last call to :meth:`start`.
+
+    """
+
+    def __init__(self):
+        self.reads = set()
+
+    def start(self):
+        """Begin recording a new set of reads."""
+        self.reads = set()
+
+    def add(self, read):
+        self.reads.add(read)
+
+
+class _RecordingMapping(collections.abc.Mapping):
+    """A read-only view of a mapping that records reads of its keys.
+
+    Accessing a single key records ``key_to_read(key)``; iterating over the
+    mapping records ``all_read``. If ``wrap`` is given, values are passed
+    through it on first access. The underlying mapping is not copied, so
+    lazily-loaded values stay unloaded until they are read.
+
+    """
+
+    def __init__(self, mapping, recorder, key_to_read, all_read, wrap=None):
+        self._mapping = mapping
+        self._recorder = recorder
+        self._key_to_read = key_to_read
+        self._all_read = all_read
+        self._wrap = wrap
+        self._wrapped = {}
+
+    def __getitem__(self, key):
+        self._recorder.add(self._key_to_read(key))
+        if self._wrap is None:
+            return self._mapping[key]
+        if key not in self._wrapped:
+            self._wrapped[key] = self._wrap(key, self._mapping[key])
+        return self._wrapped[key]
+
+    def __contains__(self, key):
+        self._recorder.add(self._key_to_read(key))
+        return key in self._mapping
+
+    def __iter__(self):
+        self._recorder.add(self._all_read)
+        return iter(self._mapping)
+
+    def __len__(self):
+        self._recorder.add(self._all_read)
+        return len(self._mapping)
+
+
+def track_reads(universe):
+    """Create a view of a universe that records which nodes are read.
+
+    The view is made of the universe's own named tuples, so it can be used
+    anywhere the universe can, including with ``publish.filter_nodes``. Only
+    the mappings of collections and publications are replaced, by read-only
+    views. The view is created once per build; call :meth:`ReadRecorder.start`
+    before rendering each page to record its reads separately.
+
+    Parameters
+    ----------
+    universe : publish.Universe or None
+        The universe to track.
+
+    Returns
+    -------
+    (publish.Universe or None, ReadRecorder)
+        The view, and the recorder to which reads are added as they happen.
+
+    """
+    recorder = ReadRecorder()
+    if universe is None:
+        return None, recorder
+
+    def wrap_collection(collection_key, collection):
+        publications = _RecordingMapping(
+            collection.publications,
+            recorder,
+            key_to_read=lambda key: (collection_key, key),
+            all_read=(collection_key, ALL),
+        )
+        return collection._replace(publications=publications)
+
+    tracked = universe._replace(
+        collections=_RecordingMapping(
+            universe.collections,
+            recorder,
+            key_to_read=lambda key: (key, None),
+            all_read=(ALL, None),
+            wrap=wrap_collection,
+        )
+    )
+    return tracked, recorder
@@ -0,0 +1,292 @@
+"""Ship only what changed between two builds.
+
+After every build, a file manifest mapping the path of each file in the
+output directory to a digest of its contents is kept in the build state
+directory. The manifest covers rendered pages, static files, and published
+artifacts, but not the build state itself.
+
+To deploy, keep a copy of the manifest of the build that was last deployed.
+:func:`write_delta` compares it to the current output and writes a delta
+archive containing the added and changed files along with a list of the files
+to delete. On the receiving side, :func:`apply_delta` brings a copy of the old
+site up to date. ::
+
+    abstract delta deployed.json _build delta.tar.gz
+    abstract apply delta.tar.gz /srv/www/course
+
+"""
+import hashlib
+import io
+import json
+import os
+import pathlib
+import posixpath
+import tarfile
+import typing
+
+from . import manifest
+
+
+FILE_MANIFEST_VERSION = 1
+
+# the name of the member of a delta archive that describes the delta
+DELTA_MEMBER = ".abstract-delta.json"
+
+
+def _file_manifest_path(output_path):
+    return manifest.state_path(output_path) / "files.json"
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with path.open("rb") as fileobj:
+        for chunk in iter(lambda: fileobj.read(2 ** 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_file_manifest(path):
+    """Load a file manifest.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The manifest; for instance, ``.abstract/files.json`` in an output
+        directory, or a copy of it.
+
+    Returns
+    -------
+    dict
+        Maps the path of each file, relative to the output directory, to a
+        dict with keys ``"hash"``, ``"size"``, and ``"mtime_ns"``.
+
+    Raises
+    ------
+    RuntimeError
+        If the manifest is missing, unreadable, or from an incompatible
+        version.
+
+    """
+    try:
+        with pathlib.Path(path).open() as fileobj:
+            file_manifest = json.load(fileobj)
+    except (FileNotFoundError, json.JSONDecodeError):
+        raise RuntimeError(f'"{path}" is not a file manifest.')
+
+    if file_manifest.get("version") != FILE_MANIFEST_VERSION:
+        raise RuntimeError(f'"{path}" was written by an incompatible version.')
+
+    return file_manifest["files"]
+
+
+def update_file_manifest(output_path):
+    """Bring the file manifest of an output directory up to date, and save it.
+
+    Only files whose size or modification time changed since the manifest
+    was last saved are hashed again.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+
+    Returns
+    -------
+    dict
+        The manifest, as described in :func:`load_file_manifest`.
+
+    """
+    try:
+        previous = load_file_manifest(_file_manifest_path(output_path))
+    except RuntimeError:
+        previous = {}
+
+    state_path = manifest.state_path(output_path)
+    files = {}
+    for path in sorted(output_path.rglob("*")):
+        if not path.is_file() or state_path in path.parents:
+            continue
+
+        relative_path = path.relative_to(output_path).as_posix()
+        stat = path.stat()
+        entry = previous.get(relative_path)
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime_ns"] != stat.st_mtime_ns
+        ):
+            entry = {
+                "hash": _hash_file(path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+        files[relative_path] = entry
+
+    path = _file_manifest_path(output_path)
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w") as fileobj:
+        json.dump({"version": FILE_MANIFEST_VERSION, "files": files}, fileobj)
+    os.replace(tmp_path, path)
+
+    return files
+
+
+class Delta(typing.NamedTuple):
+    """The difference between two file manifests.
+
+    Attributes
+    ----------
+    changed : List[str]
+        The files that were added or whose contents changed.
+    deleted : List[str]
+        The files that no longer exist.
+
+    """
+
+    changed: typing.List[str]
+    deleted: typing.List[str]
+
+
+def diff_file_manifests(old, new):
+    """Compare two file manifests.
+
+    Parameters
+    ----------
+    old : dict
+        The manifest of the deployed build.
+    new : dict
+        The manifest of the current build.
+
+    Returns
+    -------
+    Delta
+
+    """
+    changed = sorted(
+        path
+        for path, entry in new.items()
+        if path not in old or old[path]["hash"] != entry["hash"]
+    )
+    deleted = sorted(old.keys() - new.keys())
+    return Delta(changed, deleted)
+
+
+def write_delta(base_manifest_path, output_path, archive_path):
+    """Write a delta archive bringing a deployed build up to date.
+
+    Parameters
+    ----------
+    base_manifest_path : pathlib.Path
+        The file manifest of the deployed build.
+    output_path : pathlib.Path
+        The output directory of the current build.
+    archive_path : pathlib.Path
+        Where to write the archive, a gzipped tar file.
+
+    Returns
+    -------
+    Delta
+        What the archive changes.
+
+    """
+    old = load_file_manifest(base_manifest_path)
+    new = update_file_manifest(output_path)
+    delta = diff_file_manifests(old, new)
+
+    description = json.dumps(
+        {
+            "version": FILE_MANIFEST_VERSION,
+            "changed": {path: new[path]["hash"] for path in delta.changed},
+            "deleted": delta.deleted,
+        }
+    ).encode()
+
+    with tarfile.open(archive_path, "w:gz") as archive:
+        info = tarfile.TarInfo(DELTA_MEMBER)
+        info.size = len(description)
+        archive.addfile(info, io.BytesIO(description))
+        for path in delta.changed:
+            archive.add(output_path / path, arcname=path, recursive=False)
+
+    return delta
+
+
+def _check_relative(path):
+    """Reject paths that would escape the site's directory."""
+    normalized = posixpath.normpath(path)
+    if (
+        posixpath.isabs(path)
+        or normalized != path
+        or normalized == ".."
+        or normalized.startswith("../")
+    ):
+        raise RuntimeError(f'The delta archive contains an unsafe path "{path}".')
+
+
+def apply_delta(archive_path, site_path):
+    """Apply a delta archive written by :func:`write_delta` to a deployed site.
+
+    Every changed file is verified against its digest and then atomically
+    replaces the old one; deleted files are removed last.
+
+    Parameters
+    ----------
+    archive_path : pathlib.Path
+        The delta archive.
+    site_path : pathlib.Path
+        The directory containing the deployed site.
+
+    Returns
+    -------
+    Delta
+        What was changed.
+
+    Raises
+    ------
+    RuntimeError
+        If the archive is not a delta archive, contains unsafe paths, or a
+        file does not match its digest.
+
+    """
+    site_path = pathlib.Path(site_path)
+    with tarfile.open(archive_path, "r:gz") as archive:
+        try:
+            description = json.load(archive.extractfile(DELTA_MEMBER))
+        except (KeyError, json.JSONDecodeError):
+            raise RuntimeError(f'"{archive_path}" is not a delta archive.')
+
+        if description.get("version") != FILE_MANIFEST_VERSION:
+            raise RuntimeError(
+                f'"{archive_path}" was written by an incompatible version.'
+            )
+
+        changed, deleted = description["changed"], description["deleted"]
+        for path in [*changed, *deleted]:
+            _check_relative(path)
+
+        for path, digest in changed.items():
+            member = archive.getmember(path)
+            if not member.isfile():
+                raise RuntimeError(f'"{path}" in the delta archive is not a file.')
+
+            destination = site_path / path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = destination.with_name(f".{destination.name}.tmp{os.getpid()}")
+            h = hashlib.sha256()
+            try:
+                with archive.extractfile(member) as src, tmp_path.open("wb") as dst:
+                    for chunk in iter(lambda: src.read(2 ** 20), b""):
+                        h.update(chunk)
+                        dst.write(chunk)
+                if h.hexdigest() != digest:
+                    raise RuntimeError(f'"{path}" in the delta archive is corrupt.')
+                os.utime(tmp_path, (member.mtime, member.mtime))
+                os.replace(tmp_path, destination)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+    for path in deleted:
+        (site_path / path).unlink(missing_ok=True)
+
+    return Delta(sorted(changed), deleted)
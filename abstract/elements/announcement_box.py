@@ -7,7 +7,7 @@ SCHEMA = {
 }
 
 
-def announcement_box(environment, context, element_config, now):
+def announcement_box(environment, context, element_config, now, build):
     validator = cerberus.Validator(SCHEMA)
     element_config = validator.validated(element_config)
 
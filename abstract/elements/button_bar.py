@@ -17,7 +17,7 @@ SCHEMA = {
 }
 
 
-def button_bar(templates, published, config, now):
+def button_bar(templates, published, config, now, build):
     validator = cerberus.Validator(SCHEMA)
     config_as_dict = {"*": config}
     config = validator.validated(config_as_dict)
@@ -1,3 +1,6 @@
+import json
+import pathlib
+
 import cerberus
 
 from ._common import is_something_missing
@@ -5,7 +8,11 @@ from ._common import is_something_missing
 
 SCHEMA = {
     "collection": {"type": "string"},
+    "name": {"type": "string", "nullable": True, "default": None},
     "numbered": {"type": "boolean", "default": False},
+    "page_size": {"type": "integer", "min": 1, "nullable": True, "default": None},
+    "partition_by": {"type": "string", "nullable": True, "default": None},
+    "data_file": {"type": "boolean", "default": False},
     "columns": {
         "type": "list",
         "schema": {
@@ -46,7 +53,86 @@ SCHEMA = {
 }
 
 
-def listing(environment, context, element_config, now):
+def _sorted_keys(build, collection_name, collection):
+    """The collection's publication keys in sorted order, computed once per build."""
+    return build.memoize(
+        ("listing", collection_name), lambda: sorted(collection.publications)
+    )
+
+
+# the label of the publications without the date a listing is partitioned by
+UNDATED = "Undated"
+
+
+def _partition(publications, metadata_key):
+    """Group publications by the year of a date in their metadata.
+
+    Returns a list of (label, publications) pairs, most recent year first.
+    Publications whose date is missing or ``None``, as it often is for those
+    not yet released, are grouped last under :data:`UNDATED`. If
+    ``metadata_key`` is ``None``, there is a single group labeled ``None``.
+
+    """
+    if metadata_key is None:
+        return [(None, publications)]
+
+    groups = {}
+    for publication in publications:
+        date = publication.metadata.get(metadata_key)
+        label = UNDATED if date is None else date.year
+        groups.setdefault(label, []).append(publication)
+
+    labels = sorted((label for label in groups if label != UNDATED), reverse=True)
+    if UNDATED in groups:
+        labels.append(UNDATED)
+    return [(label, groups[label]) for label in labels]
+
+
+def _paginate(publications, page_size):
+    """Split publications into pages of at most ``page_size`` publications."""
+    if page_size is None or not publications:
+        return [publications]
+
+    return [
+        publications[i : i + page_size]
+        for i in range(0, len(publications), page_size)
+    ]
+
+
+def _output_name(prefix, label, number):
+    """The name, without suffix, of a page or data file of the listing."""
+    name = prefix
+    if label is not None:
+        name += f"-{str(label).lower()}"
+    if number > 1:
+        name += f"-page-{number}"
+    return name
+
+
+def _check_unused(build, path):
+    """Refuse to replace an additional page or file of the current page."""
+    if path in build.pages or path in build.files:
+        raise RuntimeError(
+            f'Two listings on the page write "{path}"; give them distinct "name"s.'
+        )
+
+
+def listing(environment, context, element_config, now, build):
+    """Render a table of the publications in a collection.
+
+    Publications are sorted by key. If ``page_size`` is given, the table is
+    split into pages of that many publications; the first page is rendered in
+    place and the others are emitted as separate pages. If ``partition_by``
+    names a date in the publications' metadata, the publications are split by
+    year in the same way, with the most recent year rendered in place. If
+    ``data_file`` is true, the rows of each page are written to a JSON file
+    that is loaded by the client rather than embedded in the HTML; its cells
+    are rendered by the template's ``display_cell`` macro.
+
+    Additional pages and files are named after the page and the listing's
+    ``name``, which defaults to the name of the collection.
+
+    """
     validator = cerberus.Validator(SCHEMA, require_all=True)
     element_config = validator.validated(element_config)
 
@@ -54,14 +140,86 @@ def listing(environment, context, element_config, now):
         raise RuntimeError(f"Invalid config: {validator.errors}")
 
     # sort the publications by key
-    collections = context["published"].collections
-    collection = collections[element_config["collection"]]
-    publications_and_keys = sorted(collection.publications.items())
-    publications = [v for (j, v) in publications_and_keys]
+    collection_name = element_config["collection"]
+    collection = context["published"].collections[collection_name]
+    publications = [
+        collection.publications[key]
+        for key in _sorted_keys(build, collection_name, collection)
+    ]
+
+    sections = [
+        (label, _paginate(section, element_config["page_size"]))
+        for label, section in _partition(
+            publications, element_config["partition_by"]
+        )
+    ]
+
+    # additional pages are named after the page containing the listing
+    name = element_config["name"] or collection_name
+    prefix = f"{pathlib.PurePath(build.page).stem}-{name}"
+
+    def url(section_index, number):
+        if section_index == 0 and number == 1:
+            return build.page
+        year = sections[section_index][0]
+        return _output_name(prefix, year, number) + ".html"
+
+    partitions = [
+        {"label": year, "url": url(i, 1)} for i, (year, _) in enumerate(sections)
+    ]
 
     template = environment.get_template("listing.html")
-    return template.render(
-        element_config=element_config,
-        publications=publications,
-        is_something_missing=is_something_missing,
-    )
+
+    def render(section_index, number):
+        year, pages = sections[section_index]
+        page_publications = pages[number - 1]
+
+        if element_config["data_file"]:
+            data_path = _output_name(prefix, year, number) + ".json"
+        else:
+            data_path = None
+
+        # the table's rows are left for the client when they are in a data file;
+        # rendering the template as a module exposes its display_cell macro
+        module = template.make_module(
+            dict(
+                element_config=element_config,
+                publications=[] if data_path else page_publications,
+                is_something_missing=is_something_missing,
+                start_index=(number - 1) * (element_config["page_size"] or 0),
+                data_url=data_path,
+                partitions=partitions,
+                current_partition=year,
+                pages=[
+                    {"number": n, "url": url(section_index, n)}
+                    for n in range(1, len(pages) + 1)
+                ],
+                current_page=number,
+            )
+        )
+
+        if data_path is not None:
+            display_cell = getattr(module, "display_cell", None)
+            if display_cell is None:
+                raise RuntimeError(
+                    "Writing a listing's data file requires a display_cell macro "
+                    "in the theme's listing.html."
+                )
+            rows = [
+                [str(display_cell(p, c)).strip() for c in element_config["columns"]]
+                for p in page_publications
+            ]
+            _check_unused(build, data_path)
+            build.add_file(data_path, json.dumps({"rows": rows}))
+
+        return str(module)
+
+    for section_index, (year, pages) in enumerate(sections):
+        for number in range(1, len(pages) + 1):
+            if section_index == 0 and number == 1:
+                continue
+            path = url(section_index, number)
+            _check_unused(build, path)
+            build.add_page(path, render(section_index, number))
+
+    return render(0, 1)
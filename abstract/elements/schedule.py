@@ -1,7 +1,7 @@
 import datetime
 import cerberus
-import publish
 
+from .. import compact_published
 from ._common import is_something_missing
 
 
@@ -117,15 +117,12 @@ ONE_WEEK = datetime.timedelta(weeks=1)
 
 
 def _publication_within_week(start_date, date_key):
-    def filter(key, node):
-        if not isinstance(node, publish.Publication):
-            return True
-        else:
-            date = node.metadata[date_key]
-            if isinstance(date, datetime.datetime):
-                date = date.date()
+    def filter(key, publication):
+        date = publication.metadata[date_key]
+        if isinstance(date, datetime.datetime):
+            date = date.date()
 
-            return start_date <= date < start_date + ONE_WEEK
+        return start_date <= date < start_date + ONE_WEEK
 
     return filter
 
@@ -136,8 +133,17 @@ class Week:
         self.start_date = start_date
         self.topic = topic
 
+        # the view model used by the template; filled in by annotate_weeks
+        self.announcements = []
+        self.exams = []
+        self.is_last = False
+        self.is_future = False
+        self.separator = None
+
     def filter(self, collection, date_key):
-        return publish.filter_nodes(
+        # a view over the collection's publications, since every week filters
+        # every collection
+        return compact_published.filter_publications(
             collection, _publication_within_week(self.start_date, date_key)
         )
 
@@ -184,7 +190,45 @@ def order_weeks(element_config, weeks, today):
     }[week_order](weeks, today)
 
 
-def schedule(environment, context, element_config, now):
+def annotate_weeks(element_config, weeks, this_week, today):
+    """Precompute everything the template needs to know about each week.
+
+    Each announcement and exam is assigned to its week directly, rather than
+    having the template check every announcement and exam against every week.
+
+    """
+    if not weeks:
+        return
+
+    weeks_by_number = {w.number: w for w in weeks}
+
+    for announcement in element_config["week_announcements"]:
+        week = weeks_by_number.get(announcement["week"])
+        if week is not None:
+            week.announcements.append(announcement)
+
+    first_week_start_date = element_config["first_week_start_date"]
+    for exam_name, exam_date in element_config.get("exams", {}).items():
+        if isinstance(exam_date, datetime.datetime):
+            exam_date = exam_date.date()
+        index = (exam_date - first_week_start_date).days // ONE_WEEK.days
+        week = weeks_by_number.get(element_config["first_week_number"] + index)
+        if week is not None:
+            week.exams.append((exam_name, exam_date))
+
+    last_number = max(w.number for w in weeks)
+    for week in weeks:
+        week.is_last = week.number == last_number
+        week.is_future = week.start_date > today
+
+        if this_week is not None:
+            if week.number == this_week.number + 1:
+                week.separator = "future weeks"
+            elif week.number == this_week.number - 1:
+                week.separator = "past weeks"
+
+
+def schedule(environment, context, element_config, now, build):
     validator = cerberus.Validator(SCHEMA, require_all=True)
     element_config = validator.validated(element_config)
 
@@ -199,6 +243,8 @@ def schedule(environment, context, element_config, now):
     except ValueError:
         this_week = None
 
+    annotate_weeks(element_config, weeks, this_week, now().date())
+
     template = environment.get_template("schedule.html")
     return template.render(
         element_config=element_config,
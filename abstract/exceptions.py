@@ -8,3 +8,19 @@ class PageError(Error):
 
 class ElementError(Error):
     """A problem while evaluating an element."""
+
+
+class BrokenLinksError(Error):
+    """The built site contains broken links.
+
+    Attributes
+    ----------
+    broken : List[linkcheck.BrokenLink]
+        The broken links.
+
+    """
+
+    def __init__(self, broken):
+        self.broken = broken
+        listing = "\n".join(f"  {link}" for link in broken)
+        super().__init__(f"The site contains {len(broken)} broken link(s):\n{listing}")
@@ -0,0 +1,229 @@
+"""Cache expensive fragments of templates across builds.
+
+Pages, element templates, and base templates can mark a fragment as cacheable
+with the ``cache`` tag::
+
+    {% cache "resources", config.term %}
+        ...
+    {% endcache %}
+
+The first argument is a key naming the fragment; any further arguments are
+values the fragment depends on. The rendered fragment is stored in a
+persistent, size-bounded cache, keyed on these values, the fragment's source,
+and the site's configuration and theme. The fragment is rendered again when
+any of these change, or when a part of the published universe read by the
+fragment changes.
+
+By default a cached fragment lives until it is evicted. Fragments that depend
+on the time can be bounded in one of two ways:
+
+``ttl=SECONDS``
+    The fragment is rendered again once it is older than ``SECONDS``.
+``now_bucket=SECONDS``
+    The fragment is rendered again whenever the time, as seen by the build,
+    moves into a new bucket of ``SECONDS``.
+
+Either may also be given as a :class:`datetime.timedelta`. A page containing
+a fragment with either option is considered to depend on the time.
+
+A cache hit replays the fragment's effects on the page: the parts of the
+published universe it read, whether it asked for the time, and the additional
+outputs its elements emitted. This keeps incremental builds correct.
+
+"""
+import contextlib
+import datetime
+import json
+import threading
+
+import jinja2
+import jinja2.ext
+from jinja2 import nodes
+
+from . import cache
+from . import dependencies
+
+
+_FRAGMENT_KEY_VERSION = "1"
+
+_OPTIONS = ("ttl", "now_bucket")
+
+
+def _seconds(value):
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class FragmentCache:
+    """The cache of rendered fragments used by a site's template environments.
+
+    Parameters
+    ----------
+    store : cache.RenderCache
+        Where the fragments are stored.
+    salt : str
+        A digest of everything that fragments depend on implicitly, such as
+        the configuration and the theme.
+    now : callable
+        Returns the current time as a :class:`datetime.datetime`.
+
+    """
+
+    def __init__(self, store, salt, now):
+        self.store = store
+        self.salt = salt
+        self.now = now
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def rendering(self, build, published_digests):
+        """Attribute the fragments rendered by this thread to a page.
+
+        Parameters
+        ----------
+        build
+            The build state of the page being rendered, which records the
+            effects of its fragments.
+        published_digests : Callable[[], dict]
+            Returns the summary of the published universe, as computed by
+            :func:`dependencies.published_digests`.
+
+        """
+        self._local.page = (build, published_digests)
+        try:
+            yield
+        finally:
+            self._local.page = None
+
+    def render(self, key, deps, source_hash, options, render):
+        """Render a fragment, or retrieve it from the cache.
+
+        Parameters
+        ----------
+        key
+            The fragment's name.
+        deps : list
+            The values the fragment depends on.
+        source_hash : str
+            A digest of the fragment's source.
+        options : dict
+            The fragment's ``ttl`` and ``now_bucket``, either of which may be
+            ``None``.
+        render : Callable[[], str]
+            Renders the fragment.
+
+        Returns
+        -------
+        str
+
+        """
+        page = getattr(self._local, "page", None)
+        if page is None:
+            return render()
+        build, published_digests = page
+
+        ttl, now_bucket = options["ttl"], options["now_bucket"]
+        now = None
+        if ttl is not None or now_bucket is not None:
+            now = build.now(self.now).timestamp()
+
+        bucket = "" if now_bucket is None else str(int(now // _seconds(now_bucket)))
+        entry_key = cache.hash_bytes(
+            _FRAGMENT_KEY_VERSION.encode(),
+            self.salt.encode(),
+            source_hash.encode(),
+            cache.hash_object([key, deps, options]).encode(),
+            bucket.encode(),
+        )
+
+        cached = self.store.get(entry_key)
+        if cached is not None:
+            entry = json.loads(cached)
+            reads = [tuple(read) for read in entry["reads"]]
+            fresh = entry["expires"] is None or now < entry["expires"]
+            if fresh and entry["published"] == dependencies.digest_reads(
+                published_digests(), reads
+            ):
+                build.replay(entry)
+                return entry["html"]
+
+        with build.capture() as effects:
+            html = render()
+
+        reads = effects["reads"]
+        self.store.put(
+            entry_key,
+            json.dumps(
+                {
+                    "html": html,
+                    "published": dependencies.digest_reads(
+                        published_digests(), reads
+                    ),
+                    "expires": None if ttl is None else now + _seconds(ttl),
+                    **effects,
+                }
+            ),
+        )
+        return html
+
+
+class FragmentCacheExtension(jinja2.ext.Extension):
+    """Adds the ``{% cache key, deps... %}...{% endcache %}`` tag.
+
+    The environment's ``fragment_cache`` attribute is the :class:`FragmentCache`
+    used. If it is ``None``, fragments are always rendered.
+
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+
+        key = parser.parse_expression()
+        deps = []
+        options = {name: nodes.Const(None) for name in _OPTIONS}
+        while parser.stream.skip_if("comma"):
+            if parser.stream.current.test("name") and parser.stream.look().test(
+                "assign"
+            ):
+                name = next(parser.stream).value
+                if name not in _OPTIONS:
+                    parser.fail(f'Unknown option "{name}" of the cache tag.', lineno)
+                next(parser.stream)
+                options[name] = parser.parse_expression()
+            else:
+                deps.append(parser.parse_expression())
+
+        body = parser.parse_statements(["name:endcache"], drop_needle=True)
+
+        # node reprs omit line numbers, so moving a fragment within its
+        # template does not invalidate it
+        source_hash = cache.hash_bytes(repr(body).encode())
+
+        call = self.call_method(
+            "_render_fragment",
+            [
+                key,
+                nodes.List(deps),
+                nodes.Const(source_hash),
+                nodes.Dict(
+                    [
+                        nodes.Pair(nodes.Const(name), value)
+                        for name, value in options.items()
+                    ]
+                ),
+            ],
+        )
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, key, deps, source_hash, options, caller):
+        fragment_cache = self.environment.fragment_cache
+        if fragment_cache is None:
+            return caller()
+        return fragment_cache.render(key, deps, source_hash, options, caller)
@@ -0,0 +1,211 @@
+"""Build into generation directories, and switch between them atomically.
+
+A build run with ``--generations N`` does not write into the output directory
+itself. Instead, the output directory holds one directory per build, and a
+``current`` symlink to the one being served::
+
+    _build/
+        current -> generation-000042
+        generation-000041/
+        generation-000042/
+        published/
+
+Each build starts from a copy of the current generation in which every file is
+a hardlink, so that unchanged files cost neither disk space nor copying time,
+and builds incrementally from there. Outputs are always replaced rather than
+modified in place, so the files shared with older generations are never
+changed. Once the build succeeds, the new generation is switched to by
+atomically replacing the ``current`` symlink; the web server should serve
+``_build/current``. If the build fails, including because of broken links, the
+new generation is discarded and ``current`` is left alone.
+
+The last ``N`` generations are kept, so that :func:`rollback` can switch back
+to the previous one instantly.
+
+If the published directory lies in the output directory, but outside of any
+generation, it is hardlinked into each new generation at the same relative
+path, so that every generation links to the artifacts it was built with.
+
+"""
+import contextlib
+import os
+import pathlib
+import re
+import shutil
+
+
+CURRENT = "current"
+
+_GENERATION = re.compile(r"generation-(\d+)")
+
+
+def _name(number):
+    return f"generation-{number:06d}"
+
+
+def list_generations(root):
+    """List the generations in an output directory, from oldest to newest.
+
+    Parameters
+    ----------
+    root : pathlib.Path
+        The output directory.
+
+    Returns
+    -------
+    List[pathlib.Path]
+
+    """
+    if not root.exists():
+        return []
+    generations = [
+        path
+        for path in root.iterdir()
+        if _GENERATION.fullmatch(path.name) and path.is_dir()
+    ]
+    return sorted(generations, key=lambda path: int(path.name.split("-")[1]))
+
+
+def current_generation(root):
+    """The generation that ``current`` points to, or ``None``."""
+    link = root / CURRENT
+    if not link.is_symlink():
+        return None
+    return root / os.readlink(link)
+
+
+def link_tree(source, destination):
+    """Recreate a tree, hardlinking its files.
+
+    Files are copied instead if the filesystem does not support hardlinks.
+
+    """
+    for directory, _, names in os.walk(source):
+        relative_path = pathlib.Path(directory).relative_to(source)
+        (destination / relative_path).mkdir(parents=True, exist_ok=True)
+        for name in names:
+            src = pathlib.Path(directory) / name
+            dst = destination / relative_path / name
+            try:
+                os.link(src, dst, follow_symlinks=False)
+            except OSError:
+                shutil.copy2(src, dst, follow_symlinks=False)
+
+
+def within(root, generation, path):
+    """Locate a path of the output directory within a generation.
+
+    Returns
+    -------
+    pathlib.Path
+        Where ``path`` is mirrored in ``generation``, or ``path`` itself if it
+        is not in ``root``.
+
+    """
+    path = pathlib.Path(path)
+    try:
+        return generation / path.relative_to(root)
+    except ValueError:
+        return path
+
+
+def activate(root, generation):
+    """Point ``current`` to a generation, atomically."""
+    tmp_link = root / f".{CURRENT}.tmp{os.getpid()}"
+    tmp_link.unlink(missing_ok=True)
+    tmp_link.symlink_to(generation.name, target_is_directory=True)
+    os.replace(tmp_link, root / CURRENT)
+
+
+def prune(root, keep):
+    """Remove all but the newest ``keep`` generations, and never the current one."""
+    current = current_generation(root)
+    for path in list_generations(root)[:-keep]:
+        if current is None or path.name != current.name:
+            shutil.rmtree(path)
+
+
+def rollback(root):
+    """Switch ``current`` back to the generation before it.
+
+    Returns
+    -------
+    pathlib.Path
+        The generation now current.
+
+    Raises
+    ------
+    RuntimeError
+        If there is no older generation.
+
+    """
+    current = current_generation(root)
+    names = [path.name for path in list_generations(root)]
+    if current is None or current.name not in names:
+        raise RuntimeError(f"{root} has no current generation.")
+
+    index = names.index(current.name)
+    if index == 0:
+        raise RuntimeError(f"{root} has no generation older than {current.name}.")
+    previous = root / names[index - 1]
+    activate(root, previous)
+    return previous
+
+
+@contextlib.contextmanager
+def new_generation(root, keep, published_path=None):
+    """Prepare a new generation to build into, and switch to it if the build succeeds.
+
+    Parameters
+    ----------
+    root : pathlib.Path
+        The output directory.
+    keep : int
+        The number of generations to keep.
+    published_path : pathlib.Path, optional
+        The published directory. If it is in ``root``, it is hardlinked into
+        the new generation.
+
+    Yields
+    ------
+    pathlib.Path
+        The directory to build into. It is a sibling of the generations, so
+        relative paths from it are those from ``current``.
+
+    """
+    if keep < 1:
+        raise RuntimeError("At least one generation must be kept.")
+
+    root.mkdir(parents=True, exist_ok=True)
+    if (root / CURRENT).exists() and not (root / CURRENT).is_symlink():
+        raise RuntimeError(f"{root / CURRENT} exists and is not a symlink.")
+
+    # remove generations left unfinished by builds that were interrupted
+    for path in root.glob(".generation-*.tmp"):
+        shutil.rmtree(path)
+
+    existing = list_generations(root)
+    number = int(existing[-1].name.split("-")[1]) + 1 if existing else 1
+    generation = root / _name(number)
+    build_path = root / f".{generation.name}.tmp"
+
+    current = current_generation(root)
+    if current is not None:
+        link_tree(current, build_path)
+    build_path.mkdir(exist_ok=True)
+
+    if published_path is not None:
+        mirror = within(root, build_path, published_path)
+        if mirror != published_path:
+            shutil.rmtree(mirror, ignore_errors=True)
+            link_tree(published_path, mirror)
+
+    try:
+        yield build_path
+    except BaseException:
+        shutil.rmtree(build_path)
+        raise
+
+    os.rename(build_path, generation)
+    activate(root, generation)
+    prune(root, keep)
@@ -0,0 +1,213 @@
+"""Write cache headers for static hosting.
+
+After a build, a ``_headers`` file in the format understood by Netlify and
+Cloudflare Pages is written to the output directory. It gives every file a
+strong ``ETag``, the digest of its contents, so that browsers can revalidate
+cheaply, and a ``Cache-Control`` policy:
+
+- Fingerprinted assets, whose names contain a digest of their contents such as
+  ``app.3f2a9c1b.css``, never change, and are cached as immutable.
+- The outputs of pages that depend on the time are cached until their next
+  scheduled change: the earliest datetime in the configuration or in the
+  metadata of the publications the page read, and no later than the next
+  midnight, since pages commonly compare dates.
+- Everything else may change with any build, so it is cached but revalidated
+  on every use.
+
+The policies can be overridden per path with the ``cache_headers`` key of the
+configuration, a list of rules whose ``path`` is a glob pattern matched against
+the output path. The first matching rule wins::
+
+    cache_headers:
+        - path: "static/vendor/*"
+          cache_control: "public, max-age=31536000, immutable"
+
+Since the max-age of time-dependent pages is computed at build time, the site
+should be rebuilt at least as often as its pages change.
+
+"""
+import datetime
+import fnmatch
+import os
+import posixpath
+import re
+
+from . import dependencies
+
+
+HEADERS_FILE = "_headers"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+REVALIDATE = "public, no-cache"
+
+# a name containing a hex digest of at least 8 characters just before the suffix
+_FINGERPRINTED = re.compile(r"[.-][0-9a-f]{8,}\.[^./]+$")
+
+# the number of hex digits of a file's digest used as its ETag
+_ETAG_LENGTH = 32
+
+
+def _datetimes(obj):
+    """Generate the datetimes found in a structure of dicts and lists."""
+    if isinstance(obj, datetime.datetime):
+        yield obj
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            yield from _datetimes(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            yield from _datetimes(value)
+
+
+def _read_metadata(published, reads):
+    """Generate the metadata of the publications read by a page."""
+    if published is None:
+        return
+
+    for collection_key, publication_key in reads:
+        if publication_key is None or collection_key not in published.collections:
+            continue
+
+        publications = published.collections[collection_key].publications
+        if publication_key == dependencies.ALL:
+            yield from (publication.metadata for publication in publications.values())
+        elif publication_key in publications:
+            yield publications[publication_key].metadata
+
+
+def next_change(now, times):
+    """Find the time of the next scheduled change.
+
+    Parameters
+    ----------
+    now : datetime.datetime
+        The time of the build.
+    times : Iterable[datetime.datetime]
+        Times at which a page may change. Those not after ``now``, and those
+        that cannot be compared with it, are ignored.
+
+    Returns
+    -------
+    datetime.datetime
+        The earliest of the times after ``now``, or the next midnight if it is
+        earlier.
+
+    """
+    midnight = datetime.datetime.combine(
+        now.date() + datetime.timedelta(days=1), datetime.time(), tzinfo=now.tzinfo
+    )
+    earliest = midnight
+    for time in times:
+        try:
+            if now < time < earliest:
+                earliest = time
+        except TypeError:
+            # naive and aware datetimes cannot be compared
+            continue
+    return earliest
+
+
+def _rules(config):
+    rules = config.get("cache_headers", [])
+    if not isinstance(rules, list) or not all(
+        isinstance(rule, dict) and {"path", "cache_control"} <= rule.keys()
+        for rule in rules
+    ):
+        raise RuntimeError(
+            "The cache_headers key of the configuration must be a list of rules "
+            'with keys "path" and "cache_control".'
+        )
+    return rules
+
+
+def cache_policies(files, pages, published, config, now):
+    """Determine the ``Cache-Control`` header of every file of a build.
+
+    Parameters
+    ----------
+    files : dict
+        The file manifest of the output directory; see
+        :func:`abstract.deploy.load_file_manifest`.
+    pages : dict
+        The ``"pages"`` of the build's manifest.
+    published : publish.Universe or None
+        The universe of published artifacts.
+    config : dict
+        The site's configuration.
+    now : datetime.datetime
+        The time of the build.
+
+    Returns
+    -------
+    dict
+        Maps the path of each file to its ``Cache-Control`` header.
+
+    """
+    rules = _rules(config)
+    config_times = list(_datetimes(config))
+
+    time_dependent = {}
+    for page in pages.values():
+        if not page.get("used_now"):
+            continue
+        reads = [tuple(read) for read in page["reads"]]
+        times = [*config_times]
+        for metadata in _read_metadata(published, reads):
+            times.extend(_datetimes(dict(metadata)))
+        seconds = int((next_change(now, times) - now).total_seconds())
+        for path in page["outputs"]:
+            time_dependent[path] = f"public, max-age={seconds}, must-revalidate"
+
+    policies = {}
+    for path in files:
+        for rule in rules:
+            if fnmatch.fnmatchcase(path, rule["path"]):
+                policies[path] = rule["cache_control"]
+                break
+        else:
+            if path in time_dependent:
+                policies[path] = time_dependent[path]
+            elif _FINGERPRINTED.search(posixpath.basename(path)):
+                policies[path] = IMMUTABLE
+            else:
+                policies[path] = REVALIDATE
+    return policies
+
+
+def _urls(path):
+    """The URLs at which a file is served."""
+    yield "/" + path
+    directory, name = posixpath.split(path)
+    if name == "index.html":
+        yield f"/{directory}/" if directory else "/"
+
+
+def write_headers(output_path, files, policies):
+    """Write the ``_headers`` file of a build.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+    files : dict
+        The file manifest of the output directory.
+    policies : dict
+        Maps the path of each file to its ``Cache-Control`` header, as
+        computed by :func:`cache_policies`.
+
+    """
+    lines = []
+    for path in sorted(files):
+        if path == HEADERS_FILE:
+            continue
+        etag = files[path]["hash"][:_ETAG_LENGTH]
+        for url in _urls(path):
+            lines.append(url)
+            lines.append(f'  ETag: "{etag}"')
+            lines.append(f"  Cache-Control: {policies[path]}")
+
+    path = output_path / HEADERS_FILE
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text("".join(f"{line}\n" for line in lines))
+    os.replace(tmp_path, path)
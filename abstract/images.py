@@ -0,0 +1,359 @@
+"""Generate responsive derivatives of the images in ``static/``.
+
+If the configuration has an ``images`` key, every PNG and JPEG image in the
+``static`` directory is resized to each of the configured widths smaller than
+its own, and, if Pillow supports it, re-encoded as WebP at each of these
+widths and at its full width::
+
+    images:
+        widths: [480, 960, 1600]
+        webp: true
+        quality: 80
+
+The derivatives of ``static/figures/bootstrap.png`` are written next to it as
+``static/figures/bootstrap-480w.png``, ``static/figures/bootstrap-480w.webp``,
+and so on. Templates find them through the ``images`` variable, which maps the
+path of each image, relative to the output directory, to a dict with keys
+``"width"``, ``"height"``, ``"srcset"``, and ``"webp_srcset"``::
+
+    {% set image = images["static/figures/bootstrap.png"] %}
+    <picture>
+        {% if image.webp_srcset %}
+        <source type="image/webp" srcset="{{ image.webp_srcset }}">
+        {% endif %}
+        <img src="static/figures/bootstrap.png" srcset="{{ image.srcset }}"
+             width="{{ image.width }}" height="{{ image.height }}">
+    </picture>
+
+The variable is available to pages, element templates, and base templates.
+
+Derivatives are encoded in a process pool and cached on disk, keyed by the
+digest of their source and the settings, so an image is encoded again only if
+it, or the settings, change. The digests and dimensions of the images are kept
+in an index alongside the cache, and are recomputed only for images whose
+size or modification time changed.
+
+This stage requires Pillow, which is installed by ``pip install
+abstract[images]``.
+
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+import posixpath
+
+import cerberus
+
+from . import cache
+
+
+INDEX_VERSION = 1
+
+SCHEMA = {
+    "widths": {
+        "type": "list",
+        "schema": {"type": "integer", "min": 1},
+        "required": True,
+    },
+    "webp": {"type": "boolean", "default": True},
+    "quality": {"type": "integer", "min": 1, "max": 100, "default": 80},
+}
+
+# the formats of the images that get derivatives, by suffix
+_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG"}
+
+_SUFFIXES = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+
+
+def _pillow():
+    try:
+        import PIL.Image
+        import PIL.features
+    except ImportError as exc:
+        raise RuntimeError(
+            f"Generating images requires Pillow; install abstract[images]: {exc}"
+        )
+    return PIL
+
+
+def settings_from_config(config):
+    """Read the settings of the image stage from the configuration.
+
+    Returns
+    -------
+    dict or None
+        The validated settings, or ``None`` if the stage is not enabled. If
+        Pillow cannot encode WebP, ``"webp"`` is false.
+
+    Raises
+    ------
+    RuntimeError
+        If the settings are invalid, or if Pillow is not installed.
+
+    """
+    if config.get("images") is None:
+        return None
+
+    validator = cerberus.Validator(SCHEMA)
+    settings = validator.validated(config["images"])
+    if settings is None:
+        raise RuntimeError(f"Invalid images config: {validator.errors}")
+
+    pil = _pillow()
+    settings["webp"] = settings["webp"] and pil.features.check("webp")
+    settings["widths"] = sorted(set(settings["widths"]))
+    return settings
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with path.open("rb") as fileobj:
+        for chunk in iter(lambda: fileobj.read(2 ** 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _encode(source, destination, width, image_format, quality):
+    """Write a derivative of an image. Runs in a worker process."""
+    pil = _pillow()
+    with pil.Image.open(source) as image:
+        image.load()
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), pil.Image.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        options = {"optimize": True}
+        if image_format in ("JPEG", "WEBP"):
+            options["quality"] = quality
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = destination.with_name(f".{destination.name}.tmp{os.getpid()}")
+        image.save(tmp_path, image_format, **options)
+        os.replace(tmp_path, destination)
+
+
+class Images:
+    """The images of a static directory and their derivatives.
+
+    Parameters
+    ----------
+    static_path : pathlib.Path
+        The directory containing the images.
+    settings : dict
+        The settings, as returned by :func:`settings_from_config`.
+    cache_path : pathlib.Path
+        The directory in which the derivatives and the index are kept.
+    prefix : str
+        The path of ``static_path`` relative to the output directory.
+
+    Attributes
+    ----------
+    entries : dict
+        Maps the path of each image, relative to ``static_path``, to a dict
+        with keys ``"hash"``, ``"width"``, and ``"height"``, among others.
+        Filled in by :meth:`scan`.
+
+    """
+
+    def __init__(self, static_path, settings, cache_path, prefix="static"):
+        self.static_path = pathlib.Path(static_path)
+        self.settings = settings
+        self.cache_path = pathlib.Path(cache_path)
+        self.prefix = prefix
+        self.entries = {}
+
+    @property
+    def _index_file(self):
+        return self.cache_path / "index.json"
+
+    def _load_index(self):
+        try:
+            with self._index_file.open() as fileobj:
+                index = json.load(fileobj)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index["images"]
+
+    def scan(self, save=True):
+        """Find the images, reading only those that changed since the last scan.
+
+        Parameters
+        ----------
+        save : bool
+            Whether to save the index for later scans.
+
+        """
+        previous = self._load_index()
+        entries = {}
+        if self.static_path.exists():
+            sources = sorted(self.static_path.rglob("*"))
+        else:
+            sources = []
+
+        for path in sources:
+            if path.suffix.lower() not in _FORMATS or not path.is_file():
+                continue
+
+            relative_path = path.relative_to(self.static_path).as_posix()
+            stat = path.stat()
+            entry = previous.get(relative_path)
+            if (
+                entry is None
+                or entry["size"] != stat.st_size
+                or entry["mtime_ns"] != stat.st_mtime_ns
+            ):
+                with _pillow().Image.open(path) as image:
+                    width, height = image.size
+                entry = {
+                    "hash": _hash_file(path),
+                    "width": width,
+                    "height": height,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+            entries[relative_path] = entry
+        self.entries = entries
+
+        if save:
+            self.cache_path.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._index_file.with_name("index.json.tmp")
+            with tmp_path.open("w") as fileobj:
+                json.dump({"version": INDEX_VERSION, "images": entries}, fileobj)
+            os.replace(tmp_path, self._index_file)
+
+    def _variants(self, relative_path):
+        """The derivatives of an image, as ``(name, width, format)`` triples.
+
+        Names are relative to the static directory. Derivatives that would
+        replace a file in the static directory are omitted.
+
+        """
+        entry = self.entries[relative_path]
+        stem, suffix = posixpath.splitext(relative_path)
+        image_format = _FORMATS[suffix.lower()]
+        widths = [w for w in self.settings["widths"] if w < entry["width"]]
+
+        variants = [(f"{stem}-{w}w{suffix}", w, image_format) for w in widths]
+        if self.settings["webp"]:
+            variants += [(f"{stem}-{w}w.webp", w, "WEBP") for w in widths]
+            variants.append((f"{stem}.webp", entry["width"], "WEBP"))
+
+        return [
+            variant
+            for variant in variants
+            if variant[0] not in self.entries
+            and not (self.static_path / variant[0]).exists()
+        ]
+
+    def _cache_file(self, relative_path, width, image_format):
+        key = cache.hash_bytes(
+            self.entries[relative_path]["hash"].encode(),
+            str(width).encode(),
+            image_format.encode(),
+            str(self.settings["quality"]).encode(),
+        )
+        return self.cache_path / key[:2] / f"{key}{_SUFFIXES[image_format]}"
+
+    def derivatives(self):
+        """Locate the derivatives of every image in the cache.
+
+        Returns
+        -------
+        dict
+            Maps the path of each derivative, relative to the static
+            directory, to its file in the cache, which exists once
+            :meth:`generate` has been called.
+
+        """
+        return {
+            name: self._cache_file(relative_path, width, image_format)
+            for relative_path in self.entries
+            for name, width, image_format in self._variants(relative_path)
+        }
+
+    def _srcset(self, candidates):
+        return ", ".join(
+            f"{posixpath.join(self.prefix, name)} {width}w"
+            for name, width in candidates
+        )
+
+    def template_data(self):
+        """The ``images`` variable made available to templates."""
+        data = {}
+        for relative_path, entry in self.entries.items():
+            url = posixpath.join(self.prefix, relative_path)
+            width = entry["width"]
+            variants = self._variants(relative_path)
+
+            same_format = [(n, w) for n, w, f in variants if f != "WEBP"]
+            webp = [(n, w) for n, w, f in variants if f == "WEBP"]
+            data[url] = {
+                "width": width,
+                "height": entry["height"],
+                "srcset": self._srcset([*same_format, (relative_path, width)]),
+                "webp_srcset": self._srcset(webp) if webp else None,
+            }
+        return data
+
+    def digest(self):
+        """A digest of everything the templates see of the images."""
+        return cache.hash_object(self.template_data())
+
+    def generate(self, include=None, max_workers=None):
+        """Encode the derivatives missing from the cache, and prune the others.
+
+        Parameters
+        ----------
+        include : Callable[[str], bool], optional
+            If given, only the derivatives whose path, relative to the static
+            directory, satisfies it are encoded.
+        max_workers : int, optional
+            The maximum number of processes encoding images. If ``None``, the
+            number of CPUs is used.
+
+        Returns
+        -------
+        int
+            The number of derivatives encoded.
+
+        """
+        jobs = []
+        wanted = set()
+        for relative_path in self.entries:
+            for name, width, image_format in self._variants(relative_path):
+                cache_file = self._cache_file(relative_path, width, image_format)
+                wanted.add(cache_file)
+                if cache_file.exists() or (include is not None and not include(name)):
+                    continue
+                jobs.append(
+                    (
+                        self.static_path / relative_path,
+                        cache_file,
+                        width,
+                        image_format,
+                        self.settings["quality"],
+                    )
+                )
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        n_workers = min(max_workers, len(jobs))
+        if n_workers <= 1:
+            for job in jobs:
+                _encode(*job)
+        else:
+            with concurrent.futures.ProcessPoolExecutor(n_workers) as executor:
+                # consume the results, raising the first error
+                list(executor.map(_encode, *zip(*jobs)))
+
+        for path in self.cache_path.glob("??/*"):
+            if path not in wanted:
+                path.unlink()
+
+        return len(jobs)
@@ -0,0 +1,254 @@
+"""Place pages into the base template without re-rendering it for each page.
+
+The base template (``page.html`` and the templates it extends) is mostly a
+static shell around the page's body, depending only on the configuration.
+:class:`BaseLayout` renders it once with sentinels in place of the per-page
+parts and splits the result into static segments. Each page is then assembled
+by joining the segments with its body.
+
+Parts of the layout that depend on the page, such as the active item of a
+navigation bar, go through per-page slots: every block of the base templates
+that uses one of the :data:`PAGE_VARIABLES` is rendered separately for each
+page, while the rest of the shell is reused.
+
+The split is verified when it is made. The layout falls back to rendering the
+whole template for every page if the shell is not independent of the page: if
+the body is transformed or used more than once, if a page variable is used
+outside of a block, or if a template is included dynamically.
+
+"""
+import threading
+
+import jinja2
+from jinja2 import nodes
+
+
+# the variables that differ between pages, besides the body
+PAGE_VARIABLES = ("path",)
+
+_BODY_SENTINELS = ("\x00abstract-body\x00", "\x00abstract-other-body\x00")
+
+# a slot is marked by the prefix, the slot's name, and the suffix
+_SLOT_PREFIX, _SLOT_SUFFIX = "\x00abstract-slot:", "\x00"
+
+
+class _Unsplittable(Exception):
+    """Raised when the shell of a layout depends on the page."""
+
+
+def _uses_page_variables(environment, node, seen):
+    """Determine whether a node, or a template it includes, uses a page variable.
+
+    Raises
+    ------
+    _Unsplittable
+        If the node includes a template whose name is not a constant.
+
+    """
+    if any(name.name in PAGE_VARIABLES for name in node.find_all(nodes.Name)):
+        return True
+
+    for include in node.find_all((nodes.Include, nodes.Import, nodes.FromImport)):
+        if not isinstance(include.template, nodes.Const):
+            raise _Unsplittable("A template is included dynamically.")
+        name = include.template.value
+        if name not in seen:
+            seen.add(name)
+            if _uses_page_variables(environment, _parse(environment, name), seen):
+                return True
+
+    return False
+
+
+def _parse(environment, name):
+    source, _, _ = environment.loader.get_source(environment, name)
+    return environment.parse(source, name)
+
+
+def _find_slots(environment, template_name, seen):
+    """Find the blocks of a template and its parents that use page variables.
+
+    The names of the templates examined, including those included, are added
+    to ``seen``.
+
+    Returns
+    -------
+    Set[str]
+        The names of the blocks.
+
+    Raises
+    ------
+    _Unsplittable
+        If a page variable is used outside of a block.
+
+    """
+    slots = set()
+    name = template_name
+    while name is not None:
+        seen.add(name)
+        ast = _parse(environment, name)
+
+        for block in ast.find_all(nodes.Block):
+            if _uses_page_variables(environment, block, seen):
+                slots.add(block.name)
+
+        # what remains after removing the slots must not depend on the page
+        for block in ast.find_all(nodes.Block):
+            if block.name in slots:
+                block.body = []
+        if _uses_page_variables(environment, ast, seen):
+            raise _Unsplittable("A page variable is used outside of a block.")
+
+        extends = ast.find(nodes.Extends)
+        if extends is None:
+            name = None
+        elif isinstance(extends.template, nodes.Const):
+            name = extends.template.value
+        else:
+            raise _Unsplittable("The template extends a template dynamically.")
+
+    return slots
+
+
+def _sentinel_block(name):
+    def block(context):
+        yield f"{_SLOT_PREFIX}{name}{_SLOT_SUFFIX}"
+
+    return block
+
+
+class _Split:
+    """The shell of a layout, split around the body and the slots."""
+
+    def __init__(self, template, config, slots, body_sentinel):
+        self.template = template
+        context = template.new_context(
+            {"body": body_sentinel, "config": config, **_page_sentinels()}
+        )
+        for name in slots:
+            context.blocks.setdefault(name, []).insert(0, _sentinel_block(name))
+
+        shell = jinja2.utils.concat(template.root_render_func(context))
+        if shell.count(body_sentinel) != 1:
+            raise _Unsplittable("The body is not placed exactly once.")
+
+        # the blocks of the whole inheritance chain, for rendering the slots
+        self.blocks = {
+            name: functions[1:] if name in slots else functions
+            for name, functions in context.blocks.items()
+        }
+
+        self.segments = []
+        for i, part in enumerate(shell.split(body_sentinel)):
+            if i:
+                self.segments.append(("body", None))
+            for j, text in enumerate(part.split(_SLOT_PREFIX)):
+                if j:
+                    slot, _, text = text.partition(_SLOT_SUFFIX)
+                    self.segments.append(("slot", slot))
+                self.segments.append(("text", text))
+
+
+def _page_sentinels():
+    return {name: f"\x00abstract-{name}\x00" for name in PAGE_VARIABLES}
+
+
+class BaseLayout:
+    """The base template of a site, split once into its static parts.
+
+    Parameters
+    ----------
+    environment : jinja2.Environment
+        The base template environment.
+    config : dict
+        The site's configuration.
+    template_name : str
+        The name of the template in which pages are placed.
+
+    Attributes
+    ----------
+    is_split : bool
+        Whether pages are placed into a shell rendered once, rather than by
+        rendering the whole template for each page.
+
+    """
+
+    def __init__(self, environment, config, template_name="page.html"):
+        self.environment = environment
+        self.config = config
+        self.template_name = template_name
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        names = set()
+        try:
+            template = self.environment.get_template(self.template_name)
+            slots = _find_slots(self.environment, self.template_name, names)
+            split = _Split(template, self.config, slots, _BODY_SENTINELS[0])
+
+            # the shell must not depend on the body; if it does, a different
+            # body changes it
+            other = _Split(template, self.config, slots, _BODY_SENTINELS[1])
+            if other.segments != split.segments:
+                raise _Unsplittable("The shell depends on the body.")
+        except Exception:
+            # errors in the templates are reported when pages are rendered,
+            # by the fallback
+            split = None
+
+        if split is None:
+            self._templates = []
+        else:
+            self._templates = [self.environment.get_template(name) for name in names]
+        self._split = split
+
+    @property
+    def is_split(self):
+        return self._current() is not None
+
+    def _current(self):
+        """The split of the layout, made again if a template file changed."""
+        if not all(template.is_up_to_date for template in self._templates):
+            with self._lock:
+                if not all(template.is_up_to_date for template in self._templates):
+                    self._load()
+        return self._split
+
+    def render(self, body_html, path):
+        """Place a page into the layout.
+
+        Parameters
+        ----------
+        body_html : str
+            The page's body.
+        path : str
+            The page's output path, relative to the output directory.
+
+        Returns
+        -------
+        str
+
+        """
+        split = self._current()
+        variables = {"body": body_html, "config": self.config, "path": path}
+
+        if split is None:
+            # the environment reloads the template if it changed
+            template = self.environment.get_template(self.template_name)
+            return template.render(**variables)
+
+        context = None
+        parts = []
+        for kind, value in split.segments:
+            if kind == "text":
+                parts.append(value)
+            elif kind == "body":
+                parts.append(body_html)
+            else:
+                if context is None:
+                    context = split.template.new_context(variables)
+                    context.blocks = {k: list(v) for k, v in split.blocks.items()}
+                parts.append(jinja2.utils.concat(split.blocks[value][0](context)))
+        return "".join(parts)
+
@@ -0,0 +1,387 @@
+"""Load the collections of ``published.json`` only when they are used.
+
+A shared ``published.json`` can be tens of megabytes, while a site typically
+uses a few of its collections. :func:`load` returns a ``publish.Universe``
+whose ``collections`` mapping knows the name of every collection up front, but
+deserializes a collection (and updates its artifacts' paths) only when it is
+first accessed.
+
+This is made possible by a sidecar index recording the byte range of each
+collection within ``published.json``, along with digests of each collection's
+schema and publications. The index is built by a single streaming pass over
+the file and saved in the output directory's state directory; it is rebuilt
+only when ``published.json`` changes. Loading a collection then reads and
+parses just its byte range.
+
+"""
+import collections.abc
+import json
+import os
+import re
+import threading
+
+import publish
+
+from . import cache
+from . import compact_published
+
+
+INDEX_VERSION = 1
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+_DECODER = json.JSONDecoder()
+
+
+def update_paths(collection, prefix, compact=False):
+    """Make the paths of a collection's artifacts relative to the output directory.
+
+    Artifacts whose path is ``None`` are not yet released, and are left alone.
+    The collection's artifacts are modified in place.
+
+    Parameters
+    ----------
+    collection : publish.Collection
+        The collection.
+    prefix : pathlib.Path
+        The path of the directory containing ``published.json``, relative to
+        the output directory.
+    compact : bool
+        If true, each publication in the collection's ``publications`` dict is
+        instead replaced by a compact, read-only copy, for use in rendering;
+        see :mod:`abstract.compact_published`.
+
+    """
+    publications = collection.publications
+    for publication_key, publication in publications.items():
+        if compact:
+            publications[publication_key] = compact_published.compact_publication(
+                publication, prefix
+            )
+            continue
+
+        for artifact_key, artifact in publication.artifacts.items():
+            if artifact.path is not None:
+                publication.artifacts[artifact_key] = artifact._replace(
+                    path=prefix / artifact.path
+                )
+
+
+# building the index
+# --------------------------------------------------------------------------------------
+
+
+def _skip_whitespace(text, pos):
+    return _WHITESPACE.match(text, pos).end()
+
+
+def _scan_value(text, pos):
+    """Parse the JSON value at ``pos``, returning the position after it."""
+    _, end = _DECODER.raw_decode(text, pos)
+    return end
+
+
+def _scan_object(text, pos, scan_member):
+    """Scan the JSON object at ``pos`` member by member.
+
+    ``scan_member(key, value_start)`` is called for each member, and must
+    return the position just after the member's value. Returns the position
+    just after the object.
+
+    """
+    pos = _skip_whitespace(text, pos)
+    if text[pos : pos + 1] != "{":
+        raise ValueError(f"Expected an object at position {pos}.")
+
+    pos = _skip_whitespace(text, pos + 1)
+    if text[pos : pos + 1] == "}":
+        return pos + 1
+
+    while True:
+        key, pos = _DECODER.raw_decode(text, pos)
+        pos = _skip_whitespace(text, pos)
+        if text[pos : pos + 1] != ":":
+            raise ValueError(f"Expected ':' at position {pos}.")
+
+        pos = _skip_whitespace(text, pos + 1)
+        pos = _skip_whitespace(text, scan_member(key, pos))
+
+        if text[pos : pos + 1] == ",":
+            pos = _skip_whitespace(text, pos + 1)
+        elif text[pos : pos + 1] == "}":
+            return pos + 1
+        else:
+            raise ValueError(f"Expected ',' or '}}' at position {pos}.")
+
+
+class _ByteOffsets:
+    """Converts increasing character offsets in decoded text to byte offsets."""
+
+    def __init__(self, text):
+        self._text = text
+        self._ascii = text.isascii()
+        self._char = 0
+        self._byte = 0
+
+    def __call__(self, char):
+        if self._ascii:
+            return char
+        self._byte += len(self._text[self._char : char].encode("utf-8"))
+        self._char = char
+        return self._byte
+
+
+def build_index(raw):
+    """Index the collections of a serialized universe.
+
+    Parameters
+    ----------
+    raw : bytes
+        The contents of ``published.json``.
+
+    Returns
+    -------
+    dict
+        Maps each collection's key to a dict with keys ``"start"`` and
+        ``"end"``, the byte range of the collection within ``raw``,
+        ``"digest"``, the digest of that range, ``"schema"``, the digest of
+        the collection's serialized schema, and ``"publications"``, mapping
+        each publication's key to the digest of its serialized form.
+
+    Raises
+    ------
+    ValueError
+        If ``raw`` is not a serialized universe.
+
+    """
+    text = raw.decode("utf-8")
+    to_bytes = _ByteOffsets(text)
+    index = {}
+
+    def digest(start, end):
+        return cache.hash_bytes(text[start:end].encode("utf-8"))
+
+    def scan_collection(collection_key, start):
+        entry = {"schema": None, "publications": {}}
+
+        def scan_publication(publication_key, publication_start):
+            end = _scan_value(text, publication_start)
+            entry["publications"][publication_key] = digest(publication_start, end)
+            return end
+
+        def scan_collection_member(key, member_start):
+            if key == "publications":
+                return _scan_object(text, member_start, scan_publication)
+
+            end = _scan_value(text, member_start)
+            if key == "schema":
+                entry["schema"] = digest(member_start, end)
+            return end
+
+        end = _scan_object(text, start, scan_collection_member)
+        entry["digest"] = digest(start, end)
+        entry["start"] = to_bytes(start)
+        entry["end"] = to_bytes(end)
+        index[collection_key] = entry
+        return end
+
+    def scan_universe_member(key, start):
+        if key == "collections":
+            return _scan_object(text, start, scan_collection)
+        return _scan_value(text, start)
+
+    _scan_object(text, 0, scan_universe_member)
+    return index
+
+
+def _source_stamp(path):
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_index(published_file, state_path=None):
+    """Load the sidecar index of ``published.json``, building it if necessary.
+
+    Parameters
+    ----------
+    published_file : pathlib.Path
+        The path to ``published.json``.
+    state_path : pathlib.Path, optional
+        The directory where the index is saved between builds. If ``None``,
+        the index is neither read from nor saved to disk.
+
+    Returns
+    -------
+    dict
+        The index, as described in :func:`build_index`.
+
+    """
+    stamp = _source_stamp(published_file)
+    index_file = None if state_path is None else state_path / "published-index.json"
+
+    if index_file is not None:
+        try:
+            with index_file.open() as fileobj:
+                saved = json.load(fileobj)
+        except (FileNotFoundError, json.JSONDecodeError):
+            saved = None
+
+        if (
+            saved is not None
+            and saved.get("version") == INDEX_VERSION
+            and saved.get("source") == stamp
+        ):
+            return saved["collections"]
+
+    index = build_index(published_file.read_bytes())
+
+    if index_file is not None:
+        state_path.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_file.with_name(index_file.name + ".tmp")
+        with tmp_path.open("w") as fileobj:
+            json.dump(
+                {"version": INDEX_VERSION, "source": stamp, "collections": index},
+                fileobj,
+            )
+        os.replace(tmp_path, index_file)
+
+    return index
+
+
+# the lazy universe
+# --------------------------------------------------------------------------------------
+
+
+class LazyCollections(collections.abc.Mapping):
+    """A read-only mapping of collection keys to lazily-loaded collections.
+
+    The keys are known without loading anything. A collection is read from
+    ``published.json``, deserialized, and has its artifacts' paths updated
+    the first time it is accessed; it is then kept for later accesses.
+    Iterating over the values or items loads every collection.
+
+    Parameters
+    ----------
+    published_file : pathlib.Path
+        The path to ``published.json``.
+    index : dict
+        The file's index, as computed by :func:`build_index`.
+    prefix : pathlib.Path
+        The path of the directory containing ``published.json``, relative to
+        the output directory.
+    compact : bool
+        Whether loaded publications are compact and read-only; see
+        :func:`update_paths`.
+
+    """
+
+    def __init__(self, published_file, index, prefix, compact=False):
+        self._published_file = published_file
+        self._index = index
+        self._prefix = prefix
+        self._compact = compact
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            pass
+
+        entry = self._index[key]
+        with self._lock:
+            if key not in self._loaded:
+                self._loaded[key] = self._load(key, entry)
+            return self._loaded[key]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __repr__(self):
+        return f"LazyCollections({list(self._index)!r}, loaded={list(self._loaded)!r})"
+
+    @property
+    def loaded(self):
+        """The keys of the collections loaded so far."""
+        return set(self._loaded)
+
+    def _load(self, key, entry):
+        with self._published_file.open("rb") as fileobj:
+            fileobj.seek(entry["start"])
+            raw = fileobj.read(entry["end"] - entry["start"])
+
+        if cache.hash_bytes(raw) != entry["digest"]:
+            raise RuntimeError(
+                f'"{self._published_file}" changed while collection "{key}" was '
+                "being loaded."
+            )
+
+        # deserialize a universe containing only this collection, so that
+        # publish's own deserialization is used
+        serialized = '{"collections": {%s: %s}}' % (json.dumps(key), raw.decode("utf-8"))
+        collection = publish.deserialize(serialized).collections[key]
+        update_paths(collection, self._prefix, self._compact)
+        return collection
+
+    def digests(self):
+        """Summarize the collections without loading them.
+
+        Returns
+        -------
+        dict
+            A summary in the format of
+            :func:`abstract.dependencies.published_digests`. The digests are
+            computed from the serialized collections and the path prefix, so
+            they differ from those of an eagerly-loaded universe.
+
+        """
+        prefix = str(self._prefix).encode()
+        return {
+            key: {
+                "schema": cache.hash_bytes(prefix, str(entry["schema"]).encode()),
+                "publications": {
+                    publication_key: cache.hash_bytes(prefix, digest.encode())
+                    for publication_key, digest in entry["publications"].items()
+                },
+            }
+            for key, entry in self._index.items()
+        }
+
+
+def load(published_path, output_path, state_path=None, compact=False):
+    """Lazily load the universe in ``published.json``.
+
+    This is a lazy counterpart to :func:`abstract.load_published`.
+
+    Parameters
+    ----------
+    published_path : pathlib.Path
+        Path to the directory containing ``published.json``.
+    output_path : pathlib.Path
+        Path to the output directory.
+    state_path : pathlib.Path, optional
+        The directory where the sidecar index is kept between builds. If
+        ``None``, the index is built in memory each time.
+    compact : bool
+        Whether loaded publications are compact and read-only, as the
+        publications used for rendering are; see :func:`update_paths`.
+
+    Returns
+    -------
+    publish.Universe
+        A universe whose ``collections`` is a :class:`LazyCollections`.
+
+    """
+    published_file = published_path / "published.json"
+    index = load_index(published_file, state_path)
+    prefix = published_path.relative_to(output_path)
+    return publish.Universe(
+        collections=LazyCollections(published_file, index, prefix, compact)
+    )
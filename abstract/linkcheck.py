@@ -0,0 +1,244 @@
+"""Find broken links in a built site.
+
+Every HTML file in the output directory is parsed for the ``id`` attributes of
+its elements, including the ids of headings generated by the ``toc`` Markdown
+extension, and for the relative URLs in its ``href``, ``src``, and ``srcset``
+attributes. Each URL is then resolved against an in-memory index of the output
+directory, and its fragment, if any, against the ids of the page it points to.
+
+Typical mistakes this catches are links to artifacts that are not yet
+released, whose path is ``None``, and links to static files that were moved.
+
+Only relative URLs are checked: URLs with a scheme, such as ``https:`` or
+``mailto:``, and URLs beginning with ``/`` are skipped, since they do not
+necessarily point into the site.
+
+Parsing is the expensive part, so it is done in parallel, and the result for
+each page is kept in ``.abstract/links.json``. Later checks parse only the
+pages whose contents changed, as recorded by the file manifest of
+:mod:`abstract.deploy`, while the links of every page are resolved again
+against the current index, which is cheap.
+
+"""
+import concurrent.futures
+import functools
+import html.parser
+import json
+import os
+import posixpath
+import typing
+import urllib.parse
+
+from . import deploy
+from . import manifest
+
+
+LINKS_STATE_VERSION = 1
+
+# parsing is done serially unless each worker process gets at least this many
+# pages, since starting the processes takes longer than parsing a few pages
+_PAGES_PER_WORKER = 64
+
+# the attributes holding a single URL
+_URL_ATTRIBUTES = {"href", "src"}
+
+# fragments that need no matching id
+_IMPLICIT_FRAGMENTS = {"", "top"}
+
+
+class BrokenLink(typing.NamedTuple):
+    """A link that doesn't resolve.
+
+    Attributes
+    ----------
+    page : str
+        The page containing the link, relative to the output directory.
+    line : int
+        The line of the page on which the link appears.
+    url : str
+        The link's URL, as written.
+    reason : str
+        Why the link is broken.
+
+    """
+
+    page: str
+    line: int
+    url: str
+    reason: str
+
+    def __str__(self):
+        return f"{self.page}:{self.line}: {self.url} ({self.reason})"
+
+
+class _LinkExtractor(html.parser.HTMLParser):
+    """Collects the ids and the URLs of an HTML document."""
+
+    def __init__(self):
+        super().__init__()
+        self.ids = set()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        line = self.getpos()[0]
+        for name, value in attrs:
+            if value is None:
+                continue
+            if name == "id" or (name == "name" and tag == "a"):
+                self.ids.add(value)
+            elif name in _URL_ATTRIBUTES:
+                self.links.append([line, value.strip()])
+            elif name == "srcset":
+                for candidate in value.split(","):
+                    url = candidate.strip().split(" ")[0]
+                    if url:
+                        self.links.append([line, url])
+
+
+def _parse_page(output_path, relative_path):
+    """Extract the ids and links of an HTML file."""
+    extractor = _LinkExtractor()
+    with (output_path / relative_path).open(errors="replace") as fileobj:
+        extractor.feed(fileobj.read())
+    extractor.close()
+    return {"ids": sorted(extractor.ids), "links": extractor.links}
+
+
+def _parse_pages(output_path, pages, max_workers):
+    """Parse pages, in parallel if there are enough of them.
+
+    Returns
+    -------
+    Dict[str, dict]
+        Maps each page to the result of :func:`_parse_page`.
+
+    """
+    parse = functools.partial(_parse_page, output_path)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    n_workers = min(max_workers, len(pages) // _PAGES_PER_WORKER)
+
+    if n_workers <= 1:
+        results = map(parse, pages)
+        return dict(zip(pages, results))
+
+    chunksize = max(1, len(pages) // (4 * n_workers))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return dict(zip(pages, executor.map(parse, pages, chunksize=chunksize)))
+
+
+def _load_state(state_file):
+    try:
+        with state_file.open() as fileobj:
+            state = json.load(fileobj)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    if state.get("version") != LINKS_STATE_VERSION:
+        return {}
+    return state["pages"]
+
+
+def _is_checked(url):
+    """Whether a URL is relative to the page, and so points into the site."""
+    parts = urllib.parse.urlsplit(url)
+    return not (parts.scheme or parts.netloc or parts.path.startswith("/"))
+
+
+def _resolve(page, url, files):
+    """Find the file a relative URL points to.
+
+    Returns
+    -------
+    Tuple[Optional[str], Optional[str], str]
+        The path of the file relative to the output directory, or ``None`` if
+        there is no such file; the fragment; and why the link is broken, if it
+        is.
+
+    """
+    parts = urllib.parse.urlsplit(url)
+    fragment = urllib.parse.unquote(parts.fragment)
+    if not parts.path:
+        return page, fragment, ""
+
+    path = urllib.parse.unquote(parts.path)
+    target = posixpath.normpath(posixpath.join(posixpath.dirname(page), path))
+    if target == ".." or target.startswith("../"):
+        return None, fragment, "points outside of the site"
+
+    if target in files:
+        return target, fragment, ""
+
+    index = "index.html" if target == "." else f"{target}/index.html"
+    if index in files:
+        return index, fragment, ""
+
+    if posixpath.basename(target) == "None":
+        return None, fragment, "links to an unreleased artifact"
+    return None, fragment, "no such file"
+
+
+def check_links(output_path, max_workers=None):
+    """Check the relative links of every HTML file in a built site.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+    max_workers : int, optional
+        The maximum number of processes parsing pages. If ``None``, the number
+        of CPUs is used.
+
+    Returns
+    -------
+    List[BrokenLink]
+        The broken links, ordered by page and line.
+
+    """
+    files = deploy.update_file_manifest(output_path)
+    state_file = manifest.state_path(output_path) / "links.json"
+    previous = _load_state(state_file)
+
+    pages = {}
+    outdated = []
+    for path, entry in files.items():
+        if not path.endswith((".html", ".htm")):
+            continue
+        cached = previous.get(path)
+        if cached is not None and cached["hash"] == entry["hash"]:
+            pages[path] = cached
+        else:
+            outdated.append(path)
+
+    for path, result in _parse_pages(output_path, outdated, max_workers).items():
+        pages[path] = {"hash": files[path]["hash"], **result}
+
+    state_file.parent.mkdir(exist_ok=True)
+    tmp_path = state_file.with_name(state_file.name + ".tmp")
+    with tmp_path.open("w") as fileobj:
+        json.dump(
+            {"version": LINKS_STATE_VERSION, "pages": pages},
+            fileobj,
+            separators=(",", ":"),
+        )
+    os.replace(tmp_path, state_file)
+
+    ids = {path: set(page["ids"]) for path, page in pages.items()}
+    broken = []
+    for path in sorted(pages):
+        for line, url in pages[path]["links"]:
+            if not _is_checked(url):
+                continue
+
+            target, fragment, reason = _resolve(path, url, files)
+            if (
+                not reason
+                and target in ids
+                and fragment not in _IMPLICIT_FRAGMENTS
+                and fragment not in ids[target]
+            ):
+                reason = f'{target} has no element with id "{fragment}"'
+            if reason:
+                broken.append(BrokenLink(path, line, url, reason))
+
+    return broken
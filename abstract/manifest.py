@@ -0,0 +1,94 @@
+"""Read and write the manifest describing the previous build.
+
+The manifest is stored in the output directory under ``.abstract/``. It records,
+for each rendered page, the key it was rendered with, hashes of its outputs
+(the page itself and any additional pages or files emitted by its elements),
+the parts of the published universe it read, whether it used the time, and how
+long it took to render. It also records a digest of each published collection
+and publication. It is used to avoid rebuilding pages that are unaffected by a
+change, to avoid rewriting unchanged pages, to remove pages whose sources have
+been deleted, and to estimate the cost of a build before running it.
+
+"""
+import json
+import os
+
+
+MANIFEST_VERSION = 3
+
+
+def state_path(output_path):
+    """The directory within the output where build state is kept.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+
+    Returns
+    -------
+    pathlib.Path
+
+    """
+    return output_path / ".abstract"
+
+
+def new_manifest():
+    """Create an empty manifest.
+
+    Returns
+    -------
+    dict
+        A manifest with no pages, no published digests, and no timings.
+
+    """
+    return {"version": MANIFEST_VERSION, "pages": {}, "published": {}, "timings": {}}
+
+
+def load_manifest(output_path):
+    """Load the manifest of the previous build.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+
+    Returns
+    -------
+    dict
+        The manifest. If there was no previous build, or if its manifest is
+        unreadable or from an incompatible version, an empty manifest is
+        returned.
+
+    """
+    path = state_path(output_path) / "manifest.json"
+    try:
+        with path.open() as fileobj:
+            manifest = json.load(fileobj)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return new_manifest()
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return new_manifest()
+
+    return manifest
+
+
+def save_manifest(output_path, manifest):
+    """Atomically write the manifest of the current build.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+    manifest : dict
+        The manifest to write.
+
+    """
+    directory = state_path(output_path)
+    directory.mkdir(exist_ok=True)
+
+    tmp_path = directory / "manifest.json.tmp"
+    with tmp_path.open("w") as fileobj:
+        json.dump(manifest, fileobj, indent=2, sort_keys=True)
+    os.replace(tmp_path, directory / "manifest.json")
@@ -0,0 +1,206 @@
+"""Interchangeable engines for converting Markdown to HTML.
+
+The backend is chosen per site with the ``markdown_backend`` key in
+``config.yaml``, or with ``--markdown-backend`` on the command line. The
+available backends are:
+
+``python-markdown``
+    The default. Uses Python-Markdown with the ``toc`` extension.
+``markdown-it``
+    Uses markdown-it-py, if it is installed.
+``cmark``
+    Uses the C-backed cmarkgfm binding, if it is installed.
+
+Every backend gives Markdown headings the same anchor IDs that
+Python-Markdown's ``toc`` extension would, so that links to sections keep
+working when the backend is changed.
+
+"""
+import html
+import re
+import threading
+
+import markdown
+from markdown.extensions import toc
+
+
+DEFAULT_BACKEND = "python-markdown"
+
+_TAG_PATTERN = re.compile(r"<[^>]*>")
+
+# matches headings with no attributes; headings written in raw HTML with an id
+# are left alone, as they are by Python-Markdown
+_HEADING_PATTERN = re.compile(r"<h([1-6])>(.*?)</h\1>", re.DOTALL)
+
+
+def _heading_id(text, used_ids):
+    """Compute a heading's anchor id as Python-Markdown's toc extension would."""
+    return toc.unique(toc.slugify(text, "-"), used_ids)
+
+
+class PythonMarkdownBackend:
+    """Converts Markdown using Python-Markdown."""
+
+    name = "python-markdown"
+
+    def __init__(self):
+        # reusing the converter avoids rebuilding its extensions for every call
+        self._converter = markdown.Markdown(extensions=["toc"])
+
+    def __call__(self, contents):
+        self._converter.reset()
+        return self._converter.convert(contents)
+
+
+class MarkdownItBackend:
+    """Converts Markdown using markdown-it-py."""
+
+    name = "markdown-it"
+
+    def __init__(self):
+        import markdown_it
+
+        self._parser = markdown_it.MarkdownIt("commonmark").enable("table")
+
+    def __call__(self, contents):
+        env = {}
+        tokens = self._parser.parse(contents, env)
+
+        used_ids = set()
+        for i, token in enumerate(tokens):
+            if token.type != "heading_open" or token.attrGet("id") is not None:
+                continue
+
+            inline = tokens[i + 1]
+            text = "".join(
+                child.content
+                for child in inline.children or []
+                if child.type in {"text", "code_inline"}
+            )
+            token.attrSet("id", _heading_id(text, used_ids))
+
+        return self._parser.renderer.render(tokens, self._parser.options, env)
+
+
+class CmarkBackend:
+    """Converts Markdown using the cmarkgfm binding to the C reference implementation."""
+
+    name = "cmark"
+
+    def __init__(self):
+        import cmarkgfm
+        from cmarkgfm.cmark import Options
+
+        self._cmarkgfm = cmarkgfm
+        # raw HTML, such as the output of elements, must be passed through
+        self._options = Options.CMARK_OPT_UNSAFE
+
+    def __call__(self, contents):
+        converted = self._cmarkgfm.github_flavored_markdown_to_html(
+            contents, options=self._options
+        )
+
+        used_ids = set()
+
+        def add_id(match):
+            level, inner = match.groups()
+            text = html.unescape(_TAG_PATTERN.sub("", inner))
+            heading_id = _heading_id(text, used_ids)
+            return f'<h{level} id="{heading_id}">{inner}</h{level}>'
+
+        return _HEADING_PATTERN.sub(add_id, converted)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in [PythonMarkdownBackend, MarkdownItBackend, CmarkBackend]
+}
+
+
+def available_backends():
+    """The names of the backends whose dependencies are installed.
+
+    Returns
+    -------
+    List[str]
+
+    """
+    names = []
+    for name, backend in BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name=None):
+    """Create a Markdown backend.
+
+    Parameters
+    ----------
+    name : str, optional
+        The backend's name. If ``None``, the default backend is used.
+
+    Returns
+    -------
+    Callable[[str], str]
+        A function converting Markdown to HTML.
+
+    Raises
+    ------
+    RuntimeError
+        If there is no backend with the name, or if its dependencies are not
+        installed.
+
+    """
+    if name is None:
+        name = DEFAULT_BACKEND
+
+    try:
+        backend = BACKENDS[name]
+    except KeyError:
+        raise RuntimeError(
+            f'There is no Markdown backend named "{name}". '
+            f"Choose one of: {', '.join(BACKENDS)}."
+        )
+
+    try:
+        return backend()
+    except ImportError as exc:
+        raise RuntimeError(f'The "{name}" Markdown backend is not installed: {exc}')
+
+
+class ThreadLocalBackend:
+    """A backend that can be shared between threads.
+
+    Backends keep state between calls, such as Python-Markdown's reusable
+    converter, so a single instance must not be used by two threads at once.
+    This creates an instance of the named backend for each thread that uses it.
+
+    Parameters
+    ----------
+    name : str, optional
+        The backend's name. If ``None``, the default backend is used.
+
+    Raises
+    ------
+    RuntimeError
+        As :func:`get_backend`.
+
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self._local = threading.local()
+        # create the first instance now, so that an unavailable backend is
+        # reported immediately
+        self._local.backend = get_backend(name)
+
+    def __call__(self, contents):
+        try:
+            backend = self._local.backend
+        except AttributeError:
+            backend = self._local.backend = get_backend(self.name)
+        return backend(contents)
@@ -0,0 +1,194 @@
+"""Profile the memory used by a build with :mod:`tracemalloc`.
+
+A :class:`MemoryProfiler` takes a snapshot of the traced allocations at each
+boundary between the phases of a build (see :class:`abstract.metrics.BuildMetrics`)
+and around every invocation of an element. The report it writes records, for
+each phase, the peak memory use and the allocation sites holding the most
+memory at the phase's end, along with what grew since the previous phase; and
+for each element, how much memory its invocations allocated and retained, and
+where. The report is JSON with a stable ordering, so that reports of two
+builds can be compared with ``diff``.
+
+Tracing allocations slows a build down considerably, so it is only enabled on
+request.
+
+"""
+import contextlib
+import json
+import tracemalloc
+
+
+# the default number of allocation sites reported for each phase and element
+DEFAULT_TOP = 20
+
+
+def _take_snapshot():
+    """Take a snapshot, excluding the allocations made by the profiler itself."""
+    return tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ]
+    )
+
+
+def _site(traceback):
+    frame = traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def _top_sites(statistics, top):
+    return [
+        {"site": _site(stat.traceback), "size": stat.size, "count": stat.count}
+        for stat in statistics[:top]
+    ]
+
+
+def _top_differences(differences, top):
+    return [
+        {
+            "site": _site(diff.traceback),
+            "size_diff": diff.size_diff,
+            "count_diff": diff.count_diff,
+        }
+        for diff in differences[:top]
+        if diff.size_diff
+    ]
+
+
+class MemoryProfiler:
+    """Trace allocations over the course of a build.
+
+    Use as a context manager: tracing starts on entry and stops on exit.
+
+    Parameters
+    ----------
+    top : int
+        The number of allocation sites to report for each phase and element.
+    frames : int
+        The number of frames stored for each allocation.
+
+    """
+
+    def __init__(self, top=DEFAULT_TOP, frames=1):
+        self.top = top
+        self.frames = frames
+        self._phases = []
+        self._elements = {}
+        self._snapshot = None
+        self._phase_peak = 0
+        self._overall_peak = 0
+
+    def __enter__(self):
+        tracemalloc.start(self.frames)
+        self._snapshot = _take_snapshot()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        tracemalloc.stop()
+
+    def _take_peak(self):
+        """The current use and the peak since the last call, resetting the peak."""
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self._phase_peak = max(self._phase_peak, peak)
+        self._overall_peak = max(self._overall_peak, peak)
+        return current, peak
+
+    def phase_boundary(self, previous, next_phase):
+        """Record the end of the phase ``previous``, if it is not ``None``.
+
+        The signature matches the listeners of
+        :class:`abstract.metrics.BuildMetrics`.
+
+        """
+        current, _ = self._take_peak()
+        snapshot = _take_snapshot()
+
+        if previous is not None:
+            self._phases.append(
+                {
+                    "name": previous,
+                    "peak_bytes": self._phase_peak,
+                    "current_bytes": current,
+                    "top_sites": _top_sites(snapshot.statistics("lineno"), self.top),
+                    "growth": _top_differences(
+                        snapshot.compare_to(self._snapshot, "lineno"), self.top
+                    ),
+                }
+            )
+
+        self._snapshot = snapshot
+        self._phase_peak = current
+
+    @contextlib.contextmanager
+    def page(self, relative_path):
+        """Mark the rendering of a page; its memory is attributed to its phase."""
+        yield
+
+    @contextlib.contextmanager
+    def element(self, name):
+        """Profile an invocation of an element."""
+        # take the snapshot first, so that its own memory is counted both
+        # before and after the invocation
+        before = _take_snapshot()
+        before_current, _ = self._take_peak()
+        try:
+            yield
+        finally:
+            after_current, peak = self._take_peak()
+            after = _take_snapshot()
+
+            entry = self._elements.setdefault(
+                name, {"calls": 0, "retained_bytes": 0, "peak_bytes": 0, "sites": {}}
+            )
+            entry["calls"] += 1
+            entry["retained_bytes"] += after_current - before_current
+            entry["peak_bytes"] = max(entry["peak_bytes"], peak - before_current)
+            for diff in after.compare_to(before, "lineno"):
+                if diff.size_diff:
+                    site = _site(diff.traceback)
+                    entry["sites"][site] = entry["sites"].get(site, 0) + diff.size_diff
+
+    def report(self):
+        """Summarize the profile.
+
+        Returns
+        -------
+        dict
+            With keys ``"peak_bytes"``, the peak traced memory over the build;
+            ``"phases"``, a list with an entry for each phase; and
+            ``"elements"``, a dict with an entry for each element invoked.
+
+        """
+        elements = {}
+        for name, entry in sorted(self._elements.items()):
+            sites = sorted(entry["sites"].items(), key=lambda item: -abs(item[1]))
+            elements[name] = {
+                "calls": entry["calls"],
+                "retained_bytes": entry["retained_bytes"],
+                "peak_bytes": entry["peak_bytes"],
+                "top_sites": [
+                    {"site": site, "size_diff": size}
+                    for site, size in sites[: self.top]
+                ],
+            }
+
+        return {
+            "peak_bytes": self._overall_peak,
+            "phases": self._phases,
+            "elements": elements,
+        }
+
+    def write_report(self, path):
+        """Write the report as JSON.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The destination.
+
+        """
+        with path.open("w") as fileobj:
+            json.dump(self.report(), fileobj, indent=2, sort_keys=True)
+            fileobj.write("\n")
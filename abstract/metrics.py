@@ -0,0 +1,230 @@
+"""Collect metrics about a build and export them for Prometheus.
+
+:class:`BuildMetrics` accumulates the durations of a build's phases along
+with counters such as the number of pages rendered. :func:`write_textfile`
+writes them in the text exposition format read by the node exporter's
+textfile collector, so that scheduled builds can be monitored and alerted on.
+
+"""
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# the counters reported by a build, and their descriptions
+COUNTERS = {
+    "pages_rendered": "The number of pages rendered.",
+    "pages_cached": "The number of pages taken from the render cache.",
+    "pages_skipped": "The number of pages unaffected by changes, and not rebuilt.",
+    "outputs_written": "The number of outputs written.",
+    "outputs_deleted": "The number of outputs of deleted pages removed.",
+    "bytes_written": "The number of bytes of outputs written.",
+    "static_files_synced": "The number of static files copied.",
+    "static_bytes_synced": "The number of bytes of static files copied.",
+    "images_encoded": "The number of derivatives of images encoded.",
+    "published_collections_loaded": "The number of published collections loaded.",
+    "broken_links": "The number of broken links found by the link checker.",
+}
+
+
+class BuildMetrics:
+    """Metrics collected over the course of a build.
+
+    Phases are delimited by calls to :meth:`start_phase`; each call ends the
+    previous phase. Call :meth:`finish` to end the last phase.
+
+    Attributes
+    ----------
+    phases : dict
+        Maps the name of each phase to its duration in seconds, in the order
+        the phases were run.
+    counters : dict
+        Maps the name of each of the :data:`COUNTERS` to its value.
+    now : datetime.datetime
+        The time the build was run as.
+    caches : dict
+        Maps the name of each cache to a ``(hits, misses)`` pair.
+
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.caches = {}
+        self.now = None
+        self._start = time.perf_counter()
+        self._phase = None
+        self._phase_start = None
+        self._end = None
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call ``listener(previous, next)`` at each boundary between phases.
+
+        ``previous`` is ``None`` when the first phase starts, and ``next`` is
+        ``None`` when the build finishes.
+
+        """
+        self._listeners.append(listener)
+
+    def start_phase(self, name):
+        """End the current phase, if any, and start a new one."""
+        now = time.perf_counter()
+        if self._phase is not None:
+            self.phases[self._phase] = (
+                self.phases.get(self._phase, 0.0) + now - self._phase_start
+            )
+
+        for listener in self._listeners:
+            listener(self._phase, name)
+
+        # don't count the time spent by the listeners
+        now = time.perf_counter()
+        self._phase = name
+        self._phase_start = now
+
+    def finish(self):
+        """End the current phase and the build."""
+        self.start_phase(None)
+        self._end = time.perf_counter()
+
+    @property
+    def duration(self):
+        """The duration of the build so far, in seconds."""
+        end = time.perf_counter() if self._end is None else self._end
+        return end - self._start
+
+    def count(self, name, n=1):
+        """Increase one of the :data:`COUNTERS`."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_cache(self, name, hits, misses):
+        """Record the number of hits and misses of a cache."""
+        old_hits, old_misses = self.caches.get(name, (0, 0))
+        self.caches[name] = (old_hits + hits, old_misses + misses)
+
+
+def peak_rss():
+    """The peak resident set size of this process, in bytes, or None if unknown."""
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes; other platforms report kilobytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_sample(name, value, labels=None):
+    if labels:
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        name = f"{name}{{{label_text}}}"
+    return f"{name} {float(value)!r}"
+
+
+def format_metrics(metrics):
+    """Format metrics in the Prometheus text exposition format.
+
+    Parameters
+    ----------
+    metrics : BuildMetrics
+        The metrics of a finished build.
+
+    Returns
+    -------
+    str
+
+    """
+    families = []
+
+    def family(name, help_text, samples):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines.extend(_format_sample(name, value, labels) for labels, value in samples)
+        families.append("\n".join(lines))
+
+    family(
+        "abstract_build_duration_seconds",
+        "The duration of the last build.",
+        [(None, metrics.duration)],
+    )
+    family(
+        "abstract_build_phase_duration_seconds",
+        "The duration of each phase of the last build.",
+        [({"phase": phase}, seconds) for phase, seconds in metrics.phases.items()],
+    )
+    family(
+        "abstract_build_completed_timestamp_seconds",
+        "The time at which the last build completed.",
+        [(None, time.time())],
+    )
+
+    if metrics.now is not None:
+        family(
+            "abstract_build_now_timestamp_seconds",
+            "The time the last build was run as, which may differ from the "
+            "actual time.",
+            [(None, metrics.now.timestamp())],
+        )
+
+    for name, description in COUNTERS.items():
+        family(
+            f"abstract_{name}",
+            f"{description[:-1]} in the last build.",
+            [(None, metrics.counters.get(name, 0))],
+        )
+
+    if metrics.caches:
+        family(
+            "abstract_cache_lookups",
+            "The number of cache lookups in the last build, by result.",
+            [
+                ({"cache": cache, "result": result}, n)
+                for cache, (hits, misses) in sorted(metrics.caches.items())
+                for result, n in [("hit", hits), ("miss", misses)]
+            ],
+        )
+        family(
+            "abstract_cache_hit_ratio",
+            "The fraction of cache lookups in the last build that were hits.",
+            [
+                ({"cache": cache}, hits / (hits + misses))
+                for cache, (hits, misses) in sorted(metrics.caches.items())
+                if hits + misses
+            ],
+        )
+
+    rss = peak_rss()
+    if rss is not None:
+        family(
+            "abstract_peak_rss_bytes",
+            "The peak resident set size of the last build.",
+            [(None, rss)],
+        )
+
+    return "\n".join(families) + "\n"
+
+
+def write_textfile(path, metrics):
+    """Atomically write metrics for the node exporter's textfile collector.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The destination. Its name should end in ``.prom``.
+    metrics : BuildMetrics
+        The metrics of a finished build.
+
+    """
+    # the collector ignores files not ending in .prom, so the temporary file
+    # is never read while partially written
+    tmp_path = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    tmp_path.write_text(format_metrics(metrics))
+    os.replace(tmp_path, path)
@@ -0,0 +1,248 @@
+"""Destinations for the files of a built site.
+
+A build writes its outputs through an output backend. The backends are:
+
+:class:`FilesystemOutput`
+    The default. Writes the site into a directory. It is the only backend
+    that keeps its files between builds, so it is the only one with which
+    builds are incremental.
+:class:`MemoryOutput`
+    Keeps the site in memory, as a mapping of relative paths to bytes.
+:class:`ArchiveOutput`
+    Streams the site into a tar or zip archive.
+
+Every backend provides ``write(relative_path, contents)`` to write a rendered
+output, ``add_file(relative_path, source_path)`` to add a static file,
+``exists(relative_path)``, and ``flush()``, which waits until the outputs
+written so far can be read back, and is used as a context manager. Backends whose
+``incremental`` attribute is true also provide ``delete(relative_path)`` and a
+``path`` attribute. ``n_files`` and ``n_bytes`` count the outputs written.
+
+"""
+import collections.abc
+import io
+import pathlib
+import shutil
+import tarfile
+import time
+import zipfile
+
+from . import pipeline
+
+
+class FilesystemOutput:
+    """Writes the site into a directory.
+
+    Outputs are written atomically from a pool of threads; see
+    :class:`abstract.pipeline.AtomicWriter`.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        The output directory. It is created if it doesn't exist.
+    writer_threads : int
+        The number of threads writing outputs.
+    fsync : bool
+        Whether to flush each output to disk before it replaces the old one.
+
+    """
+
+    incremental = True
+
+    def __init__(
+        self, path, writer_threads=pipeline.DEFAULT_WRITER_THREADS, fsync=False
+    ):
+        self.path = pathlib.Path(path)
+        self._writer = pipeline.AtomicWriter(max_workers=writer_threads, fsync=fsync)
+
+    def __enter__(self):
+        self.path.mkdir(exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._writer.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def n_files(self):
+        return self._writer.n_files
+
+    @property
+    def n_bytes(self):
+        return self._writer.n_bytes
+
+    def write(self, relative_path, contents):
+        self._writer.write(self.path / relative_path, contents)
+
+    def flush(self):
+        self._writer.flush()
+
+    def add_file(self, relative_path, source_path):
+        destination = self.path / relative_path
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source_path, destination)
+
+    def exists(self, relative_path):
+        return (self.path / relative_path).exists()
+
+    def delete(self, relative_path):
+        (self.path / relative_path).unlink(missing_ok=True)
+
+
+class MemoryOutput(collections.abc.Mapping):
+    """Keeps the site in memory.
+
+    The instance is a read-only mapping from each output's path, relative to
+    the site's root, to its contents as bytes. Static files are not copied into
+    memory; they are referenced, and read from their source when accessed.
+
+    """
+
+    incremental = False
+
+    def __init__(self):
+        self._files = {}
+        self.n_files = 0
+        self.n_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def __getitem__(self, relative_path):
+        contents = self._files[relative_path]
+        if isinstance(contents, pathlib.Path):
+            return contents.read_bytes()
+        return contents
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+    def source(self, relative_path):
+        """The source of a static file, or ``None`` if the output was rendered."""
+        contents = self._files[relative_path]
+        return contents if isinstance(contents, pathlib.Path) else None
+
+    def write(self, relative_path, contents):
+        encoded = contents.encode("utf-8")
+        self._files[relative_path] = encoded
+        self.n_files += 1
+        self.n_bytes += len(encoded)
+
+    def add_file(self, relative_path, source_path):
+        self._files[relative_path] = pathlib.Path(source_path)
+
+    def exists(self, relative_path):
+        return relative_path in self._files
+
+    def flush(self):
+        pass
+
+
+class ArchiveOutput:
+    """Streams the site into a tar or zip archive.
+
+    Entries are written as they are produced, and static files are read
+    directly from their sources, so the site is never written to disk
+    uncompressed.
+
+    Parameters
+    ----------
+    target : pathlib.Path or file object
+        The archive's path, or a binary file object to write it to. The file
+        object need not be seekable.
+    archive_format : str, optional
+        One of ``"zip"``, ``"tar"``, ``"tar.gz"``. If ``None``, it is inferred
+        from the suffix of ``target``, which must then be a path.
+
+    """
+
+    incremental = False
+
+    FORMATS = ("zip", "tar", "tar.gz")
+
+    def __init__(self, target, archive_format=None):
+        if archive_format is None:
+            archive_format = self.infer_format(target)
+        if archive_format not in self.FORMATS:
+            raise RuntimeError(
+                f'Unknown archive format "{archive_format}". '
+                f"Choose one of: {', '.join(self.FORMATS)}."
+            )
+
+        self.target = target
+        self.archive_format = archive_format
+        self.n_files = 0
+        self.n_bytes = 0
+        self._names = set()
+        self._archive = None
+        self._fileobj = None
+
+    @classmethod
+    def infer_format(cls, path):
+        """Infer the archive format from a path's suffix.
+
+        Raises
+        ------
+        RuntimeError
+            If the suffix is not that of a supported format.
+
+        """
+        name = pathlib.Path(path).name
+        if name.endswith(".zip"):
+            return "zip"
+        if name.endswith((".tar.gz", ".tgz")):
+            return "tar.gz"
+        if name.endswith(".tar"):
+            return "tar"
+        raise RuntimeError(f'Cannot infer the archive format of "{path}".')
+
+    def __enter__(self):
+        if isinstance(self.target, (str, pathlib.Path)):
+            self._fileobj = open(self.target, "wb")
+            fileobj = self._fileobj
+        else:
+            fileobj = self.target
+
+        if self.archive_format == "zip":
+            self._archive = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED)
+        else:
+            mode = "w|gz" if self.archive_format == "tar.gz" else "w|"
+            self._archive = tarfile.open(fileobj=fileobj, mode=mode)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._archive.close()
+        if self._fileobj is not None:
+            self._fileobj.close()
+
+    def write(self, relative_path, contents):
+        encoded = contents.encode("utf-8")
+        if self.archive_format == "zip":
+            self._archive.writestr(relative_path, encoded)
+        else:
+            info = tarfile.TarInfo(relative_path)
+            info.size = len(encoded)
+            info.mtime = int(time.time())
+            self._archive.addfile(info, io.BytesIO(encoded))
+
+        self._names.add(relative_path)
+        self.n_files += 1
+        self.n_bytes += len(encoded)
+
+    def add_file(self, relative_path, source_path):
+        if self.archive_format == "zip":
+            self._archive.write(source_path, arcname=relative_path)
+        else:
+            self._archive.add(source_path, arcname=relative_path, recursive=False)
+        self._names.add(relative_path)
+
+    def exists(self, relative_path):
+        return relative_path in self._names
+
+    def flush(self):
+        pass
@@ -0,0 +1,217 @@
+"""Overlap the reading and writing of files with rendering.
+
+Rendering is CPU-bound, while reading page sources and writing outputs block
+on the filesystem. On network filesystems the latter can dominate. The tools
+here move this I/O to background threads: :func:`prefetch` reads ahead of the
+renderer through a bounded queue, and :class:`AtomicWriter` writes outputs from
+a thread pool. Both apply backpressure, so memory use stays bounded no matter
+how far the renderer falls behind or gets ahead.
+
+"""
+import concurrent.futures
+import os
+import queue
+import threading
+
+
+# the default number of items read ahead of the consumer
+DEFAULT_PREFETCH_DEPTH = 8
+
+# the default number of threads writing outputs
+DEFAULT_WRITER_THREADS = 4
+
+_DONE = object()
+
+
+def prefetch(items, load, depth=DEFAULT_PREFETCH_DEPTH):
+    """Load items in a background thread, ahead of their consumption.
+
+    Parameters
+    ----------
+    items : Iterable
+        The items to load. This is iterated in the background thread.
+    load : Callable
+        Called on each item to load it.
+    depth : int
+        The maximum number of loaded items waiting to be consumed. When the
+        queue is full, loading pauses.
+
+    Yields
+    ------
+    (object, object)
+        Each item along with the result of loading it, in order. If loading
+        raises an exception, it is re-raised here.
+
+    """
+    loaded = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry):
+        # block until there is room, but give up if the consumer has stopped
+        while not stop.is_set():
+            try:
+                loaded.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, load(item), None)):
+                    return
+        except Exception as exc:
+            put((None, None, exc))
+        else:
+            put(_DONE)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            entry = loaded.get()
+            if entry is _DONE:
+                return
+
+            item, result, exc = entry
+            if exc is not None:
+                raise exc
+
+            yield item, result
+    finally:
+        stop.set()
+        thread.join()
+
+
+class AtomicWriter:
+    """Write files atomically from a pool of threads.
+
+    Each file is written to a temporary file in the same directory, which then
+    replaces the destination; readers never see a partially-written file. If
+    ``fsync`` is true, each file's contents are flushed to disk before it
+    replaces the destination, and each directory that received a file is
+    flushed once, when the writer is closed, rather than after every file.
+
+    Use as a context manager; leaving the context waits for all writes to
+    finish and re-raises the first error encountered by a writer thread.
+
+    Parameters
+    ----------
+    max_workers : int
+        The number of writer threads.
+    max_pending : int
+        The maximum number of writes queued or in progress. :meth:`write`
+        blocks when this is reached.
+    fsync : bool
+        Whether to flush written files and their directories to disk.
+
+    Attributes
+    ----------
+    n_files : int
+        The number of files written so far.
+    n_bytes : int
+        The number of bytes written so far.
+
+    """
+
+    def __init__(
+        self, max_workers=DEFAULT_WRITER_THREADS, max_pending=None, fsync=False
+    ):
+        if max_pending is None:
+            max_pending = 4 * max_workers
+
+        self.fsync = fsync
+        self._max_pending = max_pending
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._directories = set()
+        self._errors = []
+        self.n_files = 0
+        self.n_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(wait=True)
+        if exc_type is None:
+            self._finish()
+
+    def write(self, path, contents):
+        """Schedule a file to be written.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            The destination.
+        contents : str
+            The file's contents.
+
+        """
+        # fail early if a previous write failed
+        if self._errors:
+            raise self._errors[0]
+
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._write, path, contents)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+
+    def flush(self):
+        """Wait for the writes scheduled so far to finish.
+
+        Raises the first error encountered by a writer thread.
+
+        """
+        # every slot is free once no write is queued or in progress
+        for _ in range(self._max_pending):
+            self._slots.acquire()
+        for _ in range(self._max_pending):
+            self._slots.release()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def _done(self, future):
+        exc = future.exception()
+        if exc is not None:
+            with self._lock:
+                self._errors.append(exc)
+        self._slots.release()
+
+    def _write(self, path, contents):
+        tmp_path = path.with_name(f".{path.name}.tmp{threading.get_ident()}")
+        encoded = contents.encode("utf-8")
+        try:
+            with tmp_path.open("wb") as fileobj:
+                fileobj.write(encoded)
+                if self.fsync:
+                    fileobj.flush()
+                    os.fsync(fileobj.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._directories.add(path.parent)
+            self.n_files += 1
+            self.n_bytes += len(encoded)
+
+    def _finish(self):
+        if self._errors:
+            raise self._errors[0]
+
+        if self.fsync:
+            for directory in self._directories:
+                fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
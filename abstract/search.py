@@ -0,0 +1,275 @@
+"""Build a prebuilt, sharded inverted index for client-side search.
+
+The index is written to ``search/`` in the output directory:
+
+- ``search/docs.json`` maps each document's integer id to its URL and title.
+- ``search/index/<prefix>.json`` maps each term beginning with ``<prefix>`` to
+  a list of ``[document id, term frequency]`` postings.
+- ``search/search.js`` is a small client that answers queries by loading only
+  the shards for the query's terms.
+
+Documents are the rendered pages and the released artifacts in the published
+universe. The terms of each document are kept in ``.abstract/search.json`` so
+that later builds need only reprocess the pages that changed, and rewrite only
+the shards containing their terms.
+
+"""
+import html.parser
+import json
+import os
+import re
+
+
+# the number of leading characters of a term that determine its shard
+PREFIX_LENGTH = 2
+
+# terms shorter than this are not indexed
+MIN_TERM_LENGTH = 2
+
+_TERM_PATTERN = re.compile(r"[a-z0-9]+")
+
+CLIENT_SCRIPT = """\
+// Query the prebuilt search index. Usage:
+//   abstractSearch("homework 3 solutions", "search/").then(results => ...)
+// Resolves to a list of {url, title, score}, best match first.
+function abstractSearch(query, root) {
+    var terms = (query.toLowerCase().match(/[a-z0-9]+/g) || []).filter(function (t) {
+        return t.length >= %(min_length)d;
+    });
+    var load = function (name) {
+        return fetch(root + name).then(function (r) { return r.ok ? r.json() : {}; });
+    };
+    var shards = {};
+    terms.forEach(function (t) { shards[t.slice(0, %(prefix_length)d)] = true; });
+    var prefixes = Object.keys(shards);
+    return Promise.all([load("docs.json")].concat(prefixes.map(function (p) {
+        return load("index/" + p + ".json");
+    }))).then(function (loaded) {
+        var docs = loaded[0], index = {}, scores = {}, matched = {};
+        loaded.slice(1).forEach(function (shard) { Object.assign(index, shard); });
+        terms.forEach(function (t) {
+            (index[t] || []).forEach(function (posting) {
+                scores[posting[0]] = (scores[posting[0]] || 0) + posting[1];
+                matched[posting[0]] = (matched[posting[0]] || 0) + 1;
+            });
+        });
+        return Object.keys(scores).filter(function (id) {
+            return matched[id] === terms.length;
+        }).map(function (id) {
+            return {url: docs[id][0], title: docs[id][1], score: scores[id]};
+        }).sort(function (a, b) { return b.score - a.score; });
+    });
+}
+"""
+
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric terms, counting occurrences.
+
+    Parameters
+    ----------
+    text : str
+        The text to tokenize.
+
+    Returns
+    -------
+    dict
+        Maps each term to the number of times it appears.
+
+    """
+    counts = {}
+    for term in _TERM_PATTERN.findall(text.lower()):
+        if len(term) >= MIN_TERM_LENGTH:
+            counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+class _TextExtractor(html.parser.HTMLParser):
+    """Collects the visible text and the title of an HTML document."""
+
+    _SKIPPED_TAGS = {"script", "style"}
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.title = None
+        self._skipping = 0
+        self._in_title = False
+        self._heading = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIPPED_TAGS:
+            self._skipping += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "h1" and self.title is None:
+            self._heading = []
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED_TAGS:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "h1" and self._heading is not None:
+            self.title = " ".join("".join(self._heading).split()) or None
+            self._heading = None
+
+    def handle_data(self, data):
+        if self._skipping:
+            return
+        if self._heading is not None:
+            self._heading.append(data)
+        if not self._in_title:
+            self.chunks.append(data)
+
+
+def _page_document(output_path, relative_path):
+    """Extract a searchable document from a rendered page."""
+    extractor = _TextExtractor()
+    with (output_path / relative_path).open() as fileobj:
+        extractor.feed(fileobj.read())
+
+    return {
+        "url": relative_path,
+        "title": extractor.title or relative_path,
+        "terms": tokenize(" ".join(extractor.chunks)),
+    }
+
+
+def _artifact_documents(published):
+    """Extract a searchable document from each released artifact."""
+    documents = {}
+    if published is None:
+        return documents
+
+    for collection_key, collection in published.collections.items():
+        for publication_key, publication in collection.publications.items():
+            metadata_text = " ".join(str(v) for v in publication.metadata.values())
+            for artifact_key, artifact in publication.artifacts.items():
+                if artifact.path is None:
+                    continue
+
+                title = f"{collection_key} / {publication_key} / {artifact_key}"
+                text = " ".join(
+                    [collection_key, publication_key, artifact_key, metadata_text]
+                )
+                doc_key = f"published:{collection_key}/{publication_key}/{artifact_key}"
+                documents[doc_key] = {
+                    "url": str(artifact.path),
+                    "title": title,
+                    "terms": tokenize(text),
+                }
+
+    return documents
+
+
+def _write_json(path, obj):
+    """Atomically write a compact JSON file."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w") as fileobj:
+        json.dump(obj, fileobj, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _load_state(state_file):
+    try:
+        with state_file.open() as fileobj:
+            return json.load(fileobj)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"next_id": 0, "documents": {}}
+
+
+def update_search_index(output_path, state_path, pages, changed, published):
+    """Update the search index after a build.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+    state_path : pathlib.Path
+        The directory where the index's state between builds is kept.
+    pages : Iterable[str]
+        The output paths of all rendered HTML pages in this build, relative to
+        the output directory.
+    changed : Iterable[str]
+        The pages among ``pages`` that were written in this build. Other pages
+        are reprocessed only if they are not yet in the index.
+    published : publish.Universe or None
+        The universe of published artifacts.
+
+    """
+    state_file = state_path / "search.json"
+    state = _load_state(state_file)
+    old_documents = state["documents"]
+
+    index_path = output_path / "search"
+    (index_path / "index").mkdir(parents=True, exist_ok=True)
+    if not (index_path / "docs.json").exists():
+        # the index is missing from the output, so it must be rebuilt from scratch
+        old_documents = {}
+
+    pages = set(pages)
+    changed = set(changed)
+
+    new_documents = _artifact_documents(published)
+    for page in sorted(pages):
+        if page in changed or page not in old_documents:
+            new_documents[page] = _page_document(output_path, page)
+        else:
+            new_documents[page] = old_documents[page]
+
+    # assign each document a stable integer id; reuse the previous one if possible
+    for key, document in new_documents.items():
+        if key in old_documents:
+            document["id"] = old_documents[key]["id"]
+        else:
+            document["id"] = state["next_id"]
+            state["next_id"] += 1
+
+    # determine which shards contain terms of documents that changed
+    touched_prefixes = set()
+    for key in old_documents.keys() | new_documents.keys():
+        old, new = old_documents.get(key), new_documents.get(key)
+        if old == new:
+            continue
+        for document in (old, new):
+            if document is not None:
+                touched_prefixes.update(t[:PREFIX_LENGTH] for t in document["terms"])
+
+    if not old_documents:
+        touched_prefixes.update(
+            p.stem for p in (index_path / "index").glob("*.json")
+        )
+
+    shards = {prefix: {} for prefix in touched_prefixes}
+    for document in new_documents.values():
+        for term, count in document["terms"].items():
+            shard = shards.get(term[:PREFIX_LENGTH])
+            if shard is not None:
+                shard.setdefault(term, []).append([document["id"], count])
+
+    for prefix, shard in shards.items():
+        shard_path = index_path / "index" / f"{prefix}.json"
+        if shard:
+            _write_json(shard_path, shard)
+        elif shard_path.exists():
+            shard_path.unlink()
+
+    _write_json(
+        index_path / "docs.json",
+        {d["id"]: [d["url"], d["title"]] for d in new_documents.values()},
+    )
+
+    script_path = index_path / "search.js"
+    script = CLIENT_SCRIPT % {
+        "min_length": MIN_TERM_LENGTH,
+        "prefix_length": PREFIX_LENGTH,
+    }
+    if not script_path.exists() or script_path.read_text() != script:
+        tmp_path = script_path.with_name(script_path.name + ".tmp")
+        tmp_path.write_text(script)
+        os.replace(tmp_path, script_path)
+
+    state["documents"] = new_documents
+    state_path.mkdir(exist_ok=True)
+    _write_json(state_file, state)
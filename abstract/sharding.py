@@ -0,0 +1,305 @@
+"""Split a build across several machines, and merge the results.
+
+A build run with ``--shard i/N`` renders only the pages, and copies only the
+static files, whose output paths hash to shard ``i`` of ``N``. The hash is
+stable, so a page is always assigned to the same shard. Each shard writes a
+partial output tree along with a shard manifest in ``.abstract/shard.json``
+recording which shard it is and digests of the configuration, theme, and
+published artifacts it was built from.
+
+:func:`merge` combines the partial trees into the final site, after checking
+that every shard is present and that all shards were built from the same
+inputs.
+
+"""
+import hashlib
+import json
+import os
+import shutil
+import typing
+
+from . import manifest
+
+
+SHARD_MANIFEST_VERSION = 2
+
+
+class Shard(typing.NamedTuple):
+    """One part of a sharded build.
+
+    Attributes
+    ----------
+    index : int
+        The shard's number, from 1 to ``count``.
+    count : int
+        The number of shards.
+
+    """
+
+    index: int
+    count: int
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+
+def parse_shard(s):
+    """Parse a shard specification of the form ``i/N``.
+
+    Parameters
+    ----------
+    s : str
+        The specification.
+
+    Returns
+    -------
+    Shard
+
+    Raises
+    ------
+    ValueError
+        If the specification is malformed, or if ``i`` is not between 1 and
+        ``N``.
+
+    """
+    index, sep, count = s.partition("/")
+    try:
+        shard = Shard(int(index), int(count))
+    except ValueError:
+        raise ValueError(f'Invalid shard "{s}"; expected the form i/N.')
+
+    if not sep or not 1 <= shard.index <= shard.count:
+        raise ValueError(f'Invalid shard "{s}"; expected 1 <= i <= N.')
+
+    return shard
+
+
+def in_shard(relative_path, shard):
+    """Determine whether an output belongs to a shard.
+
+    Parameters
+    ----------
+    relative_path : str
+        The output's path, relative to the output directory.
+    shard : Shard or None
+        The shard. If ``None``, every output belongs to it.
+
+    Returns
+    -------
+    bool
+
+    """
+    if shard is None:
+        return True
+
+    digest = hashlib.sha256(relative_path.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shard.count == shard.index - 1
+
+
+def _shard_manifest_path(output_path):
+    return manifest.state_path(output_path) / "shard.json"
+
+
+def save_shard_manifest(output_path, shard, input_hashes):
+    """Record the shard that an output tree belongs to.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The shard's output directory.
+    shard : Shard
+        The shard.
+    input_hashes : dict
+        Digests of the inputs that all shards must share, such as the
+        configuration, the context, and the theme, and the time bucket the
+        pages were rendered in.
+
+    """
+    path = _shard_manifest_path(output_path)
+    path.parent.mkdir(exist_ok=True)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w") as fileobj:
+        json.dump(
+            {
+                "version": SHARD_MANIFEST_VERSION,
+                "shard": list(shard),
+                "inputs": input_hashes,
+            },
+            fileobj,
+            indent=2,
+        )
+    os.replace(tmp_path, path)
+
+
+def remove_shard_manifest(output_path):
+    """Remove the shard manifest, if any, after an unsharded build.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The output directory.
+
+    """
+    _shard_manifest_path(output_path).unlink(missing_ok=True)
+
+
+def load_shard_manifest(output_path):
+    """Load the shard manifest of a shard's output tree.
+
+    Parameters
+    ----------
+    output_path : pathlib.Path
+        The shard's output directory.
+
+    Returns
+    -------
+    dict
+        The shard manifest, with ``"shard"`` converted to a :class:`Shard`.
+
+    Raises
+    ------
+    RuntimeError
+        If the directory does not contain the output of a sharded build.
+
+    """
+    try:
+        with _shard_manifest_path(output_path).open() as fileobj:
+            shard_manifest = json.load(fileobj)
+    except (FileNotFoundError, json.JSONDecodeError):
+        raise RuntimeError(f'"{output_path}" is not the output of a sharded build.')
+
+    if shard_manifest.get("version") != SHARD_MANIFEST_VERSION:
+        raise RuntimeError(f'"{output_path}" was built by an incompatible version.')
+
+    shard_manifest["shard"] = Shard(*shard_manifest["shard"])
+    return shard_manifest
+
+
+def _shard_files(output_path):
+    """The files of a shard's output tree, excluding its build state.
+
+    Returns
+    -------
+    dict
+        Maps each file's path relative to ``output_path`` to its path.
+
+    """
+    state_path = manifest.state_path(output_path)
+    return {
+        str(path.relative_to(output_path)): path
+        for path in sorted(output_path.rglob("*"))
+        if path.is_file() and state_path not in path.parents
+    }
+
+
+def _same_contents(a, b):
+    return a.stat().st_size == b.stat().st_size and a.read_bytes() == b.read_bytes()
+
+
+def merge(shard_paths, output_path):
+    """Combine the outputs of a sharded build into a single site.
+
+    Files that are already up to date in the output directory are not copied
+    again, and files copied by a previous merge that are no longer part of any
+    shard are removed. The manifests
+    of the shards are combined, so that later unsharded builds into the
+    output directory are incremental.
+
+    Parameters
+    ----------
+    shard_paths : Sequence[pathlib.Path]
+        The output directories of the shards.
+    output_path : pathlib.Path
+        The directory where the site will be written.
+
+    Raises
+    ------
+    RuntimeError
+        If a shard is missing or repeated, if the shards were built from
+        different inputs, or if two shards produced different files at the
+        same path.
+
+    """
+    if output_path.resolve() in {path.resolve() for path in shard_paths}:
+        raise RuntimeError("The output directory cannot be one of the shards.")
+
+    shard_manifests = [load_shard_manifest(path) for path in shard_paths]
+
+    counts = {m["shard"].count for m in shard_manifests}
+    if len(counts) != 1:
+        raise RuntimeError(f"The shards disagree on the number of shards: {counts}.")
+
+    [count] = counts
+    indices = sorted(m["shard"].index for m in shard_manifests)
+    if indices != list(range(1, count + 1)):
+        raise RuntimeError(
+            f"Expected each of shards 1 through {count} exactly once, got {indices}."
+        )
+
+    reference = shard_manifests[0]["inputs"]
+    for path, shard_manifest in zip(shard_paths, shard_manifests):
+        differing = sorted(
+            key
+            for key in reference.keys() | shard_manifest["inputs"].keys()
+            if reference.get(key) != shard_manifest["inputs"].get(key)
+        )
+        if differing:
+            raise RuntimeError(
+                f'Shard "{path}" was built from a different {", ".join(differing)} '
+                f'than shard "{shard_paths[0]}".'
+            )
+
+    # gather the files of all shards, checking for conflicts
+    files = {}
+    for shard_path in shard_paths:
+        for relative_path, path in _shard_files(shard_path).items():
+            if relative_path in files and not _same_contents(files[relative_path], path):
+                raise RuntimeError(
+                    f'Shards disagree on the contents of "{relative_path}".'
+                )
+            files.setdefault(relative_path, path)
+
+    output_path.mkdir(parents=True, exist_ok=True)
+    for relative_path, src in files.items():
+        dst = output_path / relative_path
+        try:
+            src_stat, dst_stat = src.stat(), dst.stat()
+        except FileNotFoundError:
+            pass
+        else:
+            if (src_stat.st_size, src_stat.st_mtime_ns) == (
+                dst_stat.st_size,
+                dst_stat.st_mtime_ns,
+            ):
+                continue
+
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dst)
+
+    # remove the files of a previous merge that no longer belong to any shard;
+    # other files in the output directory are left alone
+    merged_files_path = manifest.state_path(output_path) / "merged.json"
+    try:
+        with merged_files_path.open() as fileobj:
+            previously_merged = json.load(fileobj)
+    except (FileNotFoundError, json.JSONDecodeError):
+        previously_merged = []
+
+    for relative_path in previously_merged:
+        if relative_path not in files:
+            (output_path / relative_path).unlink(missing_ok=True)
+
+    merged_files_path.parent.mkdir(exist_ok=True)
+    with merged_files_path.open("w") as fileobj:
+        json.dump(sorted(files), fileobj)
+
+    # combine the shards' manifests
+    merged = manifest.new_manifest()
+    for shard_path in shard_paths:
+        shard_manifest = manifest.load_manifest(shard_path)
+        merged["pages"].update(shard_manifest["pages"])
+        merged["published"] = shard_manifest["published"]
+        for key, value in shard_manifest["timings"].items():
+            merged["timings"].setdefault(key, value)
+    manifest.save_manifest(output_path, merged)
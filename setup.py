@@ -6,5 +6,10 @@ setup(
     version="0.2.0",
     packages=find_packages(),
     install_requires=["jinja2", "pyyaml", "markdown", "publish"],
+    extras_require={
+        "markdown-it": ["markdown-it-py"],
+        "cmark": ["cmarkgfm"],
+        "images": ["pillow"],
+    },
     entry_points={"console_scripts": ["abstract = abstract:cli"]},
 )
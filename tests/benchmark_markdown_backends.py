@@ -0,0 +1,34 @@
+"""Time each available Markdown backend on the pages of the example site.
+
+Run with ``python tests/benchmark_markdown_backends.py``. It is not collected by
+pytest, since timings say nothing about correctness; the tests that check the
+backends agree are in ``test_markdown_backends.py``.
+
+"""
+import pathlib
+import time
+
+from abstract import markdown_backends
+
+
+EXAMPLE_PAGES = sorted(
+    (pathlib.Path(__file__).parent / "../example/website/pages").glob("*.md")
+)
+
+
+def main(repeat=20):
+    contents = "\n\n".join(p.read_text() for p in EXAMPLE_PAGES) * repeat
+
+    timings = {}
+    for name in markdown_backends.available_backends():
+        backend = markdown_backends.get_backend(name)
+        start = time.perf_counter()
+        backend(contents)
+        timings[name] = time.perf_counter() - start
+
+    for name, seconds in sorted(timings.items(), key=lambda x: x[1]):
+        print(f"{name:<16} {seconds:.4f}s")
+
+
+if __name__ == "__main__":
+    main()
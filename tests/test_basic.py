@@ -1,12 +1,17 @@
+import concurrent.futures
 import pathlib
 import shutil
+import sys
 import datetime
+import json
+import pstats
+import zipfile
 import lxml.html
 from textwrap import dedent
 
 import publish
 
-from pytest import raises, fixture, mark
+from pytest import raises, fixture, importorskip, mark
 
 import abstract
 
@@ -98,6 +103,32 @@ def test_pages_have_access_to_published_artifacts(demo):
     assert "published/homeworks/01-intro/homework.pdf" in demo.get_output("one.html")
 
 
+def test_accepts_universe_published_in_the_same_process(demo):
+    # given
+    contents = dedent(
+        """
+        {{ published.collections.homeworks.publications["01-intro"].artifacts["homework.pdf"].path }}
+        """
+    )
+    demo.make_page("one.md", contents)
+    published_path = demo.use_example_published("basic_published")
+    universe = publish.deserialize((published_path / "published.json").read_text())
+    (published_path / "published.json").unlink()
+
+    # when
+    abstract.abstract(
+        demo.path, demo.builddir, published_path=published_path, universe=universe
+    )
+
+    # then
+    assert "published/homeworks/01-intro/homework.pdf" in demo.get_output("one.html")
+    # the caller's universe is left alone
+    artifact = universe.collections["homeworks"].publications["01-intro"].artifacts[
+        "homework.pdf"
+    ]
+    assert not str(artifact.path).startswith("published")
+
+
 def test_pages_have_access_to_elements(demo):
     # given
     demo.make_page("one.md", "{{ elements.announcement_box(config['announcement']) }}")
@@ -199,3 +230,803 @@ def test_context_available_in_config_file(demo):
 
     # then
     assert "Zaphod Beeblebrox" in demo.get_output("one.html")
+
+
+# render cache tests
+# --------------------------------------------------------------------------------------
+
+
+def _fixed_now():
+    return datetime.datetime(2020, 10, 1, 12, 0, 0)
+
+
+def test_render_cache_hit_skips_rendering(demo, monkeypatch):
+    # given
+    demo.make_page("one.md", "# This is a header")
+    cache_path = demo.path / "_cache"
+    abstract.abstract(demo.path, demo.builddir, cache_path=cache_path, now=_fixed_now)
+    shutil.rmtree(demo.builddir)
+
+    def _render_page(*args, **kwargs):
+        raise AssertionError("The page should not be rendered.")
+
+    monkeypatch.setattr(sys.modules["abstract.abstract"], "_render_page", _render_page)
+
+    # when
+    abstract.abstract(demo.path, demo.builddir, cache_path=cache_path, now=_fixed_now)
+
+    # then
+    assert "This is a header" in demo.get_output("one.html")
+
+
+def test_render_cache_discards_corrupted_entries(demo):
+    # given
+    demo.make_page("one.md", "# This is a header")
+    cache_path = demo.path / "_cache"
+    abstract.abstract(demo.path, demo.builddir, cache_path=cache_path, now=_fixed_now)
+    shutil.rmtree(demo.builddir)
+
+    [entry] = cache_path.glob("??/*")
+    entry.write_bytes(entry.read_bytes().replace(b"header", b"footer"))
+
+    # when
+    abstract.abstract(demo.path, demo.builddir, cache_path=cache_path, now=_fixed_now)
+
+    # then
+    assert "This is a header" in demo.get_output("one.html")
+
+
+def test_render_cache_misses_when_published_path_moves(demo):
+    # given
+    demo.make_page(
+        "one.md",
+        "{{ published.collections.default.publications.textbook"
+        ".artifacts['textbook.pdf'].path }}",
+    )
+    cache_path = demo.path / "_cache"
+    published_path = demo.use_example_published("basic_published")
+    abstract.abstract(
+        demo.path, demo.builddir, published_path, cache_path=cache_path, now=_fixed_now
+    )
+
+    moved_path = demo.builddir / "mirror" / "published"
+    shutil.copytree(published_path, moved_path)
+
+    # when
+    abstract.abstract(
+        demo.path, demo.builddir, moved_path, cache_path=cache_path, now=_fixed_now
+    )
+
+    # then
+    expected = "mirror/published/default/textbook/textbook.pdf"
+    assert expected in demo.get_output("one.html")
+
+
+# incremental build and plan tests
+# --------------------------------------------------------------------------------------
+
+
+def test_rebuild_removes_outputs_of_deleted_pages(demo):
+    # given
+    demo.make_page("one.md", "one")
+    demo.make_page("two.md", "two")
+    abstract.abstract(demo.path, demo.builddir)
+    (demo.path / "pages" / "two.md").unlink()
+
+    # when
+    abstract.abstract(demo.path, demo.builddir)
+
+    # then
+    assert (demo.builddir / "one.html").exists()
+    assert not (demo.builddir / "two.html").exists()
+
+
+def test_plan_does_not_write_output(demo):
+    # given
+    demo.make_page("one.md", "one")
+    (demo.path / "static" / "logo.svg").write_text("<svg></svg>")
+
+    # when
+    plan = abstract.plan(demo.path, demo.builddir)
+
+    # then
+    assert [(p.path, p.action) for p in plan.pages] == [("one.html", "render")]
+    assert "static/logo.svg" in plan.static
+    assert not demo.builddir.exists()
+
+
+def test_plan_reports_unchanged_and_deleted_pages(demo):
+    # given
+    demo.make_page("one.md", "one")
+    demo.make_page("two.md", "two")
+    cache_path = demo.path / "_cache"
+    abstract.abstract(demo.path, demo.builddir, cache_path=cache_path, now=_fixed_now)
+    (demo.path / "pages" / "two.md").unlink()
+
+    # when
+    plan = abstract.plan(demo.path, demo.builddir, cache_path=cache_path, now=_fixed_now)
+
+    # then
+    assert [(p.path, p.action) for p in plan.pages] == [("one.html", "unchanged")]
+    assert plan.deleted == ["two.html"]
+    assert plan.has_timings
+
+
+def test_rebuild_only_renders_pages_reading_changed_publications(demo, monkeypatch):
+    # given
+    demo.make_page(
+        "textbook.md",
+        "{{ published.collections['default'].publications['textbook'].metadata.name }}",
+    )
+    demo.make_page(
+        "homeworks.md", "{{ published.collections['homeworks'].publications | length }}"
+    )
+    published_path = demo.use_example_published("basic_published")
+    abstract.abstract(demo.path, demo.builddir, published_path, now=_fixed_now)
+
+    published_json = published_path / "published.json"
+    published_json.write_text(
+        published_json.read_text().replace('"Textbook"', '"The Textbook"')
+    )
+
+    module = sys.modules["abstract.abstract"]
+    rendered = []
+    render_page = module._render_page
+
+    def _tracking_render_page(path, *args):
+        rendered.append(path.name)
+        return render_page(path, *args)
+
+    monkeypatch.setattr(module, "_render_page", _tracking_render_page)
+
+    # when
+    abstract.abstract(demo.path, demo.builddir, published_path, now=_fixed_now)
+
+    # then
+    assert rendered == ["textbook.md"]
+    assert "The Textbook" in demo.get_output("textbook.html")
+
+
+def _build_shards(demo, count):
+    shard_paths = []
+    for index in range(1, count + 1):
+        shard_path = demo.path / f"_shard{index}"
+        abstract.abstract(
+            demo.path,
+            shard_path,
+            now=_fixed_now,
+            shard=abstract.sharding.Shard(index, count),
+        )
+        shard_paths.append(shard_path)
+    return shard_paths
+
+
+def test_merged_shards_match_unsharded_build(demo):
+    # given
+    for i in range(10):
+        demo.make_page(f"page{i}.md", f"page {i}")
+    (demo.path / "static" / "logo.svg").write_text("<svg></svg>")
+    shard_paths = _build_shards(demo, 3)
+
+    # when
+    abstract.sharding.merge(shard_paths, demo.builddir)
+
+    # then
+    for i in range(10):
+        assert f"page {i}" in demo.get_output(f"page{i}.html")
+    assert (demo.builddir / "static" / "logo.svg").exists()
+    assert sum(len(list(p.glob("*.html"))) for p in shard_paths) == 10
+
+
+def test_merge_rejects_shards_built_from_different_config(demo):
+    # given
+    demo.make_page("one.md", "one")
+    [first, second] = _build_shards(demo, 2)
+    demo.add_to_config("extra: 1\n")
+    abstract.abstract(
+        demo.path, second, now=_fixed_now, shard=abstract.sharding.Shard(2, 2)
+    )
+
+    # when / then
+    with raises(RuntimeError, match="config"):
+        abstract.sharding.merge([first, second], demo.builddir)
+
+
+@mark.parametrize(
+    "option, differing",
+    [
+        ({"context": {"term": "spring"}}, "context"),
+        ({"now": lambda: datetime.datetime(2020, 10, 2, 12, 0, 0)}, "time"),
+    ],
+)
+def test_merge_rejects_shards_built_with_different_context_or_time(
+    demo, option, differing
+):
+    # given
+    demo.make_page("one.md", "one")
+    [first, second] = _build_shards(demo, 2)
+    abstract.abstract(
+        demo.path,
+        second,
+        **{"now": _fixed_now, **option},
+        shard=abstract.sharding.Shard(2, 2),
+    )
+
+    # when / then
+    with raises(RuntimeError, match=differing):
+        abstract.sharding.merge([first, second], demo.builddir)
+
+
+def test_build_writes_prometheus_metrics(demo):
+    # given
+    demo.make_page("one.md", "one")
+    demo.make_page("two.md", "two")
+    metrics_path = demo.path / "abstract.prom"
+    abstract.abstract(demo.path, demo.builddir, now=_fixed_now)
+    demo.make_page("two.md", "two, changed")
+
+    # when
+    abstract.abstract(
+        demo.path, demo.builddir, now=_fixed_now, metrics_path=metrics_path
+    )
+
+    # then
+    samples = dict(
+        line.rsplit(" ", 1)
+        for line in metrics_path.read_text().splitlines()
+        if not line.startswith("#")
+    )
+    assert float(samples["abstract_pages_rendered"]) == 1
+    assert float(samples["abstract_pages_skipped"]) == 1
+    assert float(samples["abstract_outputs_written"]) == 1
+    assert 'abstract_build_phase_duration_seconds{phase="render"}' in samples
+    assert float(samples["abstract_build_now_timestamp_seconds"]) == (
+        _fixed_now().timestamp()
+    )
+
+
+def test_memory_profile_reports_phases_and_elements(demo):
+    # given
+    _make_homework_listing(demo, "page_size: 1")
+    report_path = demo.path / "memory.json"
+
+    # when
+    abstract.abstract(
+        demo.path,
+        demo.builddir,
+        demo.builddir / "published",
+        memory_profile_path=report_path,
+    )
+
+    # then
+    report = json.loads(report_path.read_text())
+    assert [p["name"] for p in report["phases"]][:2] == ["load", "render"]
+    assert all(p["peak_bytes"] > 0 for p in report["phases"])
+    assert report["elements"]["listing"]["calls"] == 1
+
+
+# site tests
+# --------------------------------------------------------------------------------------
+
+
+def test_site_renders_page_without_writing(demo):
+    # given
+    demo.make_page("one.md", "# This is a header")
+    site = abstract.Site(demo.path, demo.builddir)
+
+    # when
+    outputs = site.render_page("one.md")
+
+    # then
+    assert "This is a header" in outputs["one.html"]
+    assert not (demo.builddir / "one.html").exists()
+
+
+def test_site_reload_config_is_seen_by_later_renders(demo):
+    # given
+    demo.make_page("one.md", "{{ config['greeting'] }}")
+    demo.add_to_config("greeting: hello\n")
+    site = abstract.Site(demo.path, demo.builddir)
+    before = site.render_page("one.md")["one.html"]
+
+    # when
+    (demo.path / "config.yaml").write_text(
+        (demo.path / "config.yaml").read_text().replace("hello", "goodbye")
+    )
+    site.reload_config()
+
+    # then
+    assert "hello" in before
+    assert "goodbye" in site.render_page("one.md")["one.html"]
+
+
+def test_site_renders_pages_from_several_threads(demo):
+    # given
+    for i in range(8):
+        demo.make_page(f"page{i}.md", f"# Page {i}")
+    site = abstract.Site(demo.path, demo.builddir)
+
+    # when
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        results = list(
+            executor.map(lambda i: site.render_page(f"page{i}.md"), range(8))
+        )
+
+    # then
+    for i, outputs in enumerate(results):
+        assert f"Page {i}" in outputs[f"page{i}.html"]
+
+
+# output backend tests
+# --------------------------------------------------------------------------------------
+
+
+def test_memory_output_holds_site_without_writing(demo):
+    # given
+    demo.make_page("one.md", "# This is a header")
+    (demo.path / "static" / "logo.txt").write_text("logo")
+    output = abstract.output.MemoryOutput()
+
+    # when
+    abstract.abstract(demo.path, demo.builddir, output_backend=output)
+
+    # then
+    assert b"This is a header" in output["one.html"]
+    assert output["static/logo.txt"] == b"logo"
+    assert output.source("static/logo.txt") == demo.path / "static" / "logo.txt"
+    assert not (demo.builddir / "one.html").exists()
+
+
+def test_memory_output_leaves_output_path_untouched(demo):
+    # given
+    demo.make_page("one.md", "{{ published.collections.homeworks.publications }}")
+    published_path = demo.use_example_published("basic_published")
+    before = sorted(demo.builddir.rglob("*"))
+
+    # when
+    abstract.abstract(
+        demo.path,
+        demo.builddir,
+        published_path=published_path,
+        output_backend=abstract.output.MemoryOutput(),
+    )
+
+    # then
+    assert sorted(demo.builddir.rglob("*")) == before
+
+
+def test_archive_output_streams_site_into_zip(demo, tmp_path):
+    # given
+    demo.make_page("one.md", "# This is a header")
+    (demo.path / "static" / "logo.txt").write_text("logo")
+    archive_path = tmp_path / "site.zip"
+
+    # when
+    output = abstract.output.ArchiveOutput(archive_path)
+    abstract.abstract(demo.path, demo.builddir, output_backend=output)
+
+    # then
+    with zipfile.ZipFile(archive_path) as archive:
+        assert b"This is a header" in archive.read("one.html")
+        assert archive.read("static/logo.txt") == b"logo"
+
+
+# fragment cache tests
+# --------------------------------------------------------------------------------------
+
+
+class _Counter:
+    def __init__(self):
+        self.n = 0
+
+    def tick(self):
+        self.n += 1
+        return self.n
+
+
+def test_cached_fragment_is_rendered_once(demo, tmp_path):
+    # given
+    counter = _Counter()
+    demo.make_page(
+        "one.md",
+        '{% cache "heavy", config.term %}{{ context.counter.tick() }}{% endcache %}',
+    )
+    demo.add_to_config("term: fall\n")
+    site = abstract.Site(
+        demo.path,
+        demo.builddir,
+        context={"counter": counter},
+        fragment_cache_path=tmp_path / "fragments",
+    )
+
+    # when
+    first = site.render_page("one.md")["one.html"]
+    second = site.render_page("one.md")["one.html"]
+
+    # then
+    assert counter.n == 1
+    assert first == second
+
+
+def test_cached_fragment_is_rendered_again_in_new_now_bucket(demo, tmp_path):
+    # given
+    counter = _Counter()
+    now = datetime.datetime(2021, 1, 1)
+    demo.make_page(
+        "one.md",
+        '{% cache "heavy", now_bucket=3600 %}'
+        "{{ context.counter.tick() }}"
+        "{% endcache %}",
+    )
+    site = abstract.Site(
+        demo.path,
+        demo.builddir,
+        context={"counter": counter},
+        now=lambda: now,
+        fragment_cache_path=tmp_path / "fragments",
+    )
+
+    # when
+    site.render_page("one.md")
+    site.render_page("one.md")
+    now += datetime.timedelta(hours=1)
+    site.render_page("one.md")
+
+    # then
+    assert counter.n == 2
+
+
+def test_cached_fragment_is_rendered_again_when_publication_read_changes(demo):
+    # given
+    demo.make_page(
+        "textbook.md",
+        "{% cache 'textbook' %}"
+        "{{ published.collections['default'].publications['textbook'].metadata.name }}"
+        "{% endcache %}",
+    )
+    published_path = demo.use_example_published("basic_published")
+    cache_path = demo.path / "_cache"
+    abstract.abstract(
+        demo.path, demo.builddir, published_path, now=_fixed_now, cache_path=cache_path
+    )
+
+    published_json = published_path / "published.json"
+    published_json.write_text(
+        published_json.read_text().replace('"Textbook"', '"The Textbook"')
+    )
+
+    # when
+    abstract.abstract(
+        demo.path, demo.builddir, published_path, now=_fixed_now, cache_path=cache_path
+    )
+
+    # then
+    assert "The Textbook" in demo.get_output("textbook.html")
+
+
+# listing tests
+# --------------------------------------------------------------------------------------
+
+
+def _make_homework_listing(demo, option):
+    demo.add_to_config(
+        f"""
+        listing:
+            collection: homeworks
+            {option}
+            columns:
+                - heading: Name
+                  cell_content: "${{ publication.metadata.name }}"
+        """
+    )
+    demo.make_page("one.md", "{{ elements.listing(config['listing']) }}")
+    demo.use_example_published("basic_published")
+
+
+def test_listing_writes_additional_pages_when_paginated(demo):
+    # given
+    _make_homework_listing(demo, "page_size: 1")
+
+    # when
+    abstract.abstract(
+        demo.path, demo.builddir, published_path=demo.builddir / "published"
+    )
+
+    # then
+    assert "1. Homework 01" in demo.get_output("one.html")
+    assert "Homework 02" not in demo.get_output("one.html")
+    assert 'href="one-homeworks-page-2.html"' in demo.get_output("one.html")
+    assert "2. Homework 02" in demo.get_output("one-homeworks-page-2.html")
+    assert "<html>" in demo.get_output("one-homeworks-page-2.html")
+
+
+def test_listing_writes_rows_to_data_file(demo):
+    # given
+    _make_homework_listing(demo, "data_file: true")
+
+    # when
+    abstract.abstract(
+        demo.path, demo.builddir, published_path=demo.builddir / "published"
+    )
+
+    # then
+    assert "Homework 01" not in demo.get_output("one.html")
+    assert 'data-src="one-homeworks.json"' in demo.get_output("one.html")
+    data = json.loads(demo.get_output("one-homeworks.json"))
+    assert data["rows"] == [["Homework 01"], ["Homework 02"]]
+
+
+def test_listings_of_the_same_collection_need_distinct_names(demo):
+    # given
+    _make_homework_listing(demo, "page_size: 1")
+    demo.make_page(
+        "one.md",
+        "{{ elements.listing(config['listing']) }}\n"
+        "{{ elements.listing(dict(config['listing'], name='again')) }}",
+    )
+    demo.make_page("two.md", "{{ elements.listing(config['listing']) }}\n" * 2)
+
+    # when
+    with raises(RuntimeError) as excinfo:
+        abstract.abstract(
+            demo.path, demo.builddir, published_path=demo.builddir / "published"
+        )
+
+    # then
+    assert "two-homeworks-page-2.html" in str(excinfo.value)
+
+
+# search index tests
+# --------------------------------------------------------------------------------------
+
+
+def test_search_index_contains_page_terms(demo):
+    # given
+    demo.make_page("one.md", "# The Bootstrap\nResampling with replacement.")
+
+    # when
+    abstract.abstract(demo.path, demo.builddir, search_index=True)
+
+    # then
+    docs = json.loads(demo.get_output("search/docs.json"))
+    shard = json.loads(demo.get_output("search/index/bo.json"))
+    [[doc_id, count]] = shard["bootstrap"]
+    assert docs[str(doc_id)] == ["one.html", "The Bootstrap"]
+    assert (demo.builddir / "search" / "search.js").exists()
+
+
+def test_search_index_only_reprocesses_changed_pages(demo, monkeypatch):
+    # given
+    demo.make_page("one.md", "# One\nbootstrap")
+    demo.make_page("two.md", "# Two\nreading regression")
+    abstract.abstract(demo.path, demo.builddir, search_index=True)
+    demo.make_page("two.md", "# Two\nreading correlation")
+
+    processed = []
+    original = abstract.search._page_document
+
+    def _page_document(output_path, relative_path):
+        processed.append(relative_path)
+        return original(output_path, relative_path)
+
+    monkeypatch.setattr(abstract.search, "_page_document", _page_document)
+
+    # when
+    abstract.abstract(demo.path, demo.builddir, search_index=True)
+
+    # then
+    assert processed == ["two.html"]
+    assert "regression" not in json.loads(demo.get_output("search/index/re.json"))
+    assert "correlation" in json.loads(demo.get_output("search/index/co.json"))
+
+
+# link checking tests
+# --------------------------------------------------------------------------------------
+
+
+def test_check_links_fails_on_links_to_toc_anchors_that_do_not_exist(demo):
+    # given
+    demo.make_page("one.md", "# Resampling\n[ok](two.html#the-bootstrap)")
+    demo.make_page("two.md", "# Two\n## The Bootstrap\n[bad](one.html#bootstrap)")
+
+    # when
+    with raises(abstract.BrokenLinksError) as excinfo:
+        abstract.abstract(demo.path, demo.builddir, check_links=True)
+
+    # then
+    [link] = excinfo.value.broken
+    assert (link.page, link.url) == ("two.html", "one.html#bootstrap")
+    assert (demo.builddir / "two.html").exists()
+
+
+# cache headers tests
+# --------------------------------------------------------------------------------------
+
+
+def test_cache_headers_give_each_output_an_etag_and_policy(demo):
+    # given
+    demo.make_page("index.md", "{% cache 'greeting', ttl=60 %}hello{% endcache %}")
+    demo.make_page("about.md", "about")
+
+    # when
+    abstract.abstract(
+        demo.path,
+        demo.builddir,
+        now=_fixed_now,
+        cache_path=demo.path / "_cache",
+        cache_headers=True,
+    )
+
+    # then
+    files = abstract.deploy.load_file_manifest(demo.builddir / ".abstract/files.json")
+    lines = demo.get_output("_headers").splitlines()
+    about = lines.index("/about.html")
+    assert lines[about + 1] == f'  ETag: "{files["about.html"]["hash"][:32]}"'
+    assert lines[about + 2] == "  Cache-Control: public, no-cache"
+    root = lines.index("/")
+    assert lines[root + 2] == "  Cache-Control: public, max-age=43200, must-revalidate"
+    assert "_headers" in files
+
+
+def test_cpu_profile_names_template_macros(demo):
+    # given
+    (demo.path / "theme" / "elements" / "announcement_box.html").write_text(
+        dedent(
+            """\
+            {% macro shout(text) %}
+            {{ text ~ "!" }}
+            {% endmacro %}
+            {% for i in range(20000) %}{{ shout(element_config['contents']) }}{% endfor %}
+            """
+        )
+    )
+    demo.make_page("one.md", "{{ elements.announcement_box({'contents': 'hi'}) }}")
+    demo.make_page("two.md", "not profiled")
+    profile_path = demo.path / "profile"
+
+    # when
+    abstract.abstract(
+        demo.path,
+        demo.builddir,
+        cpu_profile_path=profile_path,
+        cpu_profile_element="announcement_box",
+    )
+
+    # then
+    folded = (profile_path / "profile.folded").read_text()
+    assert "announcement_box.html:shout" in folded
+    assert all(line.startswith("phase:render;") for line in folded.splitlines())
+    stats = pstats.Stats(str(profile_path / "profile.pstats"))
+    assert ("announcement_box.html", 1, "shout") in stats.stats
+
+
+def _make_image(path, size):
+    Image = importorskip("PIL.Image")
+    Image.new("RGB", size, (200, 30, 30)).save(path)
+
+
+def test_images_get_resized_derivatives_and_srcset(demo, monkeypatch):
+    # given
+    Image = importorskip("PIL.Image")
+    _make_image(demo.path / "static" / "figure.png", (40, 20))
+    demo.add_to_config(
+        """
+        images:
+            widths: [10, 80]
+            webp: false
+        """
+    )
+    demo.make_page("index.md", '{{ images["static/figure.png"].srcset }}')
+
+    # when
+    abstract.abstract(demo.path, demo.builddir)
+
+    # then
+    with Image.open(demo.builddir / "static" / "figure-10w.png") as image:
+        assert image.size == (10, 5)
+    assert not (demo.builddir / "static" / "figure-80w.png").exists()
+    assert (
+        "static/figure-10w.png 10w, static/figure.png 40w"
+        in demo.get_output("index.html")
+    )
+
+    # unchanged images are not encoded again, even if their derivatives are lost
+    (demo.builddir / "static" / "figure-10w.png").unlink()
+    monkeypatch.setattr(abstract.images, "_encode", None)
+    abstract.abstract(demo.path, demo.builddir)
+    assert (demo.builddir / "static" / "figure-10w.png").exists()
+
+
+def test_changed_image_is_encoded_again(demo):
+    # given
+    Image = importorskip("PIL.Image")
+    _make_image(demo.path / "static" / "figure.jpg", (40, 20))
+    demo.add_to_config(
+        """
+        images:
+            widths: [10, 20]
+            webp: false
+        """
+    )
+    abstract.abstract(demo.path, demo.builddir)
+
+    # when
+    _make_image(demo.path / "static" / "figure.jpg", (80, 40))
+    abstract.abstract(demo.path, demo.builddir)
+
+    # then
+    with Image.open(demo.builddir / "static" / "figure-20w.jpg") as image:
+        assert image.size == (20, 10)
+    # the derivatives of the old image are removed from the cache
+    assert len(list((demo.builddir / ".abstract" / "images").glob("??/*"))) == 2
+
+
+# generations
+# --------------------------------------------------------------------------------------
+
+
+def test_generations_share_unchanged_files_and_switch_only_on_success(demo):
+    # given
+    (demo.path / "static" / "logo.txt").write_text("logo")
+    demo.make_page("index.md", "one")
+    current = demo.builddir / "current"
+
+    def build():
+        abstract.abstract(demo.path, demo.builddir, keep_generations=2)
+
+    build()
+    first = current.resolve()
+
+    # when
+    demo.make_page("index.md", "two")
+    build()
+
+    # then
+    second = current.resolve()
+    assert "one" in (first / "index.html").read_text()
+    assert "two" in (current / "index.html").read_text()
+    assert (first / "static" / "logo.txt").stat().st_ino == (
+        second / "static" / "logo.txt"
+    ).stat().st_ino
+
+    # a failed build is discarded
+    demo.make_page("index.md", "{{ unknown }}")
+    with raises(abstract.PageError):
+        build()
+    assert current.resolve() == second
+    assert sorted(p.name for p in demo.builddir.iterdir()) == [
+        "current",
+        "generation-000001",
+        "generation-000002",
+    ]
+
+    # the previous generation is kept for rollback
+    abstract.generations.rollback(demo.builddir)
+    assert current.resolve() == first
+
+
+def test_generations_link_to_their_own_copy_of_published_artifacts(demo):
+    # given
+    homework = 'publications["01-intro"].artifacts["homework.pdf"].path'
+    demo.make_page("one.md", f"{{{{ published.collections.homeworks.{homework} }}}}")
+    published_path = demo.use_example_published("basic_published")
+
+    # when
+    for _ in range(3):
+        abstract.abstract(
+            demo.path,
+            demo.builddir,
+            published_path=published_path,
+            keep_generations=2,
+        )
+
+    # then
+    assert sorted(p.name for p in demo.builddir.iterdir()) == [
+        "current",
+        "generation-000002",
+        "generation-000003",
+        "published",
+    ]
+    path = "published/homeworks/01-intro/homework.pdf"
+    assert path in demo.get_output("current/one.html")
+    assert (demo.builddir / "current" / path).exists()
@@ -0,0 +1,63 @@
+import concurrent.futures
+import os
+import pathlib
+
+from pytest import fixture
+
+from abstract.cache import RenderCache
+
+
+@fixture
+def cache_path(tmpdir):
+    return pathlib.Path(tmpdir) / "cache"
+
+
+def test_prune_evicts_least_recently_used_entries(cache_path):
+    # given
+    cache = RenderCache(cache_path, max_size=3 * 100)
+    for i, key in enumerate(["aa01", "bb02", "cc03"]):
+        cache.put(key, "x" * 100)
+        entry = cache_path / key[:2] / key[2:]
+        os.utime(entry, (i, i))
+
+    # when
+    cache.put("dd04", "x" * 100)
+    cache.prune()
+
+    # then
+    assert cache.get("aa01") is None
+    assert cache.get("bb02") is None
+    assert cache.get("dd04") is not None
+
+
+def test_get_falls_back_to_mirror(cache_path, tmpdir):
+    # given
+    mirror_path = pathlib.Path(tmpdir) / "mirror"
+    RenderCache(mirror_path).put("aa01", "<p>cached</p>")
+    cache = RenderCache(cache_path, mirror_path=mirror_path)
+
+    # when
+    html = cache.get("aa01")
+
+    # then
+    assert html == "<p>cached</p>"
+    assert (cache_path / "aa" / "01").exists()
+
+
+def test_counts_are_exact_when_shared_by_threads(cache_path):
+    # given
+    cache = RenderCache(cache_path)
+    cache.put("aa01", "x")
+
+    def lookup(_):
+        for _ in range(200):
+            cache.get("aa01")
+            cache.get("bb02")
+
+    # when
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        list(executor.map(lookup, range(8)))
+
+    # then
+    assert cache.take_counts() == (8 * 200, 8 * 200)
+    assert cache.take_counts() == (0, 0)
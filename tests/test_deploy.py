@@ -0,0 +1,63 @@
+import io
+import json
+import shutil
+import tarfile
+
+from pytest import raises
+
+from abstract import deploy
+
+
+def _tree(path):
+    return {
+        p.relative_to(path).as_posix(): p.read_bytes()
+        for p in path.rglob("*")
+        if p.is_file() and ".abstract" not in p.parts
+    }
+
+
+def test_delta_brings_deployed_copy_up_to_date(tmp_path):
+    # given
+    output = tmp_path / "_build"
+    (output / "static").mkdir(parents=True)
+    (output / "one.html").write_text("one")
+    (output / "two.html").write_text("two")
+    (output / "static" / "logo.txt").write_text("logo")
+    deploy.update_file_manifest(output)
+
+    deployed = tmp_path / "deployed"
+    shutil.copytree(output, deployed)
+    shutil.copy(output / ".abstract" / "files.json", tmp_path / "deployed.json")
+
+    (output / "one.html").write_text("one, changed")
+    (output / "two.html").unlink()
+    (output / "three.html").write_text("three")
+
+    # when
+    delta = deploy.write_delta(
+        tmp_path / "deployed.json", output, tmp_path / "delta.tar.gz"
+    )
+    deploy.apply_delta(tmp_path / "delta.tar.gz", deployed)
+
+    # then
+    assert delta == deploy.Delta(["one.html", "three.html"], ["two.html"])
+    assert _tree(deployed) == _tree(output)
+    with tarfile.open(tmp_path / "delta.tar.gz") as archive:
+        assert "static/logo.txt" not in archive.getnames()
+
+
+def test_apply_rejects_paths_outside_the_site(tmp_path):
+    # given
+    description = json.dumps(
+        {"version": deploy.FILE_MANIFEST_VERSION, "changed": {}, "deleted": ["../x"]}
+    ).encode()
+    with tarfile.open(tmp_path / "delta.tar.gz", "w:gz") as archive:
+        info = tarfile.TarInfo(deploy.DELTA_MEMBER)
+        info.size = len(description)
+        archive.addfile(info, io.BytesIO(description))
+    (tmp_path / "x").write_text("keep me")
+
+    # when / then
+    with raises(RuntimeError):
+        deploy.apply_delta(tmp_path / "delta.tar.gz", tmp_path / "site")
+    assert (tmp_path / "x").exists()
@@ -58,6 +58,20 @@ def clean_build(builddir):
                 f.unlink()
 
 
+def build_index(path, now):
+    """Build the example class's website in memory, returning its index page."""
+    output = abstract.output.MemoryOutput()
+    abstract.abstract(
+        path / "website/",
+        path / "website/_build",
+        path / "website/_build/published",
+        context={"course": {"name": "DSC 10"}},
+        now=lambda: now,
+        output_backend=output,
+    )
+    return output["index.html"].decode()
+
+
 @fixture(scope="module")
 def publish_on_oct_16(tmp_path_factory):
     tempdir = tmp_path_factory.mktemp("example_16th")
@@ -91,21 +105,11 @@ def test_fixture(publish_on_oct_15):
 
 def test_second_homework_visible(publish_on_oct_15):
     # when
-    path = publish_on_oct_15
-    clean_build(path / "website" / "_build")
-    abstract.abstract(
-        path / "website/",
-        path / "website/_build",
-        path / "website/_build/published",
-        context={"course": {"name": "DSC 10"}},
-        now=lambda: datetime.datetime(2020, 10, 15, 12, 0, 0),
+    contents = build_index(
+        publish_on_oct_15, datetime.datetime(2020, 10, 15, 12, 0, 0)
     )
 
     # then
-    out = path / "website" / "_build" / "index.html"
-    with out.open() as fileobj:
-        contents = fileobj.read()
-
     etree = lxml.html.fromstring(contents)
 
     # select the div containing all homework links
@@ -123,21 +127,11 @@ def test_second_homework_visible(publish_on_oct_15):
 
 def test_third_homework_visible_on_16th(publish_on_oct_16):
     # when
-    path = publish_on_oct_16
-    clean_build(path / "website" / "_build")
-    abstract.abstract(
-        path / "website/",
-        path / "website/_build",
-        path / "website/_build/published",
-        context={"course": {"name": "DSC 10"}},
-        now=lambda: datetime.datetime(2020, 10, 16, 12, 0, 0),
+    contents = build_index(
+        publish_on_oct_16, datetime.datetime(2020, 10, 16, 12, 0, 0)
     )
 
     # then
-    out = path / "website" / "_build" / "index.html"
-    with out.open() as fileobj:
-        contents = fileobj.read()
-
     etree = lxml.html.fromstring(contents)
 
     # select the div containing all homework links
@@ -155,21 +149,11 @@ def test_third_homework_visible_on_16th(publish_on_oct_16):
 
 def test_third_homework_solutions_not_posted_on_16th(publish_on_oct_16):
     # when
-    path = publish_on_oct_16
-    clean_build(path / "website" / "_build")
-    abstract.abstract(
-        path / "website/",
-        path / "website/_build",
-        path / "website/_build/published",
-        context={"course": {"name": "DSC 10"}},
-        now=lambda: datetime.datetime(2020, 10, 16, 12, 0, 0),
+    contents = build_index(
+        publish_on_oct_16, datetime.datetime(2020, 10, 16, 12, 0, 0)
     )
 
     # then
-    out = path / "website" / "_build" / "index.html"
-    with out.open() as fileobj:
-        contents = fileobj.read()
-
     etree = lxml.html.fromstring(contents)
 
     # select the div containing all homework links
@@ -183,21 +167,11 @@ def test_third_homework_solutions_not_posted_on_16th(publish_on_oct_16):
 
 def test_homework_2_solutions_posted_on_16th(publish_on_oct_16):
     # when
-    path = publish_on_oct_16
-    clean_build(path / "website" / "_build")
-    abstract.abstract(
-        path / "website/",
-        path / "website/_build",
-        path / "website/_build/published",
-        context={"course": {"name": "DSC 10"}},
-        now=lambda: datetime.datetime(2020, 10, 16, 12, 0, 0),
+    contents = build_index(
+        publish_on_oct_16, datetime.datetime(2020, 10, 16, 12, 0, 0)
     )
 
     # then
-    out = path / "website" / "_build" / "index.html"
-    with out.open() as fileobj:
-        contents = fileobj.read()
-
     etree = lxml.html.fromstring(contents)
 
     # select the div containing all homework links
@@ -211,41 +185,21 @@ def test_homework_2_solutions_posted_on_16th(publish_on_oct_16):
 
 def test_homework_2_solutions_not_posted_on_15th(publish_on_oct_16):
     # when
-    path = publish_on_oct_16
-    clean_build(path / "website" / "_build")
-    abstract.abstract(
-        path / "website/",
-        path / "website/_build",
-        path / "website/_build/published",
-        context={"course": {"name": "DSC 10"}},
-        now=lambda: datetime.datetime(2020, 10, 16, 12, 0, 0),
+    contents = build_index(
+        publish_on_oct_16, datetime.datetime(2020, 10, 16, 12, 0, 0)
     )
 
     # then
-    out = path / "website" / "_build" / "index.html"
-    with out.open() as fileobj:
-        contents = fileobj.read()
-
     assert "published/homeworks/02-tables/solution.txt" in contents
 
 
 def test_artifact_text_if_missing(publish_on_oct_16):
     # when
-    path = publish_on_oct_16
-    clean_build(path / "website" / "_build")
-    abstract.abstract(
-        path / "website/",
-        path / "website/_build",
-        path / "website/_build/published",
-        context={"course": {"name": "DSC 10"}},
-        now=lambda: datetime.datetime(2020, 10, 16, 12, 0, 0),
+    contents = build_index(
+        publish_on_oct_16, datetime.datetime(2020, 10, 16, 12, 0, 0)
     )
 
     # then
-    out = path / "website" / "_build" / "index.html"
-    with out.open() as fileobj:
-        contents = fileobj.read()
-
     etree = lxml.html.fromstring(contents)
 
     # select the div containing all homework links
@@ -258,21 +212,11 @@ def test_artifact_text_if_missing(publish_on_oct_16):
 
 def test_requires_metadata(publish_on_oct_16):
     # when
-    path = publish_on_oct_16
-    clean_build(path / "website" / "_build")
-    abstract.abstract(
-        path / "website/",
-        path / "website/_build",
-        path / "website/_build/published",
-        context={"course": {"name": "DSC 10"}},
-        now=lambda: datetime.datetime(2020, 10, 16, 12, 0, 0),
+    contents = build_index(
+        publish_on_oct_16, datetime.datetime(2020, 10, 16, 12, 0, 0)
     )
 
     # then
-    out = path / "website" / "_build" / "index.html"
-    with out.open() as fileobj:
-        contents = fileobj.read()
-
     etree = lxml.html.fromstring(contents)
 
     div2 = etree.xpath('//div[ h3[ contains(text(), "Discussion 2") ] ]')[0]
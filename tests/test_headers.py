@@ -0,0 +1,65 @@
+import datetime
+
+import publish
+
+from abstract import headers
+
+
+NOW = datetime.datetime(2020, 10, 1, 12, 0, 0)
+
+
+def _files(*paths):
+    return {path: {"hash": "ab" * 32, "size": 0, "mtime_ns": 0} for path in paths}
+
+
+def _universe(due):
+    publication = publish.Publication(metadata={"due": due}, artifacts={})
+    collection = publish.Collection(schema=None, publications={"01": publication})
+    return publish.Universe(collections={"homeworks": collection})
+
+
+def test_time_dependent_pages_are_cached_until_their_next_change():
+    # given
+    files = _files("schedule.html", "about.html")
+    pages = {
+        "schedule.html": {
+            "outputs": {"schedule.html": "x"},
+            "reads": [["homeworks", "*"]],
+            "used_now": True,
+        },
+        "about.html": {"outputs": {"about.html": "x"}, "reads": [], "used_now": False},
+    }
+    published = _universe(datetime.datetime(2020, 10, 1, 23, 0, 0))
+
+    # when
+    policies = headers.cache_policies(files, pages, published, {}, NOW)
+
+    # then
+    assert policies["schedule.html"] == "public, max-age=39600, must-revalidate"
+    assert policies["about.html"] == headers.REVALIDATE
+
+
+def test_time_dependent_pages_expire_at_midnight_at_the_latest():
+    # when
+    change = headers.next_change(NOW, [datetime.datetime(2020, 10, 5)])
+
+    # then
+    assert change == datetime.datetime(2020, 10, 2)
+
+
+def test_fingerprinted_assets_are_immutable_unless_overridden():
+    # given
+    files = _files("static/app.3f2a9c1b.css", "static/logo.png", "old/week1.html")
+    config = {
+        "cache_headers": [{"path": "old/*", "cache_control": "public, max-age=60"}]
+    }
+
+    # when
+    policies = headers.cache_policies(files, {}, None, config, NOW)
+
+    # then
+    assert policies == {
+        "static/app.3f2a9c1b.css": headers.IMMUTABLE,
+        "static/logo.png": headers.REVALIDATE,
+        "old/week1.html": "public, max-age=60",
+    }
@@ -0,0 +1,97 @@
+import jinja2
+from pytest import mark
+
+from abstract import layout
+
+
+def _environment(templates):
+    return jinja2.Environment(
+        loader=jinja2.DictLoader(templates), undefined=jinja2.StrictUndefined
+    )
+
+
+BASE = """<html><title>{{ config.title }}</title>
+<nav>{% block nav %}{% endblock %}</nav>
+{% block body %}{% endblock %}
+</html>"""
+
+
+def _expected(environment, body, path, config):
+    return environment.get_template("page.html").render(
+        body=body, config=config, path=path
+    )
+
+
+def test_layout_is_split_and_matches_full_render():
+    # given
+    environment = _environment(
+        {
+            "base.html": BASE,
+            "page.html": '{% extends "base.html" %}'
+            "{% block body %}<main>{{ body }}</main>{% endblock %}",
+        }
+    )
+    config = {"title": "Course"}
+
+    # when
+    base_layout = layout.BaseLayout(environment, config)
+
+    # then
+    assert base_layout.is_split
+    assert base_layout.render("<p>hi</p>", "one.html") == _expected(
+        environment, "<p>hi</p>", "one.html", config
+    )
+
+
+def test_blocks_using_the_path_are_rendered_for_each_page():
+    # given
+    environment = _environment(
+        {
+            "base.html": BASE,
+            "page.html": '{% extends "base.html" %}'
+            "{% block nav %}"
+            "{% for item in config.nav %}"
+            "<a{% if item == path %} class='active'{% endif %}>{{ item }}</a>"
+            "{% endfor %}"
+            "{% endblock %}"
+            "{% block body %}{{ body }}{% endblock %}",
+        }
+    )
+    config = {"title": "Course", "nav": ["index.html", "syllabus.html"]}
+
+    # when
+    base_layout = layout.BaseLayout(environment, config)
+
+    # then
+    assert base_layout.is_split
+    for path in config["nav"]:
+        assert base_layout.render("body", path) == _expected(
+            environment, "body", path, config
+        )
+
+
+@mark.parametrize(
+    "page",
+    [
+        # the body is transformed
+        '{% extends "base.html" %}{% block body %}{{ body | upper }}{% endblock %}',
+        # the body is placed twice
+        '{% extends "base.html" %}{% block body %}{{ body }}{{ body }}{% endblock %}',
+        # the path is used outside of a block
+        '{% extends "base.html" %}{% set here = path %}'
+        "{% block body %}{{ here }}{{ body }}{% endblock %}",
+    ],
+)
+def test_falls_back_to_full_render_when_shell_depends_on_page(page):
+    # given
+    environment = _environment({"base.html": BASE, "page.html": page})
+    config = {"title": "Course"}
+
+    # when
+    base_layout = layout.BaseLayout(environment, config)
+
+    # then
+    assert not base_layout.is_split
+    assert base_layout.render("body", "one.html") == _expected(
+        environment, "body", "one.html", config
+    )
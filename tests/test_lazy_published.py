@@ -0,0 +1,120 @@
+import json
+import pathlib
+import shutil
+
+import publish
+
+from pytest import fixture, raises
+
+import abstract
+from abstract import lazy_published
+
+
+EXAMPLE_PUBLISHED = pathlib.Path(__file__).parent / "basic_published"
+
+
+@fixture
+def published_path(tmpdir):
+    path = pathlib.Path(tmpdir) / "_build" / "published"
+    shutil.copytree(EXAMPLE_PUBLISHED, path)
+    return path
+
+
+def test_index_gives_byte_range_of_each_collection():
+    # given
+    raw = json.dumps(
+        {"collections": {"é": {"schema": {}, "publications": {"ü": {"x": "ß"}}}}},
+        ensure_ascii=False,
+        indent=2,
+    ).encode("utf-8")
+
+    # when
+    index = lazy_published.build_index(raw)
+
+    # then
+    entry = index["é"]
+    assert json.loads(raw[entry["start"] : entry["end"]]) == {
+        "schema": {},
+        "publications": {"ü": {"x": "ß"}},
+    }
+    assert list(entry["publications"]) == ["ü"]
+
+
+def test_lazy_universe_matches_eager_universe(published_path):
+    # given
+    output_path = published_path.parent
+    eager = abstract.load_published(published_path, output_path)
+
+    # when
+    lazy = lazy_published.load(published_path, output_path)
+
+    # then
+    assert list(lazy.collections) == list(eager.collections)
+    assert lazy.collections.loaded == set()
+    assert lazy.collections["homeworks"] == eager.collections["homeworks"]
+    assert lazy.collections.loaded == {"homeworks"}
+
+
+def test_index_is_reused_until_published_changes(published_path, tmpdir):
+    # given
+    state_path = pathlib.Path(tmpdir) / "state"
+    published_file = published_path / "published.json"
+    lazy_published.load_index(published_file, state_path)
+    (state_path / "published-index.json").write_text(
+        json.dumps(
+            {
+                "version": lazy_published.INDEX_VERSION,
+                "source": lazy_published._source_stamp(published_file),
+                "collections": {},
+            }
+        )
+    )
+
+    # when
+    reused = lazy_published.load_index(published_file, state_path)
+    published_file.write_text(published_file.read_text() + "\n")
+    rebuilt = lazy_published.load_index(published_file, state_path)
+
+    # then
+    assert reused == {}
+    assert set(rebuilt) == {"default", "homeworks"}
+
+
+def test_publications_loaded_for_rendering_are_compact_and_read_only(published_path):
+    # given
+    output_path = published_path.parent
+    universe = publish.deserialize((published_path / "published.json").read_text())
+
+    # when
+    rebased = abstract.rebase_published(
+        universe, published_path, output_path, compact=True
+    )
+    lazy = lazy_published.load(published_path, output_path, compact=True)
+
+    # then
+    for universe in (rebased, lazy):
+        publication = universe.collections["homeworks"].publications["01-intro"]
+        artifact = publication.artifacts["homework.pdf"]
+        expected = pathlib.Path("published/homeworks/01-intro/homework.pdf")
+        assert artifact.path == expected
+        with raises(TypeError):
+            publication.metadata["name"] = "changed"
+
+    rebased_metadata, lazy_metadata = [
+        universe.collections["homeworks"].publications["01-intro"].metadata
+        for universe in (rebased, lazy)
+    ]
+    assert rebased_metadata._layout is lazy_metadata._layout
+
+
+def test_load_published_returns_plain_mutable_publications(published_path):
+    # when
+    universe = abstract.load_published(published_path, published_path.parent)
+
+    # then
+    publication = universe.collections["homeworks"].publications["01-intro"]
+    publication.metadata["name"] = "changed"
+    assert type(publication.metadata) is dict
+    assert publication.artifacts["homework.pdf"].path == pathlib.Path(
+        "published/homeworks/01-intro/homework.pdf"
+    )
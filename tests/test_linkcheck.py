@@ -0,0 +1,88 @@
+from abstract import linkcheck
+
+
+def _site(path, pages):
+    for name, contents in pages.items():
+        (path / name).parent.mkdir(parents=True, exist_ok=True)
+        (path / name).write_text(contents)
+    return path
+
+
+def test_reports_missing_files_anchors_and_unreleased_artifacts(tmp_path):
+    # given
+    site = _site(
+        tmp_path,
+        {
+            "index.html": (
+                '<a href="notes/">notes</a>\n'
+                '<a href="notes/one.html#the-bootstrap">ok</a>\n'
+                '<a href="notes/one.html#missing">anchor</a>\n'
+                '<img src="static/old-logo.png">\n'
+                '<a href="None">homework</a>\n'
+                '<a href="https://example.com/x">external</a>\n'
+                '<a href="#top">top</a>'
+            ),
+            "notes/index.html": '<a href="../index.html">up</a>',
+            "notes/one.html": '<h1 id="the-bootstrap">The Bootstrap</h1>',
+            "static/logo.png": "",
+        },
+    )
+
+    # when
+    broken = linkcheck.check_links(site)
+
+    # then
+    assert [(link.page, link.line, link.url) for link in broken] == [
+        ("index.html", 3, "notes/one.html#missing"),
+        ("index.html", 4, "static/old-logo.png"),
+        ("index.html", 5, "None"),
+    ]
+    assert broken[2].reason == "links to an unreleased artifact"
+
+
+def test_only_reparses_changed_pages(tmp_path, monkeypatch):
+    # given
+    site = _site(
+        tmp_path,
+        {
+            "one.html": '<a href="two.html#section">two</a>',
+            "two.html": '<h2 id="section">Section</h2>',
+        },
+    )
+    assert linkcheck.check_links(site) == []
+    (site / "two.html").write_text('<h2 id="renamed">Section</h2>')
+
+    parsed = []
+    original = linkcheck._parse_page
+
+    def _parse_page(output_path, relative_path):
+        parsed.append(relative_path)
+        return original(output_path, relative_path)
+
+    monkeypatch.setattr(linkcheck, "_parse_page", _parse_page)
+
+    # when
+    broken = linkcheck.check_links(site)
+
+    # then
+    assert parsed == ["two.html"]
+    assert [link.url for link in broken] == ["two.html#section"]
+
+
+def test_parses_in_parallel(tmp_path):
+    # given
+    n_pages = 4 * linkcheck._PAGES_PER_WORKER
+    pages = {
+        f"{i}.html": f'<p id="p{i}"></p><a href="{(i + 1) % n_pages}.html#p{i}">'
+        for i in range(n_pages)
+    }
+    site = _site(tmp_path, pages)
+
+    # when
+    broken = linkcheck.check_links(site, max_workers=2)
+
+    # then
+    assert len(broken) == n_pages
+    assert broken[0] == linkcheck.BrokenLink(
+        "0.html", 1, "1.html#p0", '1.html has no element with id "p0"'
+    )
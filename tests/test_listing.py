@@ -0,0 +1,23 @@
+import datetime
+
+import publish
+
+from abstract.elements.listing import UNDATED, _partition
+
+
+def _publication(**metadata):
+    return publish.Publication(metadata=metadata, artifacts={})
+
+
+def test_partition_groups_publications_without_a_date_last():
+    # given
+    old = _publication(released=datetime.date(2019, 9, 1))
+    new = _publication(released=datetime.date(2020, 9, 1))
+    unreleased = _publication(released=None)
+    undated = _publication()
+
+    # when
+    groups = _partition([old, unreleased, new, undated], "released")
+
+    # then
+    assert groups == [(2020, [new]), (2019, [old]), (UNDATED, [unreleased, undated])]
@@ -1,9 +1,12 @@
 from textwrap import dedent
+import datetime
+import json
 import pathlib
 
 from pytest import fixture
 
 import abstract
+from abstract import cache
 
 
 @fixture
@@ -54,3 +57,68 @@ def test_load_config(write_file):
     # then
     assert config["foo"]["x"] == 1
     assert config["testing"]["bar"] == [1, 2, 3]
+
+
+def test_load_config_cache_is_invalidated_by_changed_include(write_file, tmpdir):
+    # given
+    cache_path = pathlib.Path(tmpdir) / "_cache"
+    path = write_file("config.yaml", "name: {{ context.name }}\nfoo: !include foo.yaml\n")
+    write_file("foo.yaml", "x: 1\n")
+    abstract.load_config(path, context={"name": "one"}, cache_path=cache_path)
+
+    # when
+    cached = abstract.load_config(path, context={"name": "one"}, cache_path=cache_path)
+    other_context = abstract.load_config(
+        path, context={"name": "two"}, cache_path=cache_path
+    )
+    write_file("foo.yaml", "x: 2\n")
+    changed_include = abstract.load_config(
+        path, context={"name": "one"}, cache_path=cache_path
+    )
+
+    # then
+    assert cached == {"name": "one", "foo": {"x": 1}}
+    assert other_context["name"] == "two"
+    assert changed_include == {"name": "one", "foo": {"x": 2}}
+
+
+def test_load_config_cache_never_constructs_arbitrary_objects(write_file, tmpdir):
+    # given
+    cache_path = pathlib.Path(tmpdir) / "_cache"
+    path = write_file("config.yaml", "due: 2020-10-01\nexams: {b: 1, a: 2}\n")
+    abstract.load_config(path, cache_path=cache_path)
+
+    # a tampered entry, with a valid digest, asks for a Python object
+    [entry_path] = cache_path.glob("??/*")
+    entry = json.loads(entry_path.read_bytes().split(b"\n", 1)[1])
+    entry["config"] = "!!python/object/apply:os.getcwd []\n"
+    key = entry_path.parent.name + entry_path.name
+    cache.RenderCache(cache_path).put(key, json.dumps(entry))
+
+    # when
+    config = abstract.load_config(path, cache_path=cache_path)
+
+    # then
+    assert config == {"due": datetime.date(2020, 10, 1), "exams": {"b": 1, "a": 2}}
+    assert list(config["exams"]) == ["b", "a"]
+
+
+def test_load_config_cache_is_not_shared_by_sites_with_the_same_config(tmpdir):
+    # given
+    tmpdir = pathlib.Path(tmpdir)
+    cache_path = tmpdir / "_cache"
+    paths = []
+    for site in ["a", "b"]:
+        (tmpdir / site).mkdir()
+        (tmpdir / site / "config.yaml").write_text("schedule: !include schedule.yaml\n")
+        (tmpdir / site / "schedule.yaml").write_text(f"title: {site}-schedule\n")
+        paths.append(tmpdir / site / "config.yaml")
+
+    # when
+    configs = [abstract.load_config(path, cache_path=cache_path) for path in paths]
+
+    # then
+    assert configs == [
+        {"schedule": {"title": "a-schedule"}},
+        {"schedule": {"title": "b-schedule"}},
+    ]
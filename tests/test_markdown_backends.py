@@ -0,0 +1,62 @@
+import pathlib
+import re
+
+from pytest import mark, raises
+
+from abstract import markdown_backends
+
+
+EXAMPLE_PAGES = sorted(
+    (pathlib.Path(__file__).parent / "../example/website/pages").glob("*.md")
+)
+
+ALTERNATIVE_BACKENDS = [
+    name
+    for name in markdown_backends.available_backends()
+    if name != markdown_backends.DEFAULT_BACKEND
+]
+
+
+def _heading_ids(html):
+    return re.findall(r'<h[1-6][^>]*\sid="([^"]*)"', html)
+
+
+def _text(html):
+    return " ".join(re.sub(r"<[^>]*>", " ", html).split())
+
+
+@mark.parametrize("name", ALTERNATIVE_BACKENDS)
+def test_backends_produce_same_anchor_ids(name):
+    # given
+    contents = "# Hello *World*\n\n# Hello World\n\n## `code` & stuff\n"
+    default = markdown_backends.get_backend()
+    backend = markdown_backends.get_backend(name)
+
+    # then
+    assert _heading_ids(backend(contents)) == _heading_ids(default(contents))
+    assert _heading_ids(backend(contents)) == [
+        "hello-world",
+        "hello-world_1",
+        "code-stuff",
+    ]
+
+
+@mark.parametrize("name", ALTERNATIVE_BACKENDS)
+@mark.parametrize("page", EXAMPLE_PAGES, ids=lambda p: p.name)
+def test_backends_agree_on_example_site(name, page):
+    # given
+    contents = page.read_text()
+    default = markdown_backends.get_backend()
+    backend = markdown_backends.get_backend(name)
+
+    # when
+    expected, actual = default(contents), backend(contents)
+
+    # then
+    assert _heading_ids(actual) == _heading_ids(expected)
+    assert set(_text(actual).split()) == set(_text(expected).split())
+
+
+def test_raises_on_unknown_backend():
+    with raises(RuntimeError):
+        markdown_backends.get_backend("this-does-not-exist")
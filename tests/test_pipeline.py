@@ -0,0 +1,50 @@
+import pathlib
+
+from pytest import fixture, raises
+
+from abstract.pipeline import AtomicWriter, prefetch
+
+
+@fixture
+def outdir(tmpdir):
+    return pathlib.Path(tmpdir)
+
+
+def test_prefetch_yields_items_in_order():
+    # when
+    results = list(prefetch(range(100), lambda x: x ** 2, depth=3))
+
+    # then
+    assert results == [(x, x ** 2) for x in range(100)]
+
+
+def test_prefetch_reraises_errors_from_loading():
+    # given
+    def load(x):
+        if x == 5:
+            raise ValueError("cannot load")
+        return x
+
+    # when
+    with raises(ValueError):
+        list(prefetch(range(10), load))
+
+
+def test_atomic_writer_writes_files(outdir):
+    # when
+    with AtomicWriter(max_workers=2, max_pending=2, fsync=True) as writer:
+        for i in range(10):
+            writer.write(outdir / f"{i}.html", f"page {i}")
+
+    # then
+    assert (outdir / "7.html").read_text() == "page 7"
+    assert sorted(p.name for p in outdir.iterdir()) == sorted(
+        f"{i}.html" for i in range(10)
+    )
+
+
+def test_atomic_writer_raises_if_a_write_fails(outdir):
+    # when
+    with raises(FileNotFoundError):
+        with AtomicWriter() as writer:
+            writer.write(outdir / "missing" / "one.html", "page")
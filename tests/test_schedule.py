@@ -0,0 +1,68 @@
+import datetime
+
+import publish
+
+from abstract.elements.schedule import annotate_weeks, generate_weeks
+
+
+def _weeks():
+    element_config = {
+        "week_topics": ["Intro", "Tables", "Charts"],
+        "first_week_number": 1,
+        "first_week_start_date": datetime.date(2020, 9, 28),
+        "week_announcements": [
+            {"week": 2, "content": "Midterm soon", "urgent": True},
+            {"week": 3, "content": "Last week", "urgent": False},
+        ],
+        "exams": {"Midterm": datetime.date(2020, 10, 8)},
+    }
+    return element_config, generate_weeks(element_config, None)
+
+
+def test_annotate_weeks_groups_announcements_and_exams_by_week():
+    # given
+    element_config, weeks = _weeks()
+
+    # when
+    annotate_weeks(element_config, weeks, weeks[0], datetime.date(2020, 9, 29))
+
+    # then
+    assert [a["content"] for a in weeks[1].announcements] == ["Midterm soon"]
+    assert weeks[1].exams == [("Midterm", datetime.date(2020, 10, 8))]
+    assert weeks[0].exams == [] and weeks[2].exams == []
+
+
+def test_annotate_weeks_marks_last_week_and_separators():
+    # given
+    element_config, weeks = _weeks()
+    this_week = weeks[1]
+
+    # when
+    annotate_weeks(element_config, weeks, this_week, datetime.date(2020, 10, 6))
+
+    # then
+    assert [w.is_last for w in weeks] == [False, False, True]
+    assert [w.is_future for w in weeks] == [False, False, True]
+    assert [w.separator for w in weeks] == ["past weeks", None, "future weeks"]
+
+
+def test_week_filter_is_a_view_of_the_collection():
+    # given
+    _, weeks = _weeks()
+    publications = {
+        key: publish.Publication(metadata={"released": date}, artifacts={})
+        for key, date in [
+            ("01", datetime.date(2020, 9, 29)),
+            ("02", datetime.datetime(2020, 10, 6, 12)),
+            ("03", datetime.date(2020, 10, 13)),
+        ]
+    }
+    collection = publish.Collection(schema=None, publications=publications)
+
+    # when
+    filtered = weeks[1].filter(collection, "released")
+
+    # then
+    assert list(filtered.publications) == ["02"]
+    assert filtered.publications["02"] is publications["02"]
+    assert "01" not in filtered.publications
@@ -0,0 +1,24 @@
+from pytest import raises
+
+from abstract import sharding
+
+
+def test_parse_shard():
+    assert sharding.parse_shard("2/3") == sharding.Shard(2, 3)
+
+    for invalid in ["0/3", "4/3", "2", "a/b"]:
+        with raises(ValueError):
+            sharding.parse_shard(invalid)
+
+
+def test_every_path_belongs_to_exactly_one_shard():
+    # given
+    paths = [f"page-{i}.html" for i in range(100)]
+    shards = [sharding.Shard(i, 3) for i in range(1, 4)]
+
+    # when
+    owners = [[s for s in shards if sharding.in_shard(p, s)] for p in paths]
+
+    # then
+    assert all(len(o) == 1 for o in owners)
+    assert {o[0] for o in owners} == set(shards)